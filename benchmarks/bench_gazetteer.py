@@ -0,0 +1,135 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Created on Tue Oct 20 15:02:37 2026
+
+Time to build, reload and query a gazetteer.gazetteer over PLACES synthetic
+places scattered in clusters like towns in settled regions, written as a
+CSV file.  A million positions near the places are looked up individually
+and with nearest_many(), which is vectorized if numpy is installed, and a 
+sample is checked against a search of every place.
+
+Usage:
+    python benchmarks/bench_gazetteer.py [-n NUMBER] [--places PLACES]
+
+@author: russell
+"""
+
+import argparse
+import csv
+import math
+import os.path
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from jpggps2kml import gazetteer
+from jpggps2kml import trackstats
+
+def places(n, rng):
+    """
+    Return n (name, lat, lon) places in 200 clusters
+    """
+    centres = [(rng.uniform(-55.0, 70.0), rng.uniform(-180.0, 180.0))
+               for k in range(200)]
+    result = []
+    for i in range(n):
+        lat, lon = rng.choice(centres)
+        result.append(('place {0}'.format(i),
+                       max(-90.0, min(90.0, rng.gauss(lat, 3.0))),
+                       (rng.gauss(lon, 4.0) + 180.0) % 360.0 - 180.0))
+    return result
+
+def brute(index, lat, lon):
+    """
+    Return the (label, metres) of the nearest place by searching them all
+    """
+    phi = math.radians(lat)
+    lam = math.radians(lon)
+    best = 2.0
+    besti = -1
+    for i in range(len(index)):
+        h = (math.sin((index.lat[i] - phi) / 2) ** 2 +
+             math.cos(phi) * index.coslat[i] *
+             math.sin((index.lon[i] - lam) / 2) ** 2)
+        if h < best:
+            best = h
+            besti = i
+    return index.place(besti), (2 * math.asin(math.sqrt(best)) *
+                                trackstats.EARTH_RADIUS)
+
+def main():
+    """
+    Build, reload and query the index, printing one line for each
+    """
+    ap = argparse.ArgumentParser()
+    ap.add_argument('-n', '--number', type=int, default=1000000,
+                    help='number of positions to look up')
+    ap.add_argument('--places', type=int, default=200000,
+                    help='number of places in the gazetteer')
+    ap.add_argument('--check', type=int, default=100,
+                    help='number of positions checked against every place')
+    a = ap.parse_args()
+
+    rng = random.Random(1)
+    directory = tempfile.mkdtemp()
+    try:
+        path = os.path.join(directory, 'places.csv')
+        gazette = places(a.places, rng)
+        with open(path, 'w', newline='') as f:
+            w = csv.writer(f)
+            w.writerow(['name', 'latitude', 'longitude', 'country_code'])
+            for name, lat, lon in gazette:
+                w.writerow([name, lat, lon, 'XX'])
+
+        start = time.perf_counter()
+        gazetteer.gazetteer.load(path, 0)
+        print('{0:>12s} {1:9.2f} s'.format('build',
+                                          time.perf_counter() - start))
+
+        start = time.perf_counter()
+        index = gazetteer.gazetteer.load(path, 0)
+        print('{0:>12s} {1:9.2f} s'.format('reload',
+                                          time.perf_counter() - start))
+
+        # Positions within a few kilometres of the places, as photographs
+        # and tracks are
+        lats = []
+        lons = []
+        for k in range(a.number):
+            name, lat, lon = gazette[rng.randrange(len(gazette))]
+            lats.append(lat + rng.uniform(-0.05, 0.05))
+            lons.append(lon + rng.uniform(-0.05, 0.05))
+
+        start = time.perf_counter()
+        single = [index.nearest(lat, lon) for lat, lon in zip(lats, lons)]
+        print('{0:>12s} {1:9.2f} s for {2} positions'.format(
+              'nearest', time.perf_counter() - start, a.number))
+
+        index.nearest.cache_clear()
+        start = time.perf_counter()
+        found = index.nearest_many(lats, lons)
+        print('{0:>12s} {1:9.2f} s for {2} positions'.format(
+              'nearest_many', time.perf_counter() - start, a.number))
+
+        print('{0:>12s} {1:9d} of {2} positions differ'.format(
+              'same', sum(1 for x, y in zip(single, found)
+                          if x[0] != y[0] or abs(x[1] - y[1]) > 1.0e-6),
+              a.number))
+
+        wrong = 0
+        for k in range(a.check):
+            i = rng.randrange(a.number)
+            label, metres = brute(index, lats[i], lons[i])
+            if abs(metres - found[i][1]) > 1.0e-6:
+                wrong += 1
+        print('{0:>12s} {1:9d} of {2} positions differ'.format(
+              'check', wrong, a.check))
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 11:48:31 2026
+
+Throughput comparison of the two ways makekml serializes image placemarks:
+nested pykml factory calls followed by etree.tostring(), as used to merge
+into an existing file, and the precompiled template in kmlwriter, as used
+when a new file is written.
+
+Usage:
+    python benchmarks/bench_kml.py [-n NUMBER]
+
+@author: russell
+"""
+
+import argparse
+import io
+import os.path
+import sys
+import timeit
+
+from lxml import etree
+from pykml.factory import KML_ElementMaker as KML
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from jpggps2kml import kmlwriter
+
+def rows(n):
+    """
+    Return n synthetic (name, description, lon, lat, alt) placemark rows
+    """
+    return [('IMG_{0:06d}'.format(i),
+             '<img src="file:///trip/day/IMG_{0:06d}.jpg" width=400/><br/>'
+             'in day at 10:00:00 on 2016-01-02<br/>'.format(i),
+             -123.0 + i * 1.0e-5,
+             49.0 + i * 1.0e-5,
+             100.0) for i in range(n)]
+
+def main():
+    """
+    Time both serializers over the same rows and print one line each
+    """
+    ap = argparse.ArgumentParser()
+    ap.add_argument('-n', '--number', type=int, default=20000,
+                    help='number of placemarks to serialize')
+    ap.add_argument('--repeat', type=int, default=3,
+                    help='repetitions, the best is reported')
+    a = ap.parse_args()
+
+    data = rows(a.number)
+
+    def run_pykml():
+        cdatatext = {}
+        folder = KML.Folder(KML.name('images'))
+        for name, description, lon, lat, alt in data:
+            cdatatext[name] = kmlwriter.cdata(description)
+            folder.append(
+                KML.Placemark(
+                    KML.visibility('1'),
+                    KML.styleUrl('#picture'),
+                    KML.name(name),
+                    KML.description('{' + name + '}'),
+                    KML.Point(KML.coordinates(
+                        '{0},{1},{2}'.format(lon, lat, alt)))))
+        out = io.StringIO()
+        out.write(str(etree.tostring(folder, pretty_print=True),
+                      encoding='UTF-8').format_map(cdatatext))
+
+    def run_template():
+        out = io.StringIO()
+        placemark = kmlwriter.placemark
+        for name, description, lon, lat, alt in data:
+            out.write(placemark(name, description, lon, lat, alt))
+
+    for label, func in (('pykml ElementMaker', run_pykml),
+                        ('kmlwriter template', run_template)):
+        best = min(timeit.repeat(func, number=1, repeat=a.repeat))
+        print('{0:20s} {1:8.3f} s {2:10.0f} placemarks/s'.format(
+                  label, best, a.number / best))
+
+if __name__ == '__main__':
+    main()
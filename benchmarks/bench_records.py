@@ -0,0 +1,132 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 20:21:44 2026
+
+Per-record memory footprint of the image and trackpoint data held by
+makekml and mergegpx, measured with tracemalloc.
+
+For each layout, N records are built from the same synthetic values and the
+memory they retain is divided by N:
+  image dict       the per-image dictionary built before imagerecord existed
+                   (as in the old appendTrackPlacemarks jpegmeta dicts)
+  image tuple      the (sortkey, serialized text) pairs held before
+                   imagerecord existed
+  imagerecord      records.imagerecord
+  trackpoint dict  a dictionary per GPX trackpoint
+  trackpoint       records.trackpoint
+
+The strings shared by every layout (paths, dates) are created fresh for each
+record so that the figures include them, as they would in a real run.
+
+Usage:
+    python benchmarks/bench_records.py [-n NUMBER]
+
+@author: russell
+"""
+
+import argparse
+import gc
+import os.path
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from jpggps2kml import kmlwriter
+from jpggps2kml import records
+
+def image_values(i):
+    """
+    Return the values for synthetic image i
+    """
+    name = 'IMG_{0:06d}'.format(i)
+    rooted = '2016-01-{0:02d}/{1}.JPG'.format(i % 28 + 1, name)
+    return ('/trip/' + rooted,
+            rooted,
+            name,
+            1451721600.0 + i,
+            '2016-01-{0:02d}'.format(i % 28 + 1),
+            '10:{0:02d}:{1:02d}'.format(i // 60 % 60, i % 60),
+            49.0 + i * 1.0e-6,
+            -123.0 - i * 1.0e-6,
+            100.0 + i % 100,
+            1)
+
+def image_dict(i):
+    path, rooted, name, epoch, datestr, timestr, lat, lon, alt, orient = \
+        image_values(i)
+    return {'path': path, 'rooted': rooted, 'filebase': name,
+            'epoch': epoch, 'date': datestr, 'time': timestr,
+            'lat': lat, 'lon': lon, 'alt': alt, 'orientation': orient}
+
+def image_tuple(i):
+    path, rooted, name, epoch, datestr, timestr, lat, lon, alt, orient = \
+        image_values(i)
+    description = ('<img src="file://' + path + '" width=400/><br/>in ' +
+                   os.path.dirname(rooted) + ' at ' + timestr + ' on ' +
+                   datestr + '<br/>')
+    return ((datestr, timestr, rooted),
+            kmlwriter.placemark(name, description, lon, lat, alt))
+
+def image_record(i):
+    return records.imagerecord(*image_values(i))
+
+def point_values(i):
+    """
+    Return the values for synthetic trackpoint i
+    """
+    return (1451721600.0 + i,
+            i % 3,
+            '{0:.7f}'.format(49.0 + i * 1.0e-6),
+            '{0:.7f}'.format(-123.0 - i * 1.0e-6),
+            '{0:.1f}'.format(100.0 + i % 100),
+            '2016-01-02T10:{0:02d}:{1:02d}Z'.format(i // 60 % 60, i % 60),
+            '3d',
+            '8',
+            '1.2')
+
+def point_dict(i):
+    epoch, source, lat, lon, ele, time, fix, sat, hdop = point_values(i)
+    return {'epoch': epoch, 'source': source, 'lat': lat, 'lon': lon,
+            'ele': ele, 'time': time, 'fix': fix, 'sat': sat, 'hdop': hdop}
+
+def point_record(i):
+    return records.trackpoint(*point_values(i))
+
+LAYOUTS = [('image dict', image_dict),
+           ('image tuple', image_tuple),
+           ('imagerecord', image_record),
+           ('trackpoint dict', point_dict),
+           ('trackpoint', point_record)]
+
+def footprint(make, n):
+    """
+    Return the bytes retained per record by n records from make
+    """
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    kept = [make(i) for i in range(n)]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    # the list itself is not part of the record
+    result = (after - before - sys.getsizeof(kept)) / n
+    del kept
+    return result
+
+def main():
+    """
+    Measure every layout and print one line each
+    """
+    ap = argparse.ArgumentParser()
+    ap.add_argument('-n', '--number', type=int, default=100000,
+                    help='number of records of each layout')
+    a = ap.parse_args()
+
+    # bytes per record is also MB per million records
+    print('{0:16s} {1:>14s}'.format('layout', 'bytes/record'))
+    for name, make in LAYOUTS:
+        print('{0:16s} {1:14.1f}'.format(name, footprint(make, a.number)))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,150 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 23:52:10 2026
+
+A sharded makekml build run locally, one process per shard.
+
+The day directories of a corpus are dealt round-robin into --shards groups,
+as if each were held on a different storage node.  Each group is processed
+by "makekml --shard" in its own process, all started together, and the
+fragments are combined by mergekml.  The same corpus is also processed by a
+single makekml run, and the wall clock times of the shards, the merge and
+the single run are printed together with whether the two KML files are
+identical.
+
+The GPX logs of every day are given to the first shard only (through a
+directory of links passed as --gpx), because a track merged by --merge over
+a UTC day can draw on the logs of two day directories.
+
+Usage:
+    python benchmarks/bench_shards.py [-n 1000] [--shards 3] [--merge]
+                                      [--phototracks day] [--real-exiftool]
+
+@author: russell
+"""
+
+import argparse
+import filecmp
+import os
+import os.path
+import subprocess
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+sys.path.insert(0, HERE)
+
+import run
+
+def script(command, argv, fake):
+    """
+    Return the python source that runs command with argv, replacing
+    exiftool by the stand-in if fake is true
+    """
+    return ('import sys\n'
+            'sys.path.insert(0, ' + repr(HERE) + ')\n' +
+            ('import fakeexiftool\nfakeexiftool.install()\n' if fake else '') +
+            'sys.argv = ' + repr([command] + argv) + '\n'
+            'from jpggps2kml import jpggps2kml\n'
+            'jpggps2kml.' + command + '()\n')
+
+def start(command, argv, fake):
+    """
+    Start command in a new interpreter and return the Popen object
+    """
+    env = dict(os.environ)
+    env['PYTHONPATH'] = ROOT + os.pathsep + env.get('PYTHONPATH', '')
+    return subprocess.Popen([sys.executable, '-c',
+                             script(command, argv, fake)],
+                            env=env)
+
+def wait(procs):
+    """
+    Wait for every process, exiting if any failed
+    """
+    for p in procs:
+        if p.wait() != 0:
+            sys.exit('a command failed with status ' + str(p.returncode))
+
+def main():
+    """
+    Run the shards, the merge and the single build and compare the output
+    """
+    ap = argparse.ArgumentParser()
+    ap.add_argument('-n', '--size', type=int, default=1000,
+                    help='images in the corpus')
+    ap.add_argument('--days', type=int, default=10,
+                    help='day directories in the corpus')
+    ap.add_argument('--gpx-points', type=int, default=3600,
+                    help='trackpoints in each daily GPX file')
+    ap.add_argument('--shards', type=int, default=3,
+                    help='number of shards run concurrently')
+    ap.add_argument('--merge', action='store_true',
+                    help='pass --merge to makekml')
+    ap.add_argument('--phototracks', choices=['day', 'dir'],
+                    help='pass --phototracks to makekml and mergekml')
+    ap.add_argument('--workdir', default=os.path.join(HERE, 'work'),
+                    help='directory holding the generated corpora')
+    ap.add_argument('--real-exiftool', action='store_true',
+                    help='use the installed exiftool')
+    a = ap.parse_args()
+
+    root = run.prepare(a.workdir, a.size, a.days, a.gpx_points)
+    outdir = os.path.join(a.workdir, 'shards-{0}'.format(a.size))
+    gpxdir = os.path.join(outdir, 'gpx')
+    nogpx = os.path.join(outdir, 'nogpx')
+    os.makedirs(gpxdir, exist_ok=True)
+    os.makedirs(nogpx, exist_ok=True)
+
+    days = sorted(os.path.join(root, d) for d in os.listdir(root)
+                  if os.path.isdir(os.path.join(root, d)))
+    for d in days:
+        for f in os.listdir(d):
+            link = os.path.join(gpxdir, f)
+            if f.lower().endswith('.gpx') and not os.path.lexists(link):
+                os.symlink(os.path.join(d, f), link)
+
+    common = ['--verbosity=quiet']
+    if a.merge:
+        common.append('--merge=True')
+    photo = ['--phototracks=' + a.phototracks] if a.phototracks else []
+    fake = not a.real_exiftool
+
+    fragments = []
+    procs = []
+    started = time.perf_counter()
+    for n in range(a.shards):
+        fragment = os.path.join(outdir, 'shard{0}.frag'.format(n))
+        fragments.append(fragment)
+        procs.append(start('makekml',
+                           common + ['--shard=True',
+                                     '--gpx=' + (gpxdir if n == 0 else nogpx),
+                                     '--out=' + fragment] +
+                           days[n::a.shards],
+                           fake))
+    wait(procs)
+    shardtime = time.perf_counter() - started
+
+    merged = os.path.join(outdir, 'merged.kml')
+    started = time.perf_counter()
+    wait([start('mergekml', common + photo + ['--out=' + merged] + fragments,
+                fake)])
+    mergetime = time.perf_counter() - started
+
+    single = os.path.join(outdir, 'single.kml')
+    started = time.perf_counter()
+    wait([start('makekml',
+                common + photo + ['--out=' + single] + days,
+                fake)])
+    singletime = time.perf_counter() - started
+
+    print('{0:d} shards {1:9.3f} s'.format(a.shards, shardtime))
+    print('mergekml  {0:9.3f} s'.format(mergetime))
+    print('single    {0:9.3f} s'.format(singletime))
+    print('identical' if filecmp.cmp(merged, single, shallow=False)
+          else 'DIFFERENT: ' + merged + ' ' + single)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 16:48:09 2026
+
+Time and peak memory of extsort.recordsorter for N synthetic imagerecords,
+added in shuffled chunks as the makekml pipeline adds them and then read
+back in sorted order, for a budget that holds every record in memory and
+for each --sort-memory budget given.
+
+Usage:
+    python benchmarks/bench_sort.py [-n NUMBER] [--memory MB [MB ...]]
+
+@author: russell
+"""
+
+import argparse
+import gc
+import os.path
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from jpggps2kml import extsort
+
+from bench_records import image_record
+
+def measure(n, limit, order):
+    """
+    Return (seconds, peak MB, runs) to sort the records numbered in order
+    with a recordsorter holding at most limit records in memory
+    """
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    sorter = extsort.recordsorter(limit)
+    for c in range(0, n, extsort.CHUNKSIZE):
+        sorter.add([image_record(i) for i in order[c:c + extsort.CHUNKSIZE]])
+    runs = len(sorter.runs)
+    last = None
+    for r in sorter.sorted():
+        key = r.sortkey()
+        assert last is None or last <= key
+        last = key
+    seconds = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    sorter.close()
+    return seconds, peak / (1 << 20), runs
+
+def main():
+    """
+    Measure each budget and print one line each
+    """
+    ap = argparse.ArgumentParser()
+    ap.add_argument('-n', '--number', type=int, default=200000,
+                    help='number of records to sort')
+    ap.add_argument('--memory', type=float, nargs='*', default=[16.0, 4.0],
+                    help='--sort-memory budgets in MB')
+    a = ap.parse_args()
+
+    order = list(range(a.number))
+    random.Random(1).shuffle(order)
+
+    print('{0:>10s} {1:>8s} {2:>6s} {3:>9s} {4:>10s}'.format(
+          'budget MB', 'records', 'runs', 'seconds', 'peak MB'))
+    budgets = [(None, a.number + 1)]
+    budgets.extend((mb, extsort.budget(mb)) for mb in a.memory)
+    for mb, limit in budgets:
+        seconds, peak, runs = measure(a.number, limit, order)
+        print('{0:>10s} {1:8d} {2:6d} {3:9.2f} {4:10.1f}'.format(
+              'all' if mb is None else '{0:g}'.format(mb),
+              a.number, runs, seconds, peak))
+
+if __name__ == '__main__':
+    main()
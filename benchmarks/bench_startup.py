@@ -0,0 +1,125 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 21:46:08 2026
+
+Startup cost of the jpggps2kml commands, which are run many times from
+shell pipelines.
+
+Each command is started --repeat times in a fresh interpreter with
+"python -X importtime" and stopped by --help as soon as its arguments have
+been parsed, i.e. just before it begins work.  For each command the best
+wall clock time, the total of the import times reported by -X importtime,
+and which of the heavy dependencies (lxml, pykml, asyncio)
+were already loaded are printed.  A bare "python -c pass" is shown for
+reference.  --top lists the slowest imports of the first command.
+
+Usage:
+    python benchmarks/bench_startup.py [--repeat N] [--top N]
+
+@author: russell
+"""
+
+import argparse
+import os.path
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+COMMANDS = ['findoffset', 'orientjpeg', 'editgps', 'makegpx', 'mergegpx',
+            'makekml', 'mergekml']
+
+HEAVY = ['lxml.etree', 'pykml.factory', 'asyncio']
+
+def script(command):
+    """
+    Return the python source that runs command with --help
+    """
+    if command is None:
+        return 'pass'
+    return ('import sys\n'
+            'sys.argv = [' + repr(command) + ', "--help"]\n'
+            'from jpggps2kml import jpggps2kml\n'
+            'try:\n'
+            '    jpggps2kml.' + command + '()\n'
+            'except SystemExit:\n'
+            '    pass\n')
+
+def importtimes(stderr):
+    """
+    Return a dictionary module -> (self, cumulative) microseconds parsed
+    from the -X importtime lines in stderr
+    """
+    result = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        fields = line[len('import time:'):].split('|')
+        try:
+            result[fields[2].strip()] = (int(fields[0]), int(fields[1]))
+        except ValueError:
+            # the header line
+            pass
+    return result
+
+def run(command, repeat):
+    """
+    Start command repeat times, returning the best wall clock seconds and
+    the import times of the last run
+    """
+    env = dict(os.environ)
+    env['PYTHONPATH'] = ROOT + os.pathsep + env.get('PYTHONPATH', '')
+    best = None
+    for n in range(repeat):
+        start = time.perf_counter()
+        proc = subprocess.run([sys.executable, '-X', 'importtime',
+                               '-c', script(command)],
+                              stdout=subprocess.DEVNULL,
+                              stderr=subprocess.PIPE,
+                              env=env,
+                              universal_newlines=True)
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best, importtimes(proc.stderr)
+
+def main():
+    """
+    Measure every command and print one line each
+    """
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--repeat', type=int, default=5,
+                    help='starts of each command, the best is reported')
+    ap.add_argument('--top', type=int, default=10,
+                    help='number of the slowest imports of the first '
+                         'command to list')
+    ap.add_argument('commands', nargs='*', default=COMMANDS,
+                    help='commands to start')
+    a = ap.parse_args()
+
+    print('{0:12s} {1:>9s} {2:>10s}  {3}'.format('command', 'wall ms',
+                                                 'import ms', 'loaded'))
+    first = None
+    for command in [None] + a.commands:
+        seconds, times = run(command, a.repeat)
+        if command and first is None:
+            first = times
+        total = sum(s for s, c in times.values())
+        loaded = [m for m in HEAVY if m in times]
+        print('{0:12s} {1:9.1f} {2:10.1f}  {3}'.format(
+                  command or 'python',
+                  1000.0 * seconds,
+                  total / 1000.0,
+                  ', '.join(loaded) or '-'))
+
+    if first and a.top > 0:
+        print()
+        print('slowest cumulative imports for ' + a.commands[0])
+        ranked = sorted(first.items(), key=lambda kv: -kv[1][1])
+        for module, (own, cumulative) in ranked[:a.top]:
+            print('{0:40s} {1:10.1f} ms'.format(module, cumulative / 1000.0))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 10:40:05 2026
+
+Microbenchmark for the DateTimeOriginal parsers in jpggps2kml.timestamps,
+compared with the per-file regular expression parse they replaced.
+
+Usage:
+    python benchmarks/bench_timestamps.py [-n NUMBER] [--burst BURST]
+
+--burst sets how many consecutive images share the same second, mimicking
+a camera in continuous shooting mode.
+
+@author: russell
+"""
+
+import argparse
+import datetime
+import os.path
+import re
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from jpggps2kml import timestamps
+
+def legacy_parse(text):
+    """
+    The uncompiled regex parse previously used by findoffset()
+    """
+    iso8601 = (r'(\d{4})[-:](\d{2})[-:](\d{2})[ Tt]'
+               r'(\d{2}):(\d{2}):(\d{2})')
+    g = re.match(iso8601, text).groups()
+    return datetime.datetime(int(g[0]), int(g[1]), int(g[2]),
+                             int(g[3]), int(g[4]), int(g[5]))
+
+def make_stamps(n, burst):
+    """
+    Return n DateTimeOriginal strings with burst images per second
+    """
+    start = datetime.datetime(2016, 1, 2, 9, 0, 0)
+    return [(start + datetime.timedelta(seconds=i // burst)).strftime(
+                '%Y:%m:%d %H:%M:%S') for i in range(n)]
+
+def main():
+    """
+    Time each parser over the same list of strings and print one line each
+    """
+    ap = argparse.ArgumentParser()
+    ap.add_argument('-n', '--number', type=int, default=100000,
+                    help='number of timestamps to parse')
+    ap.add_argument('--burst', type=int, default=5,
+                    help='images sharing each timestamp')
+    ap.add_argument('--repeat', type=int, default=3,
+                    help='repetitions, the best is reported')
+    a = ap.parse_args()
+
+    stamps = make_stamps(a.number, a.burst)
+
+    def run_legacy():
+        for s in stamps:
+            legacy_parse(s)
+
+    def run_uncached():
+        timestamps.clear_caches()
+        parse = timestamps.parse_datetime.__wrapped__
+        for s in stamps:
+            parse(s)
+
+    def run_cached():
+        timestamps.clear_caches()
+        parse = timestamps.parse_datetime
+        for s in stamps:
+            parse(s)
+
+    for label, func in (('legacy regex', run_legacy),
+                        ('fixed-offset slicing', run_uncached),
+                        ('slicing + memo cache', run_cached)):
+        best = min(timeit.repeat(func, number=1, repeat=a.repeat))
+        print('{0:22s} {1:8.3f} s {2:10.0f} stamps/s'.format(
+                  label, best, a.number / best))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,163 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Created on Tue Oct 20 11:05:43 2026
+
+Time to build, reload and query a tzindex.tzindex over synthetic timezone
+boundaries: one zone for each 15 degrees of longitude between wavy borders
+of VERTICES points, from 60 S to 75 N, with an enclave cut out of one zone.
+The zone of a sample of the query positions is checked against a direct
+point-in-polygon test over every ring.
+
+Usage:
+    python benchmarks/bench_tzindex.py [-n NUMBER] [--vertices VERTICES]
+        [--keep DIR]
+
+@author: russell
+"""
+
+import argparse
+import json
+import math
+import os.path
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from jpggps2kml import tzindex
+
+SOUTH = -60.0
+NORTH = 75.0
+
+def border(k, vertices):
+    """
+    Return the [lon, lat] points of the border between zones k - 1 and k,
+    from south to north
+    """
+    if k == 0:
+        return [[-180.0, SOUTH], [-180.0, NORTH]]
+    if k == 24:
+        return [[180.0, SOUTH], [180.0, NORTH]]
+    points = []
+    for i in range(vertices):
+        lat = SOUTH + (NORTH - SOUTH) * i / (vertices - 1)
+        lon = (-180.0 + 15.0 * k +
+               4.0 * math.sin(math.radians(lat) * 7.0 + k) +
+               0.3 * math.sin(math.radians(lat) * 97.0))
+        points.append([lon, lat])
+    return points
+
+def boundaries(vertices):
+    """
+    Return a GeoJSON FeatureCollection of the synthetic zones
+    """
+    features = []
+    enclave = [[-8.5, 45.0], [-6.5, 45.0], [-6.0, 47.0], [-8.0, 48.0],
+               [-8.5, 45.0]]
+    for k in range(24):
+        hours = k - 12
+        name = 'Etc/GMT' if hours == 0 else 'Etc/GMT{0:+d}'.format(-hours)
+        ring = border(k, vertices) + border(k + 1, vertices)[::-1]
+        ring.append(ring[0])
+        rings = [ring]
+        if k == 11:
+            # A hole for the enclave, which belongs to another zone
+            rings.append(enclave[::-1])
+        features.append({'type': 'Feature',
+                         'properties': {'tzid': name},
+                         'geometry': {'type': 'Polygon',
+                                      'coordinates': rings}})
+    features.append({'type': 'Feature',
+                     'properties': {'tzid': 'Etc/GMT-1'},
+                     'geometry': {'type': 'Polygon',
+                                  'coordinates': [enclave]}})
+    return {'type': 'FeatureCollection', 'features': features}
+
+def inside(ring, lat, lon):
+    """
+    Return True if (lat, lon) is inside ring by the even-odd rule
+    """
+    result = False
+    for (x1, y1), (x2, y2) in zip(ring, ring[1:]):
+        if (y1 <= lat < y2) or (y2 <= lat < y1):
+            if x1 + (lat - y1) * (x2 - x1) / (y2 - y1) > lon:
+                result = not result
+    return result
+
+def expected(collection, lat, lon):
+    """
+    Return the zone at (lat, lon) by testing every ring
+    """
+    for feature in collection['features']:
+        parity = False
+        for ring in feature['geometry']['coordinates']:
+            if inside(ring, lat, lon):
+                parity = not parity
+        if parity:
+            return feature['properties']['tzid']
+    return tzindex.nautical(lon)
+
+def main():
+    """
+    Build, reload and query the index, printing one line for each
+    """
+    ap = argparse.ArgumentParser()
+    ap.add_argument('-n', '--number', type=int, default=1000000,
+                    help='number of positions to look up')
+    ap.add_argument('--vertices', type=int, default=20000,
+                    help='vertices in each border between zones')
+    ap.add_argument('--check', type=int, default=2000,
+                    help='number of positions checked point by point')
+    ap.add_argument('--keep',
+                    help='directory in which to keep the boundary file')
+    a = ap.parse_args()
+
+    directory = a.keep or tempfile.mkdtemp()
+    try:
+        path = os.path.join(directory, 'boundaries.json')
+        collection = boundaries(a.vertices)
+        with open(path, 'w') as f:
+            json.dump(collection, f)
+        shutil.rmtree(path + tzindex.INDEXSUFFIX, ignore_errors=True)
+
+        start = time.perf_counter()
+        tzindex.tzindex.load(path, 0)
+        print('{0:>10s} {1:9.2f} s'.format('build',
+                                          time.perf_counter() - start))
+
+        start = time.perf_counter()
+        index = tzindex.tzindex.load(path, 0)
+        print('{0:>10s} {1:9.2f} s'.format('reload',
+                                          time.perf_counter() - start))
+
+        rng = random.Random(1)
+        positions = [(rng.uniform(-80.0, 85.0), rng.uniform(-180.0, 180.0))
+                     for n in range(a.number)]
+        start = time.perf_counter()
+        for lat, lon in positions:
+            index.lookup(lat, lon)
+        print('{0:>10s} {1:9.2f} s for {2} positions'.format(
+              'lookup', time.perf_counter() - start, a.number))
+
+        # Positions near the borders exercise the boundary cells
+        checks = positions[:a.check // 2]
+        for n in range(a.check - len(checks)):
+            lon, lat = rng.choice(rng.choice(collection['features'])
+                                  ['geometry']['coordinates'][0])
+            checks.append((lat + rng.uniform(-0.01, 0.01),
+                           lon + rng.uniform(-0.01, 0.01)))
+        wrong = sum(1 for lat, lon in checks
+                    if index.lookup(lat, lon) != expected(collection,
+                                                          lat,
+                                                          lon))
+        print('{0:>10s} {1:9d} of {2} positions differ'.format(
+              'check', wrong, len(checks)))
+    finally:
+        if not a.keep:
+            shutil.rmtree(directory, ignore_errors=True)
+
+if __name__ == '__main__':
+    main()
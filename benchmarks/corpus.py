@@ -0,0 +1,304 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 13:10:52 2026
+
+Generate a reproducible synthetic corpus for the jpggps2kml benchmarks.
+
+The corpus is a trip directory holding one subdirectory per day, named
+YYYY-MM-DD as recommended in README.txt, each containing small but valid
+baseline JPEG files with EXIF DateTimeOriginal, Orientation, SerialNumber
+and GPS tags, together with one GPX log per day whose track passes through
+the positions of the photos.
+
+Usage:
+    python benchmarks/corpus.py [-n IMAGES] [--days DAYS]
+                                [--gpx-points POINTS] [--seed SEED] DIR
+
+@author: russell
+"""
+
+import argparse
+import datetime
+import math
+import os
+import os.path
+import random
+import struct
+
+# TIFF field types
+BYTE = 1
+ASCII = 2
+SHORT = 3
+LONG = 4
+RATIONAL = 5
+
+TYPESIZE = {BYTE: 1, ASCII: 1, SHORT: 2, LONG: 4, RATIONAL: 8}
+
+# Tags written into the corpus, as (IFD, tag number) -> exiftool name
+IFD0_TAGS = {0x0112: 'Orientation',
+             0x8769: 'ExifOffset',
+             0x8825: 'GPSInfo'}
+EXIF_TAGS = {0x9003: 'DateTimeOriginal',
+             0x9291: 'SubSecTimeOriginal',
+             0xa431: 'SerialNumber'}
+GPS_TAGS = {0x0000: 'GPSVersionID',
+            0x0001: 'GPSLatitudeRef',
+            0x0002: 'GPSLatitude',
+            0x0003: 'GPSLongitudeRef',
+            0x0004: 'GPSLongitude',
+            0x0005: 'GPSAltitudeRef',
+            0x0006: 'GPSAltitude',
+            0x0007: 'GPSTimeStamp',
+            0x0009: 'GPSStatus',
+            0x000a: 'GPSMeasureMode',
+            0x001d: 'GPSDateStamp'}
+
+# Start of the synthetic trip, and the camera clock offset from UTC
+TRIP_START = datetime.datetime(2016, 1, 2, 8, 0, 0)
+CAMERA_OFFSET = datetime.timedelta(hours=-8)
+
+def _rationals(values, denominator=10000):
+    """
+    Pack a sequence of non-negative floats as TIFF RATIONALs
+    """
+    return b''.join(struct.pack('<II', int(round(v * denominator)),
+                                denominator) for v in values)
+
+def _dms(degrees):
+    """
+    Split unsigned decimal degrees into (degrees, minutes, seconds)
+    """
+    d = int(degrees)
+    m = int((degrees - d) * 60)
+    s = (degrees - d - m / 60.0) * 3600.0
+    return (d, m, s)
+
+def _ifd(entries, offset):
+    """
+    Serialize a TIFF IFD starting at offset (from the start of the TIFF
+    header).  entries is a list of (tag, type, count, data) tuples with the
+    data already packed.  Values longer than four bytes are placed in a data
+    area immediately after the IFD.  Return the bytes of IFD plus data area.
+    """
+    entries = sorted(entries)
+    datastart = offset + 2 + 12 * len(entries) + 4
+    table = [struct.pack('<H', len(entries))]
+    data = []
+    dataoffset = datastart
+    for tag, ftype, count, value in entries:
+        if len(value) <= 4:
+            table.append(struct.pack('<HHI', tag, ftype, count) +
+                         value.ljust(4, b'\0'))
+        else:
+            table.append(struct.pack('<HHII', tag, ftype, count, dataoffset))
+            if len(value) % 2:
+                value += b'\0'
+            data.append(value)
+            dataoffset += len(value)
+    table.append(struct.pack('<I', 0))
+    return b''.join(table) + b''.join(data)
+
+def _ascii(text):
+    """
+    Return a TIFF ASCII entry value and count for text
+    """
+    value = text.encode('ascii') + b'\0'
+    return (ASCII, len(value), value)
+
+def make_exif(local, utc, lat, lon, alt, orientation, serial, subsec=''):
+    """
+    Return the body of an APP1 Exif segment (including the Exif\\0\\0
+    identifier) holding the tags used by jpggps2kml.
+
+    Arguments:
+    local: camera clock datetime for DateTimeOriginal
+    utc: UTC datetime for GPSDateStamp and GPSTimeStamp
+    lat, lon, alt: signed decimal degrees and metres
+    orientation: EXIF Orientation, 1 to 8
+    serial: camera body serial number
+    subsec: SubSecTimeOriginal digits, omitted if empty
+    """
+    exif = [(0x9003,) + _ascii(local.strftime('%Y:%m:%d %H:%M:%S')),
+            (0xa431,) + _ascii(serial)]
+    if subsec:
+        exif.append((0x9291,) + _ascii(subsec))
+
+    gps = [(0x0000, BYTE, 4, bytes([2, 3, 0, 0])),
+           (0x0001,) + _ascii('N' if lat >= 0 else 'S'),
+           (0x0002, RATIONAL, 3, _rationals(_dms(abs(lat)))),
+           (0x0003,) + _ascii('E' if lon >= 0 else 'W'),
+           (0x0004, RATIONAL, 3, _rationals(_dms(abs(lon)))),
+           (0x0005, BYTE, 1, bytes([0 if alt >= 0 else 1])),
+           (0x0006, RATIONAL, 1, _rationals([abs(alt)])),
+           (0x0007, RATIONAL, 3, _rationals([utc.hour,
+                                             utc.minute,
+                                             utc.second])),
+           (0x0009,) + _ascii('A'),
+           (0x000a,) + _ascii('3'),
+           (0x001d,) + _ascii(utc.strftime('%Y:%m:%d'))]
+
+    # Layout: header, IFD0, Exif IFD, GPS IFD
+    ifd0_offset = 8
+    ifd0_len = len(_ifd([(0x0112, SHORT, 1, b'\0\0'),
+                         (0x8769, LONG, 1, b'\0' * 4),
+                         (0x8825, LONG, 1, b'\0' * 4)], ifd0_offset))
+    exif_offset = ifd0_offset + ifd0_len
+    exif_ifd = _ifd(exif, exif_offset)
+    gps_offset = exif_offset + len(exif_ifd)
+    gps_ifd = _ifd(gps, gps_offset)
+    ifd0 = _ifd([(0x0112, SHORT, 1, struct.pack('<H', orientation)),
+                 (0x8769, LONG, 1, struct.pack('<I', exif_offset)),
+                 (0x8825, LONG, 1, struct.pack('<I', gps_offset))],
+                ifd0_offset)
+
+    tiff = b'II*\0' + struct.pack('<I', ifd0_offset) + ifd0 + exif_ifd + gps_ifd
+    return b'Exif\0\0' + tiff
+
+def _segment(marker, body):
+    """
+    Return a JPEG marker segment
+    """
+    return struct.pack('>BBH', 0xff, marker, len(body) + 2) + body
+
+def make_jpeg(exif, width=64, height=48):
+    """
+    Return the bytes of a valid baseline greyscale JPEG of the given size
+    (rounded up to whole 8x8 blocks) with the exif APP1 body.  Every block
+    is a flat mid-grey, coded with one-symbol Huffman tables so that each
+    block takes two bits of entropy-coded data.
+    """
+    bw = (width + 7) // 8
+    bh = (height + 7) // 8
+    nbits = 2 * bw * bh
+    scan = bytearray(b'\0' * ((nbits + 7) // 8))
+    if nbits % 8:
+        # pad the final byte with 1 bits
+        scan[-1] = (1 << (8 - nbits % 8)) - 1
+
+    dqt = b'\0' + b'\x01' * 64
+    sof = struct.pack('>BHHB', 8, height, width, 1) + b'\x01\x11\x00'
+    # DC and AC tables with a single code of length 1 for symbol 0
+    dht_dc = b'\x00' + b'\x01' + b'\0' * 15 + b'\x00'
+    dht_ac = b'\x10' + b'\x01' + b'\0' * 15 + b'\x00'
+    sos = b'\x01\x01\x00\x00\x3f\x00'
+    return (b'\xff\xd8' +
+            _segment(0xe1, exif) +
+            _segment(0xdb, dqt) +
+            _segment(0xc0, sof) +
+            _segment(0xc4, dht_dc) +
+            _segment(0xc4, dht_ac) +
+            _segment(0xda, sos) +
+            bytes(scan) +
+            b'\xff\xd9')
+
+def track_position(t, day):
+    """
+    Position in (lat, lon, alt) at t seconds into the given day of the trip,
+    following a slow loop around a different centre each day.
+    """
+    lat0 = 49.0 + 0.05 * day
+    lon0 = -123.0 - 0.05 * day
+    phase = 2.0 * math.pi * t / 36000.0
+    return (lat0 + 0.02 * math.sin(phase),
+            lon0 + 0.03 * math.cos(phase),
+            100.0 + 20.0 * math.sin(3.0 * phase))
+
+def make_gpx(day, utcstart, npoints, step):
+    """
+    Return the text of a GPX 1.1 log for one day of the trip
+    """
+    lines = ['<?xml version="1.0" encoding="UTF-8"?>',
+             '<gpx version="1.1" creator="jpggps2kml benchmarks" '
+             'xmlns="http://www.topografix.com/GPX/1/1">',
+             '<trk>',
+             '<name>' + utcstart.strftime('%Y-%m-%d') + '</name>',
+             '<trkseg>']
+    for i in range(npoints):
+        t = i * step
+        lat, lon, alt = track_position(t, day)
+        when = utcstart + datetime.timedelta(seconds=t)
+        lines.append('<trkpt lat="{0:.7f}" lon="{1:.7f}"><ele>{2:.1f}</ele>'
+                     '<time>{3}</time></trkpt>'.format(
+                         lat, lon, alt, when.strftime('%Y-%m-%dT%H:%M:%SZ')))
+    lines.extend(['</trkseg>', '</trk>', '</gpx>', ''])
+    return '\n'.join(lines)
+
+def generate(root, n, days=10, gpx_points=3600, burst=3, seed=1,
+             width=64, height=48):
+    """
+    Generate a corpus of n JPEG files spread over the given number of days
+    in root, plus a GPX log of gpx_points points for each day.  Return the
+    list of day directories.
+
+    Arguments:
+    root: the trip directory, created if necessary
+    n: number of JPEG files
+    days: number of day directories
+    gpx_points: number of trackpoints in each daily GPX file
+    burst: images taken within each second, to mimic continuous shooting
+    seed: seed for the random number generator
+    width, height: image size in pixels
+    """
+    rng = random.Random(seed)
+    perday = (n + days - 1) // days
+    dirs = []
+    serials = ['SN{0:06d}'.format(rng.randrange(1000000)) for i in range(3)]
+    count = 0
+    for day in range(days):
+        localstart = TRIP_START + datetime.timedelta(days=day)
+        utcstart = localstart - CAMERA_OFFSET
+        daydir = os.path.join(root, localstart.strftime('%Y-%m-%d'))
+        os.makedirs(daydir, exist_ok=True)
+        dirs.append(daydir)
+
+        step = max(1, 36000 // max(1, gpx_points))
+        with open(os.path.join(daydir, localstart.strftime('%Y-%m-%d') +
+                               '.gpx'), 'w') as GPX:
+            GPX.write(make_gpx(day, utcstart, gpx_points, step))
+
+        for i in range(min(perday, n - count)):
+            t = (i // burst) * (36000 // max(1, perday // burst))
+            lat, lon, alt = track_position(t, day)
+            local = localstart + datetime.timedelta(seconds=t)
+            utc = local - CAMERA_OFFSET
+            exif = make_exif(local,
+                             utc,
+                             lat,
+                             lon,
+                             alt,
+                             rng.randint(1, 8),
+                             rng.choice(serials),
+                             subsec='{0:02d}'.format(i % burst * 10))
+            path = os.path.join(daydir, 'IMG_{0:06d}.JPG'.format(count))
+            with open(path, 'wb') as JPG:
+                JPG.write(make_jpeg(exif, width, height))
+            count += 1
+    return dirs
+
+def main():
+    """
+    Command line interface to generate()
+    """
+    ap = argparse.ArgumentParser()
+    ap.add_argument('-n', '--images', type=int, default=1000,
+                    help='number of JPEG files')
+    ap.add_argument('--days', type=int, default=10,
+                    help='number of day directories')
+    ap.add_argument('--gpx-points', type=int, default=3600,
+                    help='trackpoints in each daily GPX file')
+    ap.add_argument('--burst', type=int, default=3,
+                    help='images taken within each second')
+    ap.add_argument('--seed', type=int, default=1,
+                    help='random number seed')
+    ap.add_argument('--width', type=int, default=64,
+                    help='image width in pixels')
+    ap.add_argument('--height', type=int, default=48,
+                    help='image height in pixels')
+    ap.add_argument('dir', help='trip directory to fill')
+    a = ap.parse_args()
+    generate(os.path.abspath(a.dir), a.images, a.days, a.gpx_points,
+             a.burst, a.seed, a.width, a.height)
+
+if __name__ == '__main__':
+    main()
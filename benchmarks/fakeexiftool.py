@@ -0,0 +1,375 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 13:52:26 2026
+
+A stand-in for the exiftool executable, used by the benchmarks to separate
+the overhead of jpggps2kml from that of the Perl exiftool process.
+
+It reads the APP1 Exif segment of each file directly and returns the same
+group:tag dictionaries that "exiftool -j -G -n" returns for the tags written
+by corpus.py, including the signed Composite GPS position.  Run as a script
+it answers the "-stay_open True -@ -" protocol used by the sessions in
+jpggps2kml.metadata, and mimics the exiftool command line used by makegpx to
+print a GPX log.  The ExifTool class serves the requests in-process.
+
+@author: russell
+"""
+
+import json
+import os
+import os.path
+import struct
+import sys
+
+# TIFF field types and sizes
+TYPESIZE = {1: 1, 2: 1, 3: 2, 4: 4, 5: 8, 7: 1, 9: 4, 10: 8}
+
+IFD0_TAGS = {0x010f: 'Make',
+             0x0110: 'Model',
+             0x0112: 'Orientation'}
+EXIF_TAGS = {0x9003: 'DateTimeOriginal',
+             0x9010: 'OffsetTimeOriginal',
+             0x9291: 'SubSecTimeOriginal',
+             0xa431: 'SerialNumber'}
+GPS_TAGS = {0x0000: 'GPSVersionID',
+            0x0001: 'GPSLatitudeRef',
+            0x0002: 'GPSLatitude',
+            0x0003: 'GPSLongitudeRef',
+            0x0004: 'GPSLongitude',
+            0x0005: 'GPSAltitudeRef',
+            0x0006: 'GPSAltitude',
+            0x0007: 'GPSTimeStamp',
+            0x0009: 'GPSStatus',
+            0x000a: 'GPSMeasureMode',
+            0x001d: 'GPSDateStamp'}
+
+# Largest header read from each file
+HEADER_BYTES = 65536
+
+def _app1(data):
+    """
+    Return the TIFF block of the Exif APP1 segment in data, or None
+    """
+    if data[:2] != b'\xff\xd8':
+        return None
+    pos = 2
+    while pos + 4 <= len(data):
+        if data[pos] != 0xff:
+            return None
+        marker = data[pos + 1]
+        if marker == 0xda:
+            return None
+        length = struct.unpack('>H', data[pos + 2:pos + 4])[0]
+        if marker == 0xe1 and data[pos + 4:pos + 10] == b'Exif\0\0':
+            return data[pos + 10:pos + 2 + length], pos + 10
+        pos += 2 + length
+    return None
+
+def _values(tiff, endian, ftype, count, raw):
+    """
+    Decode the value of one IFD entry
+    """
+    size = TYPESIZE.get(ftype, 1) * count
+    if size > 4:
+        offset = struct.unpack(endian + 'I', raw)[0]
+        raw = tiff[offset:offset + size]
+    else:
+        raw = raw[:size]
+    if ftype == 2:
+        return raw.split(b'\0', 1)[0].decode('ascii', 'replace')
+    if ftype in (1, 7):
+        return list(raw)
+    if ftype == 3:
+        return list(struct.unpack(endian + 'H' * count, raw))
+    if ftype == 4:
+        return list(struct.unpack(endian + 'I' * count, raw))
+    if ftype in (5, 10):
+        code = 'I' if ftype == 5 else 'i'
+        pairs = struct.unpack(endian + code * 2 * count, raw)
+        return [pairs[i] / pairs[i + 1] if pairs[i + 1] else 0.0
+                for i in range(0, len(pairs), 2)]
+    return list(raw)
+
+def _ifd(tiff, endian, offset):
+    """
+    Return a dictionary tag -> (type, count, raw value bytes, entry offset)
+    for the IFD at offset
+    """
+    entries = {}
+    n = struct.unpack(endian + 'H', tiff[offset:offset + 2])[0]
+    for i in range(n):
+        pos = offset + 2 + 12 * i
+        tag, ftype, count = struct.unpack(endian + 'HHI', tiff[pos:pos + 8])
+        entries[tag] = (ftype, count, tiff[pos + 8:pos + 12], pos)
+    return entries
+
+def _number(value):
+    """
+    Format a float the way exiftool -n does in JSON
+    """
+    if value == int(value):
+        return int(value)
+    return round(value, 10)
+
+def read_tags(path):
+    """
+    Return the exiftool-style tag dictionary for one JPEG file
+    """
+    tags = {'SourceFile': path}
+    with open(path, 'rb') as f:
+        data = f.read(HEADER_BYTES)
+    found = _app1(data)
+    if not found:
+        return tags
+    tiff, base = found
+    endian = '<' if tiff[:2] == b'II' else '>'
+    ifd0 = _ifd(tiff, endian, struct.unpack(endian + 'I', tiff[4:8])[0])
+
+    def decode(ifd, names):
+        for tag, name in names.items():
+            if tag in ifd:
+                ftype, count, raw, pos = ifd[tag]
+                tags['EXIF:' + name] = _values(tiff, endian, ftype, count, raw)
+
+    decode(ifd0, IFD0_TAGS)
+    if 0x8769 in ifd0:
+        decode(_ifd(tiff, endian,
+                    struct.unpack(endian + 'I', ifd0[0x8769][2])[0]),
+               EXIF_TAGS)
+    if 0x8825 in ifd0:
+        decode(_ifd(tiff, endian,
+                    struct.unpack(endian + 'I', ifd0[0x8825][2])[0]),
+               GPS_TAGS)
+
+    # Convert to the numeric forms produced by exiftool -n
+    for key in list(tags):
+        value = tags[key]
+        if not isinstance(value, list):
+            continue
+        name = key[5:]
+        if name in ('GPSLatitude', 'GPSLongitude'):
+            d, m, s = (value + [0, 0, 0])[:3]
+            tags[key] = _number(d + m / 60.0 + s / 3600.0)
+        elif name == 'GPSTimeStamp':
+            h, m, s = (value + [0, 0, 0])[:3]
+            seconds = '{0:02d}'.format(int(s))
+            if s != int(s):
+                seconds += ('{0:.6f}'.format(s - int(s))[1:]).rstrip('0')
+            tags[key] = '{0:02d}:{1:02d}:{2}'.format(int(h), int(m), seconds)
+        elif name == 'GPSVersionID':
+            tags[key] = ' '.join(str(v) for v in value)
+        elif len(value) == 1:
+            tags[key] = _number(value[0])
+    if 'EXIF:GPSMeasureMode' in tags:
+        tags['EXIF:GPSMeasureMode'] = int(tags['EXIF:GPSMeasureMode'])
+
+    # The Composite position carries the sign of the reference tags
+    for name, negative in (('GPSLatitude', 'S'), ('GPSLongitude', 'W')):
+        if 'EXIF:' + name in tags:
+            value = tags['EXIF:' + name]
+            if tags.get('EXIF:' + name + 'Ref') == negative:
+                value = -value
+            tags['Composite:' + name] = value
+    if 'EXIF:GPSAltitude' in tags:
+        value = tags['EXIF:GPSAltitude']
+        if tags.get('EXIF:GPSAltitudeRef') == 1:
+            value = -value
+        tags['Composite:GPSAltitude'] = value
+    return tags
+
+def write_orientation(path, orientation):
+    """
+    Overwrite the Orientation tag of a file in place
+    """
+    with open(path, 'r+b') as f:
+        data = f.read(HEADER_BYTES)
+        found = _app1(data)
+        if not found:
+            return False
+        tiff, base = found
+        endian = '<' if tiff[:2] == b'II' else '>'
+        ifd0 = _ifd(tiff, endian, struct.unpack(endian + 'I', tiff[4:8])[0])
+        if 0x0112 not in ifd0:
+            return False
+        f.seek(base + ifd0[0x0112][3] + 8)
+        f.write(struct.pack(endian + 'H', orientation))
+    return True
+
+class ExifTool(object):
+    """
+    Drop-in replacement for the subset of exiftool.ExifTool used by
+    jpggps2kml, reading tags in-process.
+    """
+    def __init__(self, executable_=None, common_args=None, *args, **kwargs):
+        """
+        The arguments are accepted for compatibility and ignored
+        """
+        self.running = False
+        self.common_args = common_args
+
+    def start(self):
+        """
+        Nothing to start
+        """
+        self.running = True
+
+    def terminate(self):
+        """
+        Nothing to stop
+        """
+        self.running = False
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.terminate()
+
+    def _split(self, params):
+        """
+        Separate requested tags, assignments and file names in params
+        """
+        tags = []
+        assignments = {}
+        files = []
+        skip = False
+        for p in params:
+            if isinstance(p, bytes):
+                p = p.decode('utf-8')
+            if skip:
+                skip = False
+            elif p == '-charset':
+                skip = True
+            elif p.startswith('-'):
+                if '=' in p:
+                    name, value = p[1:].split('=', 1)
+                    assignments[name.split(':')[-1]] = value
+                elif p[1:] not in ('j', 'n', 'G', 'fast', 'fast2',
+                                   'overwrite_original', 'q', 'm'):
+                    tags.append(p[1:])
+            else:
+                files.append(p)
+        return tags, assignments, files
+
+    def execute_json(self, *params):
+        """
+        Return the tag dictionaries for the files in params, restricted to
+        any tags requested with -TAG
+        """
+        tags, assignments, files = self._split(params)
+        result = []
+        for f in files:
+            alltags = read_tags(f)
+            if tags:
+                wanted = {'SourceFile': alltags['SourceFile']}
+                for t in tags:
+                    key = t if ':' in t else 'EXIF:' + t
+                    if key in alltags:
+                        wanted[key] = alltags[key]
+                alltags = wanted
+            result.append(alltags)
+        return result
+
+    def execute(self, *params):
+        """
+        Apply -Orientation=N assignments; other writes are ignored
+        """
+        tags, assignments, files = self._split(params)
+        updated = 0
+        if 'Orientation' in assignments:
+            value = int(assignments['Orientation'].rstrip('#'))
+            for f in files:
+                updated += write_orientation(f, value)
+        return ('{0:5d} image files updated\n'.format(updated)).encode()
+
+    def get_metadata_batch(self, filenames):
+        return self.execute_json(*filenames)
+
+    def get_metadata(self, filename):
+        return self.execute_json(filename)[0]
+
+    def get_tags_batch(self, tags, filenames):
+        return self.execute_json(*(['-' + t for t in tags] + list(filenames)))
+
+    def get_tags(self, tags, filename):
+        return self.get_tags_batch(tags, [filename])[0]
+
+def install():
+    """
+    Make the exiftool sessions of jpggps2kml run this script instead of
+    exiftool for the rest of the process
+    """
+    from jpggps2kml import metadata
+    metadata.EXIFTOOL = [sys.executable, os.path.abspath(__file__)]
+
+def stay_open(argv):
+    """
+    Answer the requests of "exiftool -stay_open True -@ - -common_args
+    ARGS" read from stdin, one argument per line, each request ended by
+    -executeN and answered by its output followed by {readyN}
+    """
+    common = argv[argv.index('-common_args') + 1:]
+    et = ExifTool()
+    params = []
+    for line in sys.stdin.buffer:
+        # file names are bytes, as they are on disk
+        p = os.fsdecode(line.rstrip(b'\n'))
+        if p == 'False' and params[-1:] == ['-stay_open']:
+            return
+        if not p.startswith('-execute'):
+            params.append(p)
+            continue
+        if '-j' in params:
+            output = json.dumps(et.execute_json(*(common + params)),
+                                ensure_ascii=False)
+        else:
+            output = et.execute(*(common + params)).decode()
+        sys.stdout.buffer.write(os.fsencode(output + '\n{ready' + p[8:] +
+                                            '}\n'))
+        sys.stdout.flush()
+        params = []
+
+def gpx_command(argv):
+    """
+    Mimic "exiftool -r -if '$gpsdatetime' -fileOrder gpsdatetime -p FMT
+    -d FMT DIR" as run by makegpx, printing a GPX log to stdout
+    """
+    dirs = [a for a in argv if os.path.isdir(a)]
+    points = []
+    for d in dirs:
+        for root, subdirs, files in os.walk(d):
+            for f in files:
+                if os.path.splitext(f)[1].lower() in ('.jpg', '.jpeg'):
+                    t = read_tags(os.path.join(root, f))
+                    if 'EXIF:GPSDateStamp' in t and 'EXIF:GPSLatitude' in t:
+                        lat = t['EXIF:GPSLatitude']
+                        if t.get('EXIF:GPSLatitudeRef') == 'S':
+                            lat = -lat
+                        lon = t['EXIF:GPSLongitude']
+                        if t.get('EXIF:GPSLongitudeRef') == 'W':
+                            lon = -lon
+                        when = (t['EXIF:GPSDateStamp'].replace(':', '-') +
+                                'T' + t['EXIF:GPSTimeStamp'][:8] + 'Z')
+                        points.append((when, lat, lon,
+                                       t.get('EXIF:GPSAltitude', 0)))
+    points.sort()
+    out = ['<?xml version="1.0" encoding="utf-8"?>',
+           '<gpx version="1.0" creator="fakeexiftool" '
+           'xmlns="http://www.topografix.com/GPX/1/0">',
+           '<trk>', '<number>1</number>', '<trkseg>']
+    for when, lat, lon, alt in points:
+        out.append('<trkpt lat="{0}" lon="{1}">'
+                   '<ele>{2}</ele><time>{3}</time></trkpt>'.format(
+                       lat, lon, alt, when))
+    out.extend(['</trkseg>', '</trk>', '</gpx>'])
+    print('\n'.join(out))
+
+if __name__ == '__main__':
+    if '-stay_open' in sys.argv:
+        stay_open(sys.argv[1:])
+    elif '-j' in sys.argv:
+        print(json.dumps(ExifTool().execute_json(*sys.argv[1:])))
+    else:
+        gpx_command(sys.argv[1:])
@@ -0,0 +1,191 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 14:31:09 2026
+
+End-to-end benchmarks of the jpggps2kml commands on synthetic corpora.
+
+For each corpus size a trip is generated with corpus.py (and kept between
+runs in the work directory), then makekml, findoffset, editgps, orientjpeg
+and makegpx are run in-process with --profile=json, so that both the total
+time and the per-stage breakdown are recorded.  Unless --real-exiftool is
+given, the exiftool executable is replaced by the stand-in in
+fakeexiftool.py and jpegtran by a small stub, which isolates
+the overhead of jpggps2kml itself from that of the external tools.
+
+One JSON object per command and size is appended to the results file, so
+trends can be tracked across releases.
+
+Usage:
+    python benchmarks/run.py [--sizes 1000,10000,100000]
+                             [--commands makekml,findoffset,...]
+                             [--workdir DIR] [--results FILE]
+
+@author: russell
+"""
+
+import argparse
+import contextlib
+import datetime
+import io
+import json
+import os
+import os.path
+import platform
+import subprocess
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+sys.path.insert(0, HERE)
+
+import corpus
+import fakeexiftool
+
+COMMANDS = ['makekml', 'findoffset', 'editgps', 'orientjpeg', 'makegpx']
+
+def version():
+    """
+    Identify the code being benchmarked, preferring git describe
+    """
+    try:
+        return subprocess.check_output(
+                   ['git', 'describe', '--always', '--dirty'],
+                   cwd=os.path.dirname(HERE),
+                   stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+def make_stubs(bindir):
+    """
+    Write exiftool and jpegtran stand-in executables into bindir
+    """
+    os.makedirs(bindir, exist_ok=True)
+    stubs = {'exiftool': '#!/bin/sh\nexec "{0}" "{1}" "$@"\n'.format(
+                 sys.executable, os.path.join(HERE, 'fakeexiftool.py')),
+             'jpegtran': '#!/bin/sh\nexec "{0}" -c "import shutil, sys; '
+                         'a = sys.argv; '
+                         'shutil.copyfile(a[-1], a[a.index(\'-outfile\') + 1])'
+                         '" "$@"\n'.format(sys.executable)}
+    for name, text in stubs.items():
+        path = os.path.join(bindir, name)
+        with open(path, 'w') as f:
+            f.write(text)
+        os.chmod(path, 0o755)
+
+def prepare(workdir, size, days, gpx_points):
+    """
+    Generate (or reuse) the corpus for one size and return its directory
+    """
+    root = os.path.join(workdir, 'corpus-{0}-{1}-{2}'.format(size,
+                                                          days,
+                                                          gpx_points))
+    stamp = os.path.join(root, '.complete')
+    if not os.path.exists(stamp):
+        corpus.generate(root, size, days=days, gpx_points=gpx_points)
+        open(stamp, 'w').close()
+    return root
+
+def arguments(command, root, outdir):
+    """
+    Return the command line for one command on one corpus
+    """
+    days = sorted(os.path.join(root, d) for d in os.listdir(root)
+                  if os.path.isdir(os.path.join(root, d)))
+    common = ['--verbosity=quiet', '--profile=json']
+    if command == 'makekml':
+        return common + ['--out=' + os.path.join(outdir, 'trip.kml')] + days
+    if command == 'makegpx':
+        fmt = os.path.join(outdir, 'gpx.fmt')
+        open(fmt, 'w').close()
+        gpxdir = os.path.join(outdir, 'gpx')
+        os.makedirs(gpxdir, exist_ok=True)
+        return common + ['--fmt=' + fmt, '--gpx=' + gpxdir] + days
+    return common + days
+
+def run(command, argv):
+    """
+    Run one entry point in-process and return (seconds, profile dict)
+    """
+    from jpggps2kml import jpggps2kml
+
+    saved = sys.argv
+    stderr = io.StringIO()
+    sys.argv = [command] + argv
+    start = time.perf_counter()
+    try:
+        with contextlib.redirect_stderr(stderr), \
+             contextlib.redirect_stdout(io.StringIO()):
+            getattr(jpggps2kml, command)()
+    finally:
+        elapsed = time.perf_counter() - start
+        sys.argv = saved
+
+    text = stderr.getvalue()
+    profile = None
+    start = text.find('{\n')
+    if start >= 0:
+        try:
+            profile = json.JSONDecoder().raw_decode(text[start:])[0]
+        except ValueError:
+            profile = None
+    return elapsed, profile
+
+def main():
+    """
+    Generate the corpora, run the commands and record the results
+    """
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--sizes', default='1000',
+                    help='comma separated corpus sizes, e.g. 1000,10000,100000')
+    ap.add_argument('--commands', default=','.join(COMMANDS),
+                    help='comma separated commands to run')
+    ap.add_argument('--days', type=int, default=10,
+                    help='day directories in each corpus')
+    ap.add_argument('--gpx-points', type=int, default=3600,
+                    help='trackpoints in each daily GPX file')
+    ap.add_argument('--workdir', default=os.path.join(HERE, 'work'),
+                    help='directory holding the generated corpora')
+    ap.add_argument('--results', default=os.path.join(HERE, 'results.jsonl'),
+                    help='file to which results are appended')
+    ap.add_argument('--real-exiftool', action='store_true',
+                    help='use the installed exiftool and jpegtran')
+    a = ap.parse_args()
+
+    if not a.real_exiftool:
+        fakeexiftool.install()
+        bindir = os.path.join(a.workdir, 'bin')
+        make_stubs(bindir)
+        os.environ['PATH'] = bindir + os.pathsep + os.environ['PATH']
+
+    common = {'version': version(),
+              'date': datetime.datetime.utcnow().strftime(
+                          '%Y-%m-%dT%H:%M:%SZ'),
+              'python': platform.python_version(),
+              'machine': platform.machine(),
+              'exiftool': 'real' if a.real_exiftool else 'fake'}
+
+    with open(a.results, 'a') as RESULTS:
+        for size in [int(s) for s in a.sizes.split(',')]:
+            root = prepare(a.workdir, size, a.days, a.gpx_points)
+            outdir = os.path.join(a.workdir, 'out-{0}'.format(size))
+            os.makedirs(outdir, exist_ok=True)
+
+            for command in a.commands.split(','):
+                seconds, profile = run(command,
+                                       arguments(command, root, outdir))
+                result = dict(common)
+                result.update({'command': command,
+                               'size': size,
+                               'seconds': seconds,
+                               'files_per_second': size / seconds,
+                               'stages': profile['stages'] if profile
+                                         else []})
+                RESULTS.write(json.dumps(result) + '\n')
+                RESULTS.flush()
+                print('{0:>8d} {1:12s} {2:9.3f} s {3:10.1f} files/s'.format(
+                          size, command, seconds, size / seconds))
+
+if __name__ == '__main__':
+    main()
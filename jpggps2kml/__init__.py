@@ -2,6 +2,25 @@
 """
 Created on Mon Mar  7 18:55:31 2016
 
+Library API:
+    scanner     discovery of the JPEG and GPX files
+    metadata    EXIF metadata through exiftool sessions
+    gpx         tracks from GPX files
+    kml         the KML document skeleton and track placemarks
+    orient      lossless rotation to the EXIF Orientation
+
+The submodules are loaded on first access as attributes of the package, so
+importing the package costs nothing until they are used.
+
 @author: russell
 """
 
+import importlib
+
+__all__ = ['gpx', 'kml', 'metadata', 'orient', 'scanner']
+
+def __getattr__(name):
+    if name in __all__:
+        return importlib.import_module('.' + name, __name__)
+    raise AttributeError('module ' + repr(__name__) +
+                         ' has no attribute ' + repr(name))
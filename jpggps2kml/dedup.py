@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 22:08:37 2026
+Copyright (C) 2016 Russell O. Redman
+
+Detection of identical copies of an image held in several directories.
+
+An archive often holds the same photograph in several album directories.
+The candidates are found cheaply from the metadata already read: copies
+must share DateTimeOriginal (with SubSecTimeOriginal) and the camera serial
+number, and then the file size.  Only files that still collide are read,
+first hashing their first and last blocks and, for large files that agree
+on those, the whole file.  The first copy in date, time and path order is
+kept and the rooted paths of the others are recorded as its alternates.
+
+@author: russell
+@email: russell@roredman.ca
+"""
+
+import hashlib
+import os
+
+from . import profiling
+
+# Bytes hashed at each end of a file by the partial hash
+BLOCK = 65536
+
+def _size(r):
+    """
+    Return the size of the file of imagerecord r, or None if it is gone
+    """
+    try:
+        return os.stat(r.path).st_size
+    except OSError:
+        return None
+
+def partial_hash(path, size):
+    """
+    Return a digest of the first and last BLOCK bytes of a file of the
+    given size, which covers the whole file if size <= 2 * BLOCK
+    """
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        h.update(f.read(BLOCK))
+        if size > BLOCK:
+            f.seek(max(BLOCK, size - BLOCK))
+            h.update(f.read(BLOCK))
+    return h.digest()
+
+def full_hash(path):
+    """
+    Return a digest of the whole file
+    """
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        for data in iter(lambda: f.read(1 << 20), b''):
+            h.update(data)
+    return h.digest()
+
+def _split(group, key):
+    """
+    Split a list of imagerecords by key(r), returning (key, records) for
+    each key shared by two or more records.  Records whose key is None are
+    dropped.
+    """
+    bykey = {}
+    for r in group:
+        k = key(r)
+        if k is not None:
+            bykey.setdefault(k, []).append(r)
+    return [(k, g) for k, g in bykey.items() if len(g) > 1]
+
+def _digest(path, size, sc):
+    """
+    Return the partial_hash of path if its size is given, otherwise its
+    full_hash, counting the bytes read in the stagecounter sc.  Return None
+    if the file cannot be read.
+    """
+    try:
+        if size is None:
+            sc.add(files=1, nbytes=os.path.getsize(path))
+            return full_hash(path)
+        sc.add(files=1, nbytes=min(size, 2 * BLOCK))
+        return partial_hash(path, size)
+    except OSError:
+        return None
+
+def unique(imagerecords, profile=None):
+    """
+    Return the imagerecords with all but one copy of each identical image
+    removed.  The alternates of each record kept are set to the sorted
+    rooted paths of its dropped copies, or None if it has none.
+
+    Arguments:
+    imagerecords: a list of imagerecords
+    profile: the stageprofile charged with the work, if any
+    """
+    if profile is None:
+        profile = profiling.stageprofile()
+
+    with profile.stage('dedup') as sc:
+        candidates = {}
+        for r in imagerecords:
+            r.alternates = None
+            if r.epoch == r.epoch:
+                candidates.setdefault((r.epoch, r.serial), []).append(r)
+
+        dropped = set()
+        for group in candidates.values():
+            if len(group) < 2:
+                continue
+            for size, samesize in _split(group, _size):
+                for digest, copies in _split(
+                        samesize, lambda r: _digest(r.path, size, sc)):
+                    if size > 2 * BLOCK:
+                        identical = [same for digest, same in _split(
+                            copies, lambda r: _digest(r.path, None, sc))]
+                    else:
+                        # the partial hash covered the whole file
+                        identical = [copies]
+                    for same in identical:
+                        same.sort(key=lambda r: r.sortkey())
+                        same[0].alternates = [r.rooted for r in same[1:]]
+                        dropped.update(id(r) for r in same[1:])
+        sc.add(points=len(dropped))
+
+    if not dropped:
+        return imagerecords
+    return [r for r in imagerecords if id(r) not in dropped]
+
+def unique_sorted(imagerecords, profile=None):
+    """
+    Iterate over imagerecords given in date, time and path order, with all
+    but one copy of each identical image removed as by unique().  Copies
+    share DateTimeOriginal, so only the records taken at one time are held
+    at once.
+
+    Arguments:
+    imagerecords: an iterator over imagerecords in sortkey() order
+    profile: the stageprofile charged with the work, if any
+    """
+    group = []
+    for r in imagerecords:
+        if group and (r.datestr != group[0].datestr or
+                      r.timestr != group[0].timestr):
+            yield from (unique(group, profile) if len(group) > 1 else group)
+            group = []
+        r.alternates = None
+        group.append(r)
+    yield from (unique(group, profile) if len(group) > 1 else group)
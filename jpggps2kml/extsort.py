@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 16:02:45 2026
+Copyright (C) 2016 Russell O. Redman
+
+External sort of the imagerecords collected by makekml.
+
+The image placemarks are written in date, time and path order, and the
+photo-derived tracks are built from the images in time order, so every
+located image has to be sorted before anything is written.  The records
+are kept in memory until their estimated size (RECORDBYTES each) reaches
+the --sort-memory budget, when they are sorted and spilled as a run of JSON
+lines to an anonymous temporary file.  sorted() then merges the runs and
+the records still in memory in a single streaming k-way pass with
+heapq.merge, so that the output of ten million images is written within
+the same budget as that of ten thousand.  A run that never reaches its
+budget is sorted in memory and never touches the disk.
+
+@author: russell
+@email: russell@roredman.ca
+"""
+
+import heapq
+import itertools
+import json
+import tempfile
+
+from . import profiling
+from . import records
+
+# Estimated memory held by one imagerecord with its strings, in bytes
+# (see benchmarks/bench_records.py)
+RECORDBYTES = 640
+
+# Default budget for the records held in memory, in megabytes
+MEMORY = 1024
+
+# Records serialized at a time when a run is spilled
+CHUNKSIZE = 256
+
+def budget(megabytes):
+    """
+    Return the number of imagerecords that fit in megabytes of memory
+    """
+    return max(1, int(megabytes * (1 << 20) / RECORDBYTES))
+
+class recordsorter():
+    """
+    Collects imagerecords and returns them in date, time and path order,
+    spilling sorted runs to temporary files when they exceed the budget
+    """
+    def __init__(self, limit=None, profile=None):
+        """
+        Arguments:
+        limit: the number of records held in memory before a run is
+            spilled, budget(MEMORY) by default
+        profile: the stageprofile charged with the spills, if any
+        """
+        if limit is None:
+            limit = budget(MEMORY)
+        if profile is None:
+            profile = profiling.stageprofile()
+        self.limit = limit
+        self.profile = profile
+        self.records = []
+        self.runs = []
+        self.count = 0
+
+    def __len__(self):
+        """
+        Number of records added
+        """
+        return self.count
+
+    def add(self, imagerecords):
+        """
+        Add a list of imagerecords, spilling a run if the budget is reached
+        """
+        self.records.extend(imagerecords)
+        self.count += len(imagerecords)
+        if len(self.records) >= self.limit:
+            self.spill()
+
+    def spill(self):
+        """
+        Sort the records in memory and write them to a new run
+        """
+        with self.profile.stage('sort', files=len(self.records)) as sc:
+            self.records.sort(key=records.imagerecord.sortkey)
+            f = tempfile.TemporaryFile('w+', encoding='utf-8')
+            for c in range(0, len(self.records), CHUNKSIZE):
+                text = ''.join([json.dumps(r.fields()) + '\n'
+                                for r in self.records[c:c + CHUNKSIZE]])
+                f.write(text)
+                sc.add(nbytes=len(text))
+            self.runs.append(f)
+            self.records = []
+
+    def _run(self, f):
+        """
+        Iterate over the imagerecords of a spilled run
+        """
+        f.seek(0)
+        for line in f:
+            yield records.imagerecord.from_fields(json.loads(line))
+
+    def sorted(self):
+        """
+        Return an iterator over every record in date, time and path order.
+        It can be called again once the previous iterator is exhausted, but
+        only one iterator may be in use at a time.
+        """
+        with self.profile.stage('sort'):
+            self.records.sort(key=records.imagerecord.sortkey)
+        if not self.runs:
+            return iter(self.records)
+        return heapq.merge(*[self._run(f) for f in self.runs],
+                           iter(self.records),
+                           key=records.imagerecord.sortkey)
+
+    def chunks(self, chunksize=CHUNKSIZE):
+        """
+        Iterate over lists of at most chunksize records in sorted order
+        """
+        images = self.sorted()
+        while True:
+            chunk = list(itertools.islice(images, chunksize))
+            if not chunk:
+                break
+            yield chunk
+
+    def close(self):
+        """
+        Delete the spilled runs and drop the records
+        """
+        for f in self.runs:
+            f.close()
+        self.runs = []
+        self.records = []
+        self.count = 0
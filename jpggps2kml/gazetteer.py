@@ -0,0 +1,510 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Tue Oct 20 14:12:08 2026
+Copyright (C) 2016 Russell O. Redman
+
+Offline reverse geocoding of tracks and images against a local gazetteer.
+
+Tracks are named after their GPX files or days and images are described by
+their directories, neither of which tells a viewer where they are.  With
+--gazetteer PATH makekml names each track after the place nearest to its
+centre and adds the nearest place to the description of each image.  The
+gazetteer is a GeoNames dump (cities500.txt, allCountries.txt or the .zip
+they are distributed in), from which the populated places and the
+mountains, hills and valleys are taken, or a CSV file with a header naming
+its name, latitude and longitude columns and optionally a country column.
+
+Reading millions of rows of text on every run would take far longer than
+the lookups, so the places are sorted once into a grid of RESOLUTION degree
+cells and kept in a directory beside the file, named by appending
+INDEXSUFFIX, holding:
+    meta.json   the path, size and mtime of the gazetteer, the resolution
+                and the number of places
+    lat.npy, lon.npy   the position of each place in radians (float64)
+    coslat.npy  the cosine of the latitude (float64)
+    start.npy   the first place in each cell, with one more entry for the
+                end of the last cell (int32), the places being sorted by cell
+    label.npy   the "name, country" of every place, as UTF-8 (uint8)
+    end.npy     the end of the label of each place in label.npy (int32)
+in the .npy format written by gpxcache, so that a later run maps them in a
+fraction of a second.  The index is rebuilt whenever the size or mtime of
+the gazetteer changes.
+
+The nearest place is found by searching the rings of cells around the
+position, nearest first, until the great circle distance to every cell not
+yet searched must exceed that of the best place found, or the radius
+beyond which no place is reported (RADIUS unless --gazetteer-radius is
+given), so that a position far from every place costs no more than one
+near the edge of the radius.  Positions seen before are answered from a
+memo.  With numpy installed, nearest_many()
+searches each ring for a whole batch of positions at once.
+
+@author: russell
+@email: russell@roredman.ca
+"""
+
+import array
+import csv
+import functools
+import io
+import itertools
+import math
+import os
+import os.path
+import sys
+import zipfile
+
+from . import gpxcache
+from . import trackstats
+
+# Bumped whenever the layout of the index changes
+VERSION = 1
+
+# Size of the grid cells in degrees
+RESOLUTION = 0.2
+
+# Appended to the path of the gazetteer to name its index directory
+INDEXSUFFIX = '.index'
+
+# GeoNames feature classes kept: populated places and terrain features
+PLACECLASSES = ('P', 'T')
+
+# Columns of a GeoNames dump
+GEONAMES_NAME = 1
+GEONAMES_LAT = 4
+GEONAMES_LON = 5
+GEONAMES_CLASS = 6
+GEONAMES_COUNTRY = 8
+
+# Accepted CSV header names, in order of preference
+CSV_NAME = ('name', 'asciiname', 'place')
+CSV_LAT = ('latitude', 'lat')
+CSV_LON = ('longitude', 'lon', 'lng')
+CSV_COUNTRY = ('country_code', 'country code', 'country', 'cc')
+
+# Upper bound on the number of positions remembered by nearest()
+CACHESIZE = 65536
+
+# Default distance in metres beyond which no place is reported
+RADIUS = 50000.0
+
+# The columns of the index, as described above
+COLUMNS = ('start', 'end', 'lat', 'lon', 'coslat', 'label')
+
+def _open_text(path):
+    """
+    Return a text stream of the gazetteer at path, reading the largest
+    .txt or .csv member of a .zip file
+    """
+    if zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path) as archive:
+            members = [m for m in archive.infolist()
+                       if m.filename.lower().endswith(('.txt', '.csv'))]
+            if not members:
+                raise ValueError(path + ' holds no .txt or .csv file')
+            member = max(members, key=lambda m: m.file_size)
+            # The open member holds the file of the archive until the
+            # stream is closed, after the archive itself
+            return io.TextIOWrapper(archive.open(member),
+                                    encoding='utf-8',
+                                    newline='')
+    return open(path, encoding='utf-8', newline='')
+
+def _column(header, names):
+    """
+    Return the index in header of the first of names present, or None
+    """
+    lowered = [h.strip().lower() for h in header]
+    for name in names:
+        if name in lowered:
+            return lowered.index(name)
+    return None
+
+def read_places(path):
+    """
+    Iterate over (label, lat, lon) for each place in the gazetteer at path,
+    with lat and lon in degrees.  Raise ValueError if the CSV header does
+    not name the name, latitude and longitude columns.
+    """
+    with _open_text(path) as f:
+        first = f.readline()
+        if first.count('\t') >= GEONAMES_COUNTRY:
+            # A GeoNames dump, which has no header
+            for line in itertools.chain([first], f):
+                fields = line.rstrip('\r\n').split('\t')
+                if (len(fields) <= GEONAMES_COUNTRY or
+                        fields[GEONAMES_CLASS] not in PLACECLASSES):
+                    continue
+                yield (_label(fields[GEONAMES_NAME],
+                              fields[GEONAMES_COUNTRY]),
+                       fields[GEONAMES_LAT],
+                       fields[GEONAMES_LON])
+            return
+        header = next(csv.reader([first]))
+        name = _column(header, CSV_NAME)
+        lat = _column(header, CSV_LAT)
+        lon = _column(header, CSV_LON)
+        country = _column(header, CSV_COUNTRY)
+        if name is None or lat is None or lon is None:
+            raise ValueError(path + ' does not have name, latitude and '
+                             'longitude columns')
+        last = max(name, lat, lon)
+        for fields in csv.reader(f):
+            if len(fields) <= last:
+                continue
+            yield (_label(fields[name],
+                          fields[country] if country is not None and
+                                             country < len(fields) else ''),
+                   fields[lat],
+                   fields[lon])
+
+def _label(name, country):
+    """
+    Return the label of a place
+    """
+    name = name.strip()
+    country = country.strip()
+    return name + ', ' + country if country else name
+
+def build(places, resolution=RESOLUTION):
+    """
+    Sort the (label, lat, lon) places by cell into the columns of the grid
+    index described above, returned as a dictionary of arrays
+    """
+    cols = int(round(360.0 / resolution))
+    rows = int(round(180.0 / resolution))
+    cells = array.array('i')
+    lats = array.array('d')
+    lons = array.array('d')
+    labels = []
+    for label, lat, lon in places:
+        try:
+            lat = float(lat)
+            lon = float(lon)
+        except ValueError:
+            continue
+        if not (-90.0 <= lat <= 90.0) or math.isnan(lon) or not label:
+            continue
+        lon = (lon + 180.0) % 360.0 - 180.0
+        r = min(rows - 1, int((lat + 90.0) // resolution))
+        c = min(cols - 1, int((lon + 180.0) // resolution))
+        cells.append(r * cols + c)
+        lats.append(lat)
+        lons.append(lon)
+        labels.append(label)
+
+    order = sorted(range(len(cells)), key=cells.__getitem__)
+    start = array.array('i', [0]) * (rows * cols + 1)
+    for cell in cells:
+        start[cell + 1] += 1
+    total = 0
+    for k in range(len(start)):
+        total += start[k]
+        start[k] = total
+
+    blob = bytearray()
+    end = array.array('i')
+    for i in order:
+        blob += labels[i].encode('utf-8')
+        end.append(len(blob))
+    lat = array.array('d', [math.radians(lats[i]) for i in order])
+    return {'lat': lat,
+            'lon': array.array('d', [math.radians(lons[i]) for i in order]),
+            'coslat': array.array('d', [math.cos(v) for v in lat]),
+            'start': start,
+            'end': end,
+            'label': bytes(blob)}
+
+@functools.lru_cache(maxsize=None)
+def _ring(k):
+    """
+    Return the (row, column) offsets of the cells of ring k, in the order
+    they are searched
+    """
+    if not k:
+        return ((0, 0),)
+    offsets = []
+    for dr in range(-k, k + 1):
+        if abs(dr) == k:
+            offsets.extend((dr, dc) for dc in range(-k, k + 1))
+        else:
+            offsets.extend(((dr, -k), (dr, k)))
+    return tuple(offsets)
+
+def _bound(res, rows, cols, lat, lon, r, c, k):
+    """
+    Return the haversine of the least angle from (lat, lon), in cell (r, c)
+    of a grid of res degree cells, to any place outside ring k, or None once
+    the rings cover the whole sphere
+    """
+    south = (r - k) * res - 90.0
+    north = (r + k + 1) * res - 90.0
+    dlat = min(lat - south if r - k > 0 else 180.0,
+               north - lat if r + k < rows - 1 else 180.0)
+    if 2 * k + 1 >= cols:
+        if dlat >= 180.0:
+            return None
+        return math.sin(math.radians(dlat) / 2) ** 2
+    # A place beyond the ring in longitude but not in latitude lies between
+    # south and north, at least dlon away in longitude
+    dlon = min(lon - ((c - k) * res - 180.0), (c + k + 1) * res - 180.0 - lon)
+    edge = min(90.0, max(abs(south), abs(north)))
+    return min(math.sin(math.radians(dlat) / 2) ** 2,
+               math.cos(math.radians(lat)) * math.cos(math.radians(edge)) *
+               math.sin(math.radians(dlon) / 2) ** 2)
+
+class gazetteer():
+    """
+    The grid index of a gazetteer
+    """
+    def __init__(self, resolution, columns, radius=RADIUS):
+        """
+        Arguments:
+        resolution: the size of the grid cells in degrees
+        columns: a dictionary of the columns described above
+        radius: the distance in metres beyond which no place is reported,
+            or None to report the nearest place however far
+        """
+        self.resolution = resolution
+        self.radius = radius
+        if radius is None:
+            # Every place is nearer than the haversine of half a turn
+            self.limit = 1.0
+        else:
+            self.limit = math.sin(min(radius / trackstats.EARTH_RADIUS,
+                                      math.pi) / 2) ** 2
+        self.cols = int(round(360.0 / resolution))
+        self.rows = int(round(180.0 / resolution))
+        self.lat = columns['lat']
+        self.lon = columns['lon']
+        self.coslat = columns['coslat']
+        self.start = columns['start']
+        self.end = columns['end']
+        self.label = columns['label']
+        self.nearest = functools.lru_cache(maxsize=CACHESIZE)(self._nearest)
+
+    def __len__(self):
+        """
+        Number of places
+        """
+        return len(self.lat)
+
+    @classmethod
+    def load(cls, path, verbosity=1, radius=RADIUS):
+        """
+        Return the index of the gazetteer at path, from its index directory
+        if that is current, otherwise building the index and storing it
+        for later runs, reporting no place further than radius metres.
+        Raise OSError or ValueError if the gazetteer cannot be read.
+        """
+        entry = path + INDEXSUFFIX
+        meta = gpxcache.current_entry(entry, path, VERSION)
+        if meta is not None:
+            try:
+                return cls(meta['resolution'],
+                           gpxcache.map_entry(entry, COLUMNS),
+                           radius)
+            except (OSError, ValueError, KeyError):
+                pass
+
+        if verbosity > 0:
+            print('building the gazetteer index of ' + path, file=sys.stderr)
+        columns = build(read_places(path))
+        gpxcache.store_entry(entry,
+                             path,
+                             VERSION,
+                             {'resolution': RESOLUTION,
+                              'places': len(columns['lat'])},
+                             columns)
+        return cls(RESOLUTION, columns, radius)
+
+    def place(self, i):
+        """
+        Return the label of place i
+        """
+        begin = self.end[i - 1] if i else 0
+        return bytes(self.label[begin:self.end[i]]).decode('utf-8')
+
+    def _nearest(self, lat, lon):
+        """
+        Return (label, metres) of the place nearest to (lat, lon) in
+        decimal degrees, or None if either is NaN or there is no place
+        within the radius
+        """
+        if math.isnan(lat) or math.isnan(lon) or not len(self.lat):
+            return None
+        lon = (lon + 180.0) % 360.0 - 180.0
+        res = self.resolution
+        rows = self.rows
+        cols = self.cols
+        r = min(rows - 1, max(0, int((lat + 90.0) // res)))
+        c = min(cols - 1, int((lon + 180.0) // res))
+        phi = math.radians(lat)
+        lam = math.radians(lon)
+        cosphi = math.cos(phi)
+        sin = math.sin
+        start = self.start
+        plat = self.lat
+        plon = self.lon
+        pcos = self.coslat
+
+        limit = self.limit
+        best = 2.0
+        besti = -1
+        searched = set()
+        k = 0
+        while True:
+            wide = 2 * k + 1 >= cols
+            for dr, dc in (_ring(k) if not wide else
+                           [(dr, cc - c) for dr in range(-k, k + 1)
+                            for cc in range(cols)]):
+                rr = r + dr
+                if not 0 <= rr < rows:
+                    continue
+                cell = rr * cols + (c + dc) % cols
+                if wide:
+                    # Rings this wide wrap around onto cells already seen
+                    if cell in searched:
+                        continue
+                    searched.add(cell)
+                for i in range(start[cell], start[cell + 1]):
+                    # The haversine of the angle to place i
+                    h = (sin((plat[i] - phi) / 2) ** 2 +
+                         cosphi * pcos[i] *
+                         sin((plon[i] - lam) / 2) ** 2)
+                    if h < best:
+                        best = h
+                        besti = i
+            bound = _bound(res, rows, cols, lat, lon, r, c, k)
+            if (bound is None or bound > limit or
+                    (besti >= 0 and best <= bound)):
+                break
+            k += 1
+        if besti < 0 or best > limit:
+            return None
+        angle = 2 * math.asin(math.sqrt(min(best, 1.0)))
+        return self.place(besti), angle * trackstats.EARTH_RADIUS
+
+    def nearest_many(self, lats, lons):
+        """
+        Return the nearest() of each position in the sequences lats and
+        lons.  With numpy installed the positions are searched together, 
+        one cell of each ring at a time.
+        """
+        np = trackstats.optional_numpy()
+        if np is None or not len(self.lat):
+            return [self.nearest(float(lat), float(lon))
+                    for lat, lon in zip(lats, lons)]
+        lat = np.asarray(lats, dtype=np.float64)
+        lon = (np.asarray(lons, dtype=np.float64) + 180.0) % 360.0 - 180.0
+        n = len(lat)
+        res = self.resolution
+        rows = self.rows
+        cols = self.cols
+        start = np.frombuffer(self.start, dtype=np.int32)
+        plat = np.frombuffer(self.lat, dtype=np.float64)
+        plon = np.frombuffer(self.lon, dtype=np.float64)
+        pcos = np.frombuffer(self.coslat, dtype=np.float64)
+        phi = np.radians(lat)
+        lam = np.radians(lon)
+        cosphi = np.cos(phi)
+        best = np.full(n, 2.0)
+        besti = np.full(n, -1, dtype=np.int64)
+        active = np.flatnonzero(~(np.isnan(lat) | np.isnan(lon)))
+        r = np.zeros(n, dtype=np.int64)
+        c = np.zeros(n, dtype=np.int64)
+        r[active] = np.clip((lat[active] + 90.0) // res, 0, rows - 1)
+        c[active] = np.clip((lon[active] + 180.0) // res, 0, cols - 1)
+        k = 0
+        while active.size and 2 * k + 1 < cols:
+            ar = r[active]
+            ac = c[active]
+            for dr, dc in _ring(k):
+                rr = ar + dr
+                inside = (rr >= 0) & (rr < rows)
+                cell = np.where(inside, rr * cols + (ac + dc) % cols, 0)
+                first = start[cell]
+                counts = np.where(inside, start[cell + 1] - first, 0)
+                total = int(counts.sum())
+                if not total:
+                    continue
+                # The places of the cell of each position, one row each
+                owner = np.repeat(np.arange(active.size), counts)
+                idx = (np.arange(total) -
+                       np.repeat(np.cumsum(counts) - counts, counts) +
+                       np.repeat(first, counts))
+                q = active[owner]
+                h = (np.sin((plat[idx] - phi[q]) / 2) ** 2 +
+                     cosphi[q] * pcos[idx] *
+                     np.sin((plon[idx] - lam[q]) / 2) ** 2)
+                # The nearest of the cell for each position, the first of
+                # equals as in _nearest()
+                order = np.lexsort((h, owner))
+                lead = np.ones(total, dtype=bool)
+                lead[1:] = owner[order[1:]] != owner[order[:-1]]
+                sel = order[lead]
+                q = active[owner[sel]]
+                better = h[sel] < best[q]
+                best[q[better]] = h[sel][better]
+                besti[q[better]] = idx[sel][better]
+            # As _bound(), for every position at once
+            la = lat[active]
+            lo = lon[active]
+            south = (ar - k) * res - 90.0
+            north = (ar + k + 1) * res - 90.0
+            dlat = np.minimum(np.where(ar - k > 0, la - south, 180.0),
+                              np.where(ar + k < rows - 1, north - la, 180.0))
+            dlon = np.minimum(lo - ((ac - k) * res - 180.0),
+                              (ac + k + 1) * res - 180.0 - lo)
+            edge = np.minimum(90.0, np.maximum(np.abs(south), np.abs(north)))
+            bound = np.minimum(np.sin(np.radians(dlat) / 2) ** 2,
+                               np.cos(np.radians(la)) *
+                               np.cos(np.radians(edge)) *
+                               np.sin(np.radians(dlon) / 2) ** 2)
+            done = (((besti[active] >= 0) & (best[active] <= bound)) |
+                    (bound > self.limit))
+            active = active[~done]
+            k += 1
+
+        result = [None] * n
+        labels = {}
+        metres = (2 * np.arcsin(np.sqrt(np.minimum(best, 1.0))) *
+                  trackstats.EARTH_RADIUS)
+        for p in np.flatnonzero((besti >= 0) & (best <= self.limit)):
+            i = int(besti[p])
+            if i not in labels:
+                labels[i] = self.place(i)
+            result[p] = (labels[i], float(metres[p]))
+        for p in active:
+            # The rare positions whose rings wrap around the globe
+            result[p] = self.nearest(float(lats[p]), float(lons[p]))
+        return result
+
+def centroid(lats, lons):
+    """
+    Return the (lat, lon) of the centre of the positions in the sequences
+    lats and lons on the sphere, ignoring NaN, or None if there are none
+    """
+    x = y = z = 0.0
+    cos = math.cos
+    sin = math.sin
+    for lat, lon in zip(lats, lons):
+        if lat != lat or lon != lon:
+            continue
+        phi = math.radians(lat)
+        lam = math.radians(lon)
+        x += cos(phi) * cos(lam)
+        y += cos(phi) * sin(lam)
+        z += sin(phi)
+    if x == 0.0 and y == 0.0 and z == 0.0:
+        return None
+    return (math.degrees(math.atan2(z, math.hypot(x, y))),
+            math.degrees(math.atan2(y, x)))
+
+def distance_text(metres):
+    """
+    Return a distance as text for a description
+    """
+    if metres < 1000.0:
+        return '{0:.0f} m'.format(metres)
+    return '{0:.1f} km'.format(metres / 1000.0)
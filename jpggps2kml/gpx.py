@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 21:12:26 2026
+Copyright (C) 2016 Russell O. Redman
+
+Reading the tracks from GPX files.
+
+lxml is imported by parse() rather than when this module is imported, so
+that commands which never read a GPX file do not load it.
+
+@author: russell
+@email: russell@roredman.ca
+"""
+
+def parse(filepath):
+    """
+    Parse a GPX file and return (root, namespace), where namespace is the
+    default namespace of the document
+    """
+    from lxml import etree
+    root = etree.parse(filepath).getroot()
+    return root, root.nsmap[None]
+
+def tracks(root, namespace):
+    """
+    Iterate over the tracks of a parsed GPX document, yielding
+    (trackname, segments) for each trk, where trackname is None if the
+    track has no name and segments is a list holding, for each trkseg, a
+    list of (time, lon, lat, ele) text tuples.  ele is optional in GPX and
+    is None for a point without one; a point without a time is skipped.
+    """
+    ns = '{%s}' % namespace
+    for gpxtrack in root.iter(ns + 'trk'):
+        trackname = gpxtrack.findtext(ns + 'name')
+        segments = []
+        for gpxtrkseg in gpxtrack.iter(ns + 'trkseg'):
+            points = []
+            for gpxtrkpoint in gpxtrkseg.iter(ns + 'trkpt'):
+                time = gpxtrkpoint.findtext(ns + 'time')
+                if not time:
+                    continue
+                points.append((time,
+                               gpxtrkpoint.attrib['lon'],
+                               gpxtrkpoint.attrib['lat'],
+                               gpxtrkpoint.findtext(ns + 'ele')))
+            segments.append(points)
+        yield trackname, segments
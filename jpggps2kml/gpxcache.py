@@ -0,0 +1,453 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 08:14:36 2026
+Copyright (C) 2016 Russell O. Redman
+
+A cache of parsed GPX files as memory-mapped columns.
+
+The same GPX logs are read on every run of makekml and editgps, and parsing
+their XML is the largest cost after exiftool.  With --gpx-cache DIR each
+GPX file is parsed once and stored in a subdirectory of DIR named by a hash
+of its absolute path, holding:
+    meta.json   the path, size and mtime of the GPX file when it was read,
+                the tracks as [name, [points in each segment]], and the
+                earliest and latest time and number of trackpoints
+    time.npy    the time text of each trackpoint (fixed width bytes)
+    coord.npy   the "lon lat ele" text written to gx:coord (fixed width)
+    epoch.npy   the time as seconds since 1970-01-01 UTC (float64, NaN if
+                the time cannot be parsed)
+    lat.npy, lon.npy, ele.npy   the position in degrees and metres
+                (float64, ele is NaN if absent)
+The .npy files are in the format of numpy.save and are written and read
+with the standard library, so numpy.load(path, mmap_mode='r') also reads
+them.  An entry is used only while the size and mtime of the GPX file are
+unchanged, otherwise it is rebuilt.  Each entry is written to a temporary
+directory and renamed into place, so concurrent runs never see part of one.
+
+@author: russell
+@email: russell@roredman.ca
+"""
+
+import ast
+import array
+import hashlib
+import json
+import mmap
+import os
+import os.path
+import shutil
+import struct
+import sys
+import tempfile
+
+from . import timestamps
+
+NAN = float('nan')
+
+# Bumped whenever the layout of an entry changes
+VERSION = 1
+
+NPY_MAGIC = b'\x93NUMPY\x01\x00'
+
+TEXT_COLUMNS = ('time', 'coord')
+VALUE_COLUMNS = ('epoch', 'lat', 'lon', 'ele')
+
+def write_npy(path, descr, n, data):
+    """
+    Write a one dimensional .npy file (format version 1.0).
+
+    Arguments:
+    path: the file to write
+    descr: the numpy dtype string, e.g. '<f8' or '|S20'
+    n: the number of items
+    data: the items as a bytes-like object in that dtype
+    """
+    header = "{'descr': %r, 'fortran_order': False, 'shape': (%d,), }" % (
+                 descr, n)
+    # Pad with spaces so that the data start on a 64 byte boundary
+    total = len(NPY_MAGIC) + 2 + len(header) + 1
+    header += ' ' * (-total % 64) + '\n'
+    with open(path, 'wb') as f:
+        f.write(NPY_MAGIC)
+        f.write(struct.pack('<H', len(header)))
+        f.write(header.encode('latin1'))
+        f.write(data)
+
+def map_npy(path):
+    """
+    Memory-map a one dimensional .npy file, returning (descr, n, view),
+    where view is a memoryview of the data.  Raise ValueError if the file
+    is not a version 1.0 .npy file.
+    """
+    with open(path, 'rb') as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    if mm[:len(NPY_MAGIC)] != NPY_MAGIC:
+        raise ValueError(path + ' is not a .npy file')
+    start = len(NPY_MAGIC) + 2
+    hlen, = struct.unpack('<H', mm[len(NPY_MAGIC):start])
+    header = ast.literal_eval(mm[start:start + hlen].decode('latin1'))
+    n, = header['shape']
+    return header['descr'], n, memoryview(mm)[start + hlen:]
+
+def texts_npy(path, values):
+    """
+    Write a list of str as a fixed width bytes .npy column
+    """
+    encoded = [v.encode('utf-8') for v in values]
+    width = max([len(e) for e in encoded] + [1])
+    write_npy(path,
+              '|S' + str(width),
+              len(encoded),
+              b''.join([e.ljust(width, b'\0') for e in encoded]))
+
+def values_npy(path, values):
+    """
+    Write a sequence of float as a little-endian float64 .npy column
+    """
+    a = array.array('d', values)
+    if sys.byteorder != 'little':
+        a.byteswap()
+    write_npy(path, '<f8', len(a), a.tobytes())
+
+def array_npy(path, values):
+    """
+    Write an array.array of int32 ('i') or float64 ('d') as a little-endian
+    .npy column
+    """
+    if sys.byteorder != 'little':
+        values = array.array(values.typecode, values)
+        values.byteswap()
+    write_npy(path,
+              '<f8' if values.typecode == 'd' else '<i4',
+              len(values),
+              values.tobytes())
+
+def map_array(path):
+    """
+    Return a .npy column written by array_npy(), or of bytes (uint8), as a
+    memoryview of the mapped file, or as an array.array if it must be
+    byteswapped
+    """
+    descr, n, view = map_npy(path)
+    if descr == '|u1':
+        return view[:n]
+    typecode = 'd' if descr == '<f8' else 'i'
+    size = 8 if typecode == 'd' else 4
+    if sys.byteorder == 'little':
+        return view[:size * n].cast(typecode)
+    a = array.array(typecode, view[:size * n].tobytes())
+    a.byteswap()
+    return a
+
+def current_entry(entry, path, version):
+    """
+    Return the dictionary in the meta.json of the directory entry built
+    from the file at path, or None if there is no entry or it is stale:
+    written by another version, for another path, or before the size or
+    mtime of the file changed
+    """
+    try:
+        with open(os.path.join(entry, 'meta.json'), encoding='utf-8') as f:
+            meta = json.load(f)
+        st = os.stat(path)
+    except (OSError, ValueError):
+        return None
+    if (not isinstance(meta, dict) or
+            meta.get('version') != version or
+            meta.get('path') != os.path.abspath(path) or
+            meta.get('size') != st.st_size or
+            meta.get('mtime') != st.st_mtime_ns):
+        return None
+    return meta
+
+def map_entry(entry, names):
+    """
+    Return a dictionary name -> map_array() of the column of each of names
+    in the directory entry
+    """
+    return {name: map_array(os.path.join(entry, name + '.npy'))
+            for name in names}
+
+def store_entry(entry, path, version, meta, columns):
+    """
+    Write the directory entry for the file at path, replacing any previous
+    entry, as current_entry() and map_entry() read it.
+
+    Arguments:
+    entry: the directory to write, renamed into place once complete
+    path: the file the entry was built from
+    version: the version of the layout of the entry
+    meta: further items for meta.json
+    columns: a dictionary name -> array.array of int32 ('i') or float64
+        ('d'), or bytes, each written as name.npy
+    """
+    st = os.stat(path)
+    directory = os.path.dirname(os.path.abspath(entry))
+    try:
+        temp = tempfile.mkdtemp(dir=directory, prefix='.tmp')
+    except OSError:
+        # The entry is only an optimization
+        return
+    try:
+        for name, values in columns.items():
+            if isinstance(values, array.array):
+                array_npy(os.path.join(temp, name + '.npy'), values)
+            else:
+                write_npy(os.path.join(temp, name + '.npy'),
+                          '|u1',
+                          len(values),
+                          values)
+        meta = dict(meta,
+                    version=version,
+                    path=os.path.abspath(path),
+                    size=st.st_size,
+                    mtime=st.st_mtime_ns)
+        with open(os.path.join(temp, 'meta.json'), 'w',
+                  encoding='utf-8') as f:
+            json.dump(meta, f)
+        if os.path.isdir(entry):
+            # os.replace() cannot rename a directory over one that is not
+            # empty, so remove the stale entry first
+            shutil.rmtree(entry, ignore_errors=True)
+        os.replace(temp, entry)
+    except OSError:
+        # Another run may have stored the same entry
+        shutil.rmtree(temp, ignore_errors=True)
+
+def _number(text):
+    """
+    Return text as a float, or NaN if it is empty or not a number
+    """
+    try:
+        return float(text)
+    except (TypeError, ValueError):
+        return NAN
+
+def _epoch(text):
+    """
+    Return a GPX time text as seconds since 1970-01-01 UTC, or NaN
+    """
+    dt = timestamps.parse_datetime(text.strip()) if text else None
+    if dt is None:
+        return NAN
+    if dt.tzinfo is None:
+        # GPX times are defined to be UTC
+        dt = dt.replace(tzinfo=timestamps.UTC)
+    return timestamps.to_epoch(dt)
+
+class trackcolumns():
+    """
+    The trackpoints of one GPX file as columns, either parsed in memory by
+    from_gpx() or mapped from a cache entry by gpxcache.load().
+
+    tracks: a list of [trackname, [number of points in each segment]],
+        where trackname is None if the track has no name
+    begin, end: the earliest and latest time texts ('' if none)
+    count: the number of trackpoints
+    """
+    def __init__(self, tracks, begin, end, count, columns, directory=None):
+        """
+        Arguments:
+        tracks, begin, end, count: as above
+        columns: a dictionary name -> list, holding at least the text columns
+        directory: the cache entry holding the other columns, if any
+        """
+        self.tracks = tracks
+        self.begin = begin
+        self.end = end
+        self.count = count
+        self.columns = columns
+        self.directory = directory
+
+    @classmethod
+    def from_gpx(cls, root, namespace):
+        """
+        Collect the columns of a GPX document parsed by gpx.parse()
+        """
+        from . import gpx
+
+        tracks = []
+        time = []
+        coord = []
+        lon = []
+        lat = []
+        ele = []
+        for trackname, segments in gpx.tracks(root, namespace):
+            lengths = []
+            for points in segments:
+                lengths.append(len(points))
+                for t, x, y, z in points:
+                    time.append(t)
+                    coord.append('{0} {1} {2}'.format(x, y, z or '0'))
+                    lon.append(x)
+                    lat.append(y)
+                    ele.append(z)
+            tracks.append([trackname, lengths])
+
+        present = [t for t in time if t]
+        return cls(tracks,
+                   min(present) if present else '',
+                   max(present) if present else '',
+                   len(time),
+                   {'time': time, 'coord': coord,
+                    'lon_text': lon, 'lat_text': lat, 'ele_text': ele})
+
+    def texts(self, name):
+        """
+        Return the text column name ('time' or 'coord') as a list of str
+        """
+        if name not in self.columns:
+            descr, n, view = map_npy(os.path.join(self.directory,
+                                                  name + '.npy'))
+            width = int(descr[2:])
+            data = view[:n * width].tobytes()
+            try:
+                # Times and coordinates are ASCII, so slice the decoded text
+                text = data.decode('ascii')
+                self.columns[name] = [text[i:i + width].rstrip('\0')
+                                      for i in range(0, n * width, width)]
+            except UnicodeDecodeError:
+                self.columns[name] = [
+                    data[i:i + width].rstrip(b'\0').decode('utf-8')
+                    for i in range(0, n * width, width)]
+        return self.columns[name]
+
+    def values(self, name):
+        """
+        Return the float64 column name ('epoch', 'lat', 'lon' or 'ele'), as
+        a memoryview of the mapped file or an array.array('d')
+        """
+        if name not in self.columns:
+            if self.directory is not None:
+                descr, n, view = map_npy(os.path.join(self.directory,
+                                                      name + '.npy'))
+                if sys.byteorder == 'little':
+                    self.columns[name] = view[:8 * n].cast('d')
+                else:
+                    a = array.array('d', view[:8 * n].tobytes())
+                    a.byteswap()
+                    self.columns[name] = a
+            elif name == 'epoch':
+                self.columns[name] = array.array(
+                    'd', [_epoch(t) for t in self.columns['time']])
+            else:
+                self.columns[name] = array.array(
+                    'd', [_number(t) for t in self.columns[name + '_text']])
+        return self.columns[name]
+
+    def segment_rows(self, select=None):
+        """
+        Iterate over (trackname, rowlist) for each track, where rowlist
+        holds the row numbers of the points in each segment as a range.
+        If select (a pushdown.selection) is given, only the rows of the
+        points in its time range are kept, as a list, and a segment left 
+        empty or never entering its bbox is dropped.
+        """
+        if select is not None:
+            epoch = self.values('epoch')
+            lat = self.values('lat')
+            lon = self.values('lon')
+        start = 0
+        for trackname, lengths in self.tracks:
+            rowlist = []
+            for n in lengths:
+                if select is None:
+                    rowlist.append(range(start, start + n))
+                else:
+                    rows = [i for i in range(start, start + n)
+                            if select.time_in_range(epoch[i])]
+                    if rows and select.enters_bbox([lat[i] for i in rows],
+                                                   [lon[i] for i in rows]):
+                        rowlist.append(rows)
+                start += n
+            yield trackname, rowlist
+
+    def segment_texts(self, rows):
+        """
+        Return the (whens, coords) text lists of the points in rows
+        """
+        time = self.texts('time')
+        coord = self.texts('coord')
+        if isinstance(rows, range):
+            return time[rows.start:rows.stop], coord[rows.start:rows.stop]
+        return [time[i] for i in rows], [coord[i] for i in rows]
+
+    def time_range(self):
+        """
+        Return (begin, end, count), where begin and end are the earliest
+        and latest trackpoint time texts ('' if there are none) and count
+        is the number of trackpoints
+        """
+        return self.begin, self.end, self.count
+
+class gpxcache():
+    """
+    A directory of cached GPX files
+    """
+    def __init__(self, directory):
+        """
+        Arguments:
+        directory: the cache directory, created if necessary
+        """
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def entry(self, filepath):
+        """
+        Return the directory of the cache entry for a GPX file
+        """
+        key = hashlib.blake2b(os.path.abspath(filepath).encode('utf-8'),
+                              digest_size=16).hexdigest()
+        return os.path.join(self.directory, key)
+
+    def load(self, filepath):
+        """
+        Return the trackcolumns of the cache entry for filepath, or None if
+        there is no entry or the file has changed since it was made
+        """
+        entry = self.entry(filepath)
+        meta = current_entry(entry, filepath, VERSION)
+        if meta is None:
+            return None
+        return trackcolumns(meta['tracks'],
+                            meta['begin'],
+                            meta['end'],
+                            meta['count'],
+                            {},
+                            entry)
+
+    def store(self, filepath, columns):
+        """
+        Write the trackcolumns parsed from filepath as its cache entry,
+        replacing any previous entry
+        """
+        st = os.stat(filepath)
+        entry = self.entry(filepath)
+        temp = tempfile.mkdtemp(dir=self.directory, prefix='.tmp')
+        try:
+            for name in TEXT_COLUMNS:
+                texts_npy(os.path.join(temp, name + '.npy'),
+                          columns.texts(name))
+            for name in VALUE_COLUMNS:
+                values_npy(os.path.join(temp, name + '.npy'),
+                           columns.values(name))
+            with open(os.path.join(temp, 'meta.json'), 'w',
+                      encoding='utf-8') as f:
+                json.dump({'version': VERSION,
+                           'path': os.path.abspath(filepath),
+                           'size': st.st_size,
+                           'mtime': st.st_mtime_ns,
+                           'tracks': columns.tracks,
+                           'begin': columns.begin,
+                           'end': columns.end,
+                           'count': columns.count}, f)
+            if os.path.isdir(entry):
+                # os.replace() cannot rename a directory over one that
+                # is not empty, so remove the stale entry first
+                shutil.rmtree(entry, ignore_errors=True)
+            os.replace(temp, entry)
+        except OSError:
+            # Another run may have stored the same entry; the cache is
+            # only an optimization, so carry on without it
+            shutil.rmtree(temp, ignore_errors=True)
+
@@ -0,0 +1,194 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 16:58:41 2026
+Copyright (C) 2016 Russell O. Redman
+
+Merge the tracks recorded by several GPS loggers into one track per day.
+
+When a phone, a watch and a dedicated GPS are all logging, their GPX files
+overlap in time.  The trackpoints of every file are streamed with iterparse
+and k-way merged by timestamp with heapq.merge, so only one point per file
+and the points of the current time window are held in memory at once.
+Within each window the best source is chosen, by the mean fix quality and
+HDOP of its points and then by the number of points, and only that source's
+points are kept.  Points that repeat a timestamp already written are
+dropped, and the result is split into one track per UTC day.
+
+Each GPX file is assumed to be in time order, as loggers write them;
+a point earlier than its predecessor in the same file is skipped.
+
+@author: russell
+@email: russell@roredman.ca
+"""
+
+import heapq
+import os.path
+
+from . import kmlwriter
+from . import records
+from . import timestamps
+
+# Default length of the windows in which a single source is chosen (seconds)
+WINDOW = 60.0
+
+# Ranking of the GPX <fix> values; points without <fix> rank as 'unknown'
+FIXRANK = {'none': 0,
+           'unknown': 1,
+           '2d': 2,
+           '3d': 3,
+           'dgps': 4,
+           'pps': 4}
+
+# Assumed HDOP when a point does not record one
+HDOP_UNKNOWN = 99.0
+
+def quality(point):
+    """
+    Return (fix rank, -hdop) for a trackpoint, so that larger is better
+    """
+    hdop = HDOP_UNKNOWN
+    if point.hdop:
+        try:
+            hdop = float(point.hdop)
+        except ValueError:
+            pass
+    return (FIXRANK.get(point.fix or 'unknown', 1), -hdop)
+
+def trackpoints(filepath, source):
+    """
+    Iterate over the trackpoints of one GPX file in file order, clearing
+    each element once it has been read so that memory stays bounded.
+
+    Arguments:
+    filepath: path to the GPX file
+    source: index identifying the file, stored in each trackpoint
+    """
+    from lxml import etree
+    last = None
+    for event, trkpt in etree.iterparse(filepath,
+                                        events=('end',),
+                                        tag='{*}trkpt'):
+        ns = trkpt.tag[:trkpt.tag.index('}') + 1] if '}' in trkpt.tag else ''
+        text = trkpt.findtext(ns + 'time')
+        dt = timestamps.parse_datetime(text.strip()) if text else None
+        if dt is not None:
+            if dt.tzinfo is None:
+                # GPX times are defined to be UTC
+                dt = dt.replace(tzinfo=timestamps.UTC)
+            epoch = timestamps.to_epoch(dt)
+            if last is None or epoch >= last:
+                last = epoch
+                yield records.trackpoint(
+                          epoch,
+                          source,
+                          trkpt.get('lat'),
+                          trkpt.get('lon'),
+                          (trkpt.findtext(ns + 'ele') or '').strip(),
+                          text.strip(),
+                          (trkpt.findtext(ns + 'fix') or '').strip(),
+                          (trkpt.findtext(ns + 'sat') or '').strip(),
+                          (trkpt.findtext(ns + 'hdop') or '').strip())
+        trkpt.clear()
+        while trkpt.getprevious() is not None:
+            del trkpt.getparent()[0]
+
+def best_source(points):
+    """
+    Return the source whose points in a window are best: highest mean fix
+    rank, then lowest mean HDOP, then the most points
+    """
+    score = {}
+    for p in points:
+        fix, hdop = quality(p)
+        s = score.setdefault(p.source, [0.0, 0.0, 0])
+        s[0] += fix
+        s[1] += hdop
+        s[2] += 1
+    return max(score,
+               key=lambda k: (score[k][0] / score[k][2],
+                              score[k][1] / score[k][2],
+                              score[k][2],
+                              -k))
+
+def merged(filepaths, window=WINDOW):
+    """
+    Iterate in time order over the consolidated trackpoints from a list of
+    GPX files, keeping only the best source in each window and dropping
+    repeated timestamps.
+    """
+    streams = [trackpoints(f, n) for n, f in enumerate(filepaths)]
+    pending = []
+    current = None
+    last = None
+    for p in heapq.merge(*streams, key=lambda p: p.epoch):
+        w = p.epoch // window
+        if w != current and pending:
+            source = best_source(pending)
+            for q in pending:
+                if q.source == source and (last is None or q.epoch > last):
+                    last = q.epoch
+                    yield q
+            pending = []
+        current = w
+        pending.append(p)
+    if pending:
+        source = best_source(pending)
+        for q in pending:
+            if q.source == source and (last is None or q.epoch > last):
+                yield q
+
+def days(points):
+    """
+    Split a time ordered iterator of trackpoints into (day, list) tuples,
+    one for each UTC day
+    """
+    day = None
+    dayset = []
+    for p in points:
+        d = p.day()
+        if d != day and dayset:
+            yield day, dayset
+            dayset = []
+        day = d
+        dayset.append(p)
+    if dayset:
+        yield day, dayset
+
+GPX_HEAD = ('<?xml version="1.0" encoding="UTF-8"?>\n'
+            '<gpx version="1.1" creator="jpggps2kml mergegpx" '
+            'xmlns="http://www.topografix.com/GPX/1/1">\n'
+            '<trk>\n'
+            '<name>{0}</name>\n'
+            '<trkseg>\n').format
+GPX_TAIL = '</trkseg>\n</trk>\n</gpx>\n'
+
+def write_gpx(out, day, points, sources):
+    """
+    Write one day of merged trackpoints to out as a GPX 1.1 document,
+    recording the basename of the file each point came from in <src>.
+
+    Arguments:
+    out: a text stream
+    day: the name of the track
+    points: an iterable of trackpoints
+    sources: the list of GPX file paths indexed by trackpoint.source
+    """
+    escape = kmlwriter.escape
+    names = [escape(os.path.basename(s)) for s in sources]
+    out.write(GPX_HEAD(escape(day)))
+    for p in points:
+        line = ['<trkpt lat="', escape(p.lat), '" lon="', escape(p.lon), 
+                '">']
+        if p.ele:
+            line.extend(['<ele>', escape(p.ele), '</ele>'])
+        line.extend(['<time>', escape(p.time), '</time>',
+                     '<src>', names[p.source], '</src>'])
+        if p.fix:
+            line.extend(['<fix>', escape(p.fix), '</fix>'])
+        if p.sat:
+            line.extend(['<sat>', escape(p.sat), '</sat>'])
+        if p.hdop:
+            line.extend(['<hdop>', escape(p.hdop), '</hdop>'])
+        line.append('</trkpt>\n')
+        out.write(''.join(line))
+    out.write(GPX_TAIL)
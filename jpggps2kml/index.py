@@ -0,0 +1,375 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 22:41:19 2026
+Copyright (C) 2016 Russell O. Redman
+
+A columnar index of the normalized image metadata, written alongside the KML.
+
+One row is written for every JPEG file read by makekml, located or not,
+holding its path, size and modification time and the normalized values of
+its EXIF tags.  The rows are streamed as each batch is read, one row group
+per batch, in a format chosen by the extension of the index file:
+    .parquet              Parquet (requires pyarrow)
+    .sqlite .sqlite3 .db  an SQLite table named images
+    anything else         CSV with a header line (.csv.gz is compressed)
+Every format is written to a temporary file and renamed into place when the
+scan completes.
+
+The rows of an existing index are a warm start for the next run: a file
+whose size and modification time are unchanged is taken from the index
+rather than read again with exiftool.  File names that are not valid UTF-8
+are stored with U+FFFD in place of the bytes that cannot be decoded, as
+none of the formats can hold them, so such a file is read again each run.
+
+@author: russell
+@email: russell@roredman.ca
+"""
+
+import math
+import os
+import os.path
+
+from . import normalize
+from . import output
+
+COLUMNS = ['path', 'rooted', 'name', 'size', 'mtime', 'epoch', 'date',
+           'time', 'lat', 'lon', 'alt', 'gpsstatus', 'orientation', 'serial',
+           'utc']
+TYPES = [str, str, str, int, int, float, str,
+         str, float, float, float, str, int, str, int]
+
+SQL_TYPES = {str: 'TEXT', int: 'INTEGER', float: 'REAL'}
+
+NAN = normalize.NAN
+
+def format_for(path):
+    """
+    Return 'parquet', 'sqlite' or 'csv' according to the extension of path
+    """
+    ext = os.path.splitext(path)[1].lower()
+    if ext == '.parquet':
+        return 'parquet'
+    if ext in ('.sqlite', '.sqlite3', '.db'):
+        return 'sqlite'
+    return 'csv'
+
+def stamp(path):
+    """
+    Return (size, mtime in nanoseconds) of path, or (0, 0) if it is gone
+    """
+    try:
+        st = os.stat(path)
+    except OSError:
+        return (0, 0)
+    return (st.st_size, st.st_mtime_ns)
+
+def _value(t, text):
+    """
+    Convert a value read back from CSV or SQLite to type t
+    """
+    if text is None or text == '':
+        return NAN if t is float else t()
+    return t(text)
+
+class metadataindex():
+    """
+    The rows of an existing index and a writer for the new one
+    """
+    def __init__(self, path):
+        """
+        Arguments:
+        path: the index file
+        """
+        self.path = path
+        self.format = format_for(path)
+        self.rows = {}
+        self.reused = 0
+
+    def check(self):
+        """
+        Return an error message if the index cannot be written, else None
+        """
+        if self.format == 'parquet':
+            try:
+                import pyarrow
+            except ImportError:
+                return ('pyarrow is required to write ' + self.path +
+                        '; use a .csv or .sqlite index instead')
+        return None
+
+    def load(self):
+        """
+        Read the rows of an existing index, keyed by path, as a warm start.
+        An index written without every column in COLUMNS is ignored.
+        """
+        if not os.path.isfile(self.path):
+            return
+        if self.format == 'parquet':
+            import pyarrow.parquet
+            if not set(COLUMNS) <= set(
+                    pyarrow.parquet.read_schema(self.path).names):
+                return
+            table = pyarrow.parquet.read_table(self.path, columns=COLUMNS)
+            for row in zip(*[table.column(c).to_pylist() for c in COLUMNS]):
+                self.rows[row[0]] = tuple(_value(t, v)
+                                          for t, v in zip(TYPES, row))
+        elif self.format == 'sqlite':
+            import sqlite3
+            db = sqlite3.connect(self.path)
+            try:
+                names = [c[1] for c in 
+                         db.execute('PRAGMA table_info(images)')]
+                if not set(COLUMNS) <= set(names):
+                    return
+                for row in db.execute('SELECT ' + ', '.join(COLUMNS) +
+                                      ' FROM images'):
+                    self.rows[row[0]] = tuple(_value(t, v)
+                                              for t, v in zip(TYPES, row))
+            finally:
+                db.close()
+        else:
+            import csv
+            import io
+            with io.TextIOWrapper(output.openread(self.path),
+                                  encoding='utf-8',
+                                  newline='') as f:
+                reader = csv.reader(f)
+                header = next(reader, None)
+                if header != COLUMNS:
+                    return
+                for row in reader:
+                    self.rows[row[0]] = tuple(_value(t, v)
+                                              for t, v in zip(TYPES, row))
+
+    def read(self, jpegpaths, reader):
+        """
+        Return the gpsbatch for jpegpaths, taking each file whose size and
+        modification time match its row in the existing index from there
+        and calling reader(paths) for the normalized gpsbatch of the rest.
+        The size and mtime columns of the result are filled in.
+        """
+        stamps = [stamp(p) for p in jpegpaths]
+        todo = []
+        for p, (size, mtime) in zip(jpegpaths, stamps):
+            row = self.rows.get(p)
+            if row is None or row[3] != size or row[4] != mtime:
+                todo.append(p)
+
+        if len(todo) == len(jpegpaths):
+            batch = reader(jpegpaths)
+        else:
+            batch = normalize.gpsbatch(len(jpegpaths))
+            fresh = reader(todo) if todo else None
+            k = 0
+            for i, p in enumerate(jpegpaths):
+                if k < len(todo) and todo[k] == p:
+                    src, j = fresh, k
+                    k += 1
+                    batch.epoch[i] = src.epoch[j]
+                    batch.datestr[i] = src.datestr[j]
+                    batch.timestr[i] = src.timestr[j]
+                    batch.lat[i] = src.lat[j]
+                    batch.lon[i] = src.lon[j]
+                    batch.alt[i] = src.alt[j]
+                    batch.status[i] = src.status[j]
+                    batch.orientation[i] = src.orientation[j]
+                    batch.serial[i] = src.serial[j]
+                    batch.utc[i] = src.utc[j]
+                else:
+                    row = self.rows[p]
+                    batch.epoch[i] = row[5]
+                    batch.datestr[i] = row[6]
+                    batch.timestr[i] = row[7]
+                    batch.lat[i] = row[8]
+                    batch.lon[i] = row[9]
+                    batch.alt[i] = row[10]
+                    batch.status[i] = row[11]
+                    batch.orientation[i] = row[12]
+                    batch.serial[i] = row[13]
+                    batch.utc[i] = row[14]
+                    self.reused += 1
+
+        for i, (size, mtime) in enumerate(stamps):
+            batch.size[i] = size
+            batch.mtime[i] = mtime
+        return batch
+
+    def writer(self):
+        """
+        Return a context manager that writes the new index
+        """
+        if self.format == 'parquet':
+            return parquetwriter(self.path)
+        if self.format == 'sqlite':
+            return sqlitewriter(self.path)
+        return csvwriter(self.path)
+
+def rows(jpeglist, batch):
+    """
+    Return the index rows for a chunk of (jpegdisk, jpegrooted, jpegbase)
+    tuples and their gpsbatch
+    """
+    return [(jpegdisk,
+             jpegrooted,
+             jpegbase,
+             batch.size[i],
+             batch.mtime[i],
+             batch.epoch[i],
+             batch.datestr[i],
+             batch.timestr[i],
+             batch.lat[i],
+             batch.lon[i],
+             batch.alt[i],
+             batch.status[i],
+             batch.orientation[i],
+             batch.serial[i],
+             batch.utc[i])
+            for i, (jpegdisk, jpegrooted, jpegbase) in enumerate(jpeglist)]
+
+def printable_rows(jpeglist, batch):
+    """
+    As rows(), with the path, rooted path and name of each file passed
+    through output.printable() so that every format can store them
+    """
+    printable = output.printable
+    return [row if row[0].isascii() and row[1].isascii() and row[2].isascii()
+            else (printable(row[0]), printable(row[1]), printable(row[2])) +
+                 row[3:]
+            for row in rows(jpeglist, batch)]
+
+def from_rows(rowlist):
+    """
+    Return the (jpeglist, gpsbatch) that rows() was given for a list of
+    index rows
+    """
+    batch = normalize.gpsbatch(len(rowlist))
+    for i, row in enumerate(rowlist):
+        (batch.size[i],
+         batch.mtime[i],
+         batch.epoch[i],
+         batch.datestr[i],
+         batch.timestr[i],
+         batch.lat[i],
+         batch.lon[i],
+         batch.alt[i],
+         batch.status[i],
+         batch.orientation[i],
+         batch.serial[i],
+         batch.utc[i]) = row[3:]
+    return [tuple(row[:3]) for row in rowlist], batch
+
+class csvwriter():
+    """
+    Write the index as CSV through an output.atomicwriter
+    """
+    def __init__(self, path):
+        self.out = output.atomicwriter(path)
+
+    def __enter__(self):
+        import csv
+        self.out.__enter__()
+        self.csv = csv.writer(self.out, lineterminator='\n')
+        self.csv.writerow(COLUMNS)
+        return self
+
+    def write(self, jpeglist, batch):
+        """
+        Write the rows of one batch
+        """
+        for row in printable_rows(jpeglist, batch):
+            self.csv.writerow(['' if isinstance(v, float) and math.isnan(v)
+                               else v for v in row])
+        self.out.flush()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        return self.out.__exit__(exc_type, exc_val, exc_tb)
+
+class _tempfile():
+    """
+    Base for the writers that need a real file to work on: a temporary
+    file in the directory of path, renamed over path on success
+    """
+    def __init__(self, path):
+        self.path = path
+
+    def _start(self):
+        import tempfile
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, self.temppath = tempfile.mkstemp(
+                                dir=directory,
+                                prefix='.' + os.path.basename(self.path) + '.',
+                                suffix='.tmp')
+        os.close(fd)
+        os.remove(self.temppath)
+
+    def _finish(self, ok):
+        if ok:
+            os.replace(self.temppath, self.path)
+        else:
+            try:
+                os.remove(self.temppath)
+            except OSError:
+                pass
+
+class sqlitewriter(_tempfile):
+    """
+    Write the index as an SQLite table named images, committing each batch
+    """
+    def __enter__(self):
+        import sqlite3
+        self._start()
+        self.db = sqlite3.connect(self.temppath)
+        self.db.execute('CREATE TABLE images (' +
+                        ', '.join(c + ' ' + SQL_TYPES[t]
+                                  for c, t in zip(COLUMNS, TYPES)) +
+                        ', PRIMARY KEY (path))')
+        self.insert = ('INSERT OR REPLACE INTO images VALUES (' +
+                       ', '.join('?' * len(COLUMNS)) + ')')
+        return self
+
+    def write(self, jpeglist, batch):
+        """
+        Insert and commit the rows of one batch
+        """
+        self.db.executemany(self.insert, printable_rows(jpeglist, batch))
+        self.db.commit()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.db.close()
+        self._finish(exc_type is None)
+        return False
+
+class parquetwriter(_tempfile):
+    """
+    Write the index as Parquet with pyarrow, one row group per batch
+    """
+    def __enter__(self):
+        import pyarrow
+        import pyarrow.parquet
+        arrowtypes = {str: pyarrow.string(),
+                      int: pyarrow.int64(),
+                      float: pyarrow.float64()}
+        self.schema = pyarrow.schema([(c, arrowtypes[t])
+                                      for c, t in zip(COLUMNS, TYPES)])
+        self._start()
+        self.writer = pyarrow.parquet.ParquetWriter(self.temppath,
+                                                    self.schema)
+        return self
+
+    def write(self, jpeglist, batch):
+        """
+        Write the rows of one batch as a row group
+        """
+        import pyarrow
+        columns = (list(zip(*printable_rows(jpeglist, batch))) or
+                   [()] * len(COLUMNS))
+        self.writer.write_table(
+            pyarrow.Table.from_arrays([pyarrow.array(list(col), type=f.type)
+                                       for col, f in zip(columns,
+                                                         self.schema)],
+                                      schema=self.schema))
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.writer.close()
+        self._finish(exc_type is None)
+        return False
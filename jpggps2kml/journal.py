@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 10:05:37 2026
+Copyright (C) 2016 Russell O. Redman
+
+An append-only journal of the work completed by a long run.
+
+makekml and orientjpeg can take hours over a large archive.  With
+--journal PATH they record each unit of completed work as one JSON line,
+appended to PATH and flushed to disk every FLUSHFILES files, after a
+header line {"format": FORMAT, "command": command}.  If the run dies, the
+next run with --resume replays the journal to rebuild what was done and
+skips that work: makekml records the metadata of each chunk of files read
+and orientjpeg the Orientation found in each file, and both record each
+directory once all of its files are done, so that finished directories
+are not even listed again.  A line cut short by the crash is discarded.
+The journal is removed when the run completes.
+
+@author: russell
+@email: russell@roredman.ca
+"""
+
+import json
+import os
+
+FORMAT = 'jpggps2kml journal 2'
+
+# Files recorded between flushes of the journal to disk
+FLUSHFILES = 256
+
+class journal():
+    """
+    The progress journal of one command
+    """
+    def __init__(self, path, command, resume=False):
+        """
+        Arguments:
+        path: the journal file
+        command: the name of the command, checked when the journal is
+            replayed
+        resume: if True replay an existing journal and append to it,
+            otherwise start a new one
+        """
+        self.path = path
+        self.command = command
+        self.resume = resume
+        self.f = None
+        self.pending = []
+        self.files = 0
+        self.valid = 0
+
+    def check(self):
+        """
+        Return an error message if the journal cannot be resumed, else None
+        """
+        if not (self.resume and os.path.isfile(self.path)):
+            return None
+        with open(self.path, 'rb') as f:
+            line = f.readline()
+        try:
+            header = json.loads(line)
+        except ValueError:
+            # a crash before the header was written leaves nothing to replay
+            return None
+        if not isinstance(header, dict) or header.get('format') != FORMAT:
+            return self.path + ' is not a jpggps2kml journal'
+        if header.get('command') != self.command:
+            return (self.path + ' is a journal of ' +
+                    str(header.get('command')) + ', not ' + self.command)
+        return None
+
+    def replay(self):
+        """
+        Iterate over the entries of an existing journal in the order they
+        were written, stopping at a truncated last line.  Nothing is
+        replayed unless resume is set and the journal exists, and check()
+        should have been called first.
+        """
+        self.valid = 0
+        if not (self.resume and os.path.isfile(self.path)):
+            return
+        with open(self.path, 'rb') as f:
+            header = True
+            for line in f:
+                if not line.endswith(b'\n'):
+                    break
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    break
+                if header:
+                    header = False
+                else:
+                    yield entry
+                self.valid += len(line)
+
+    def open(self):
+        """
+        Open the journal for appending after the entries that were
+        replayed, or start a new one if nothing was replayed
+        """
+        if self.valid:
+            self.f = open(self.path, 'r+b')
+            self.f.truncate(self.valid)
+            self.f.seek(self.valid)
+        else:
+            self.f = open(self.path, 'wb')
+            self.pending.append({'format': FORMAT, 'command': self.command})
+            self.flush()
+
+    def append(self, entry, files=0):
+        """
+        Add an entry recording work on a number of files, flushing the
+        journal once FLUSHFILES files have been recorded since the last
+        flush
+        """
+        self.pending.append(entry)
+        self.files += files
+        if self.files >= FLUSHFILES:
+            self.flush()
+
+    def flush(self):
+        """
+        Write the pending entries and force them to disk
+        """
+        if self.pending:
+            self.f.write(b''.join(json.dumps(e).encode('utf-8') + b'\n'
+                                  for e in self.pending))
+            self.f.flush()
+            os.fsync(self.f.fileno())
+            self.pending = []
+        self.files = 0
+
+    def close(self):
+        """
+        Flush and close the journal, which is kept for --resume
+        """
+        if self.f is not None:
+            self.flush()
+            self.f.close()
+            self.f = None
+
+    def remove(self):
+        """
+        Close and delete the journal once the run has completed
+        """
+        self.close()
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
@@ -0,0 +1,262 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 19:12:35 2026
+Copyright (C) 2016 Russell O. Redman
+
+Low-level scanning of the JPEG header segments.
+
+The EXIF metadata of a JPEG file lives in the APP1 segment near the start
+of the file, ahead of the compressed image.  jpegheader maps the file with
+mmap, so that only the pages actually touched are read, walks the SOI/APPn
+markers up to the start of scan (SOS), and exposes the EXIF (TIFF) block as
+a zero-copy memoryview.  Where a file cannot be mapped it falls back to
+reading the header in small windows.  Either way only a few KB of each
+image are read.  orientjpeg reads and rewrites the Orientation tag with it;
+makekml leaves its tags to exiftool, which normalizes them.
+
+@author: russell
+@email: russell@roredman.ca
+"""
+
+import mmap
+import struct
+
+# JPEG markers
+SOI = 0xd8
+EOI = 0xd9
+SOS = 0xda
+APP1 = 0xe1
+TEM = 0x01
+RST0 = 0xd0
+RST7 = 0xd7
+
+EXIF_ID = b'Exif\x00\x00'
+
+# TIFF tags used here
+TAG_ORIENTATION = 0x0112
+
+# Bytes read at a time when the file cannot be memory mapped
+WINDOW = 65536
+
+def segments(buf):
+    """
+    Iterate over the (marker, start, end) of the header segments of the JPEG
+    data in buf, where buf[start:end] is the segment payload following the
+    length field.  The SOS segment is the last one reported.  Iteration
+    stops early if buf is not a JPEG or the header is truncated.
+
+    buf can be any object indexable by integers, such as bytes or an mmap.
+    """
+    n = len(buf)
+    if n < 2 or buf[0] != 0xff or buf[1] != SOI:
+        return
+    pos = 2
+    while pos + 4 <= n:
+        if buf[pos] != 0xff:
+            return
+        marker = buf[pos + 1]
+        if marker == 0xff:
+            # fill byte
+            pos += 1
+            continue
+        if marker == EOI:
+            return
+        if marker == TEM or RST0 <= marker <= RST7:
+            # standalone marker without a length
+            pos += 2
+            continue
+        length = (buf[pos + 2] << 8) | buf[pos + 3]
+        yield marker, pos + 4, pos + 2 + length
+        if marker == SOS:
+            return
+        pos += 2 + length
+
+def _readheader(f):
+    """
+    Read the header of an open JPEG file up to and including the SOS marker
+    in windows of WINDOW bytes, for files that cannot be memory mapped
+    """
+    buf = f.read(WINDOW)
+    while True:
+        complete = False
+        last = 2
+        for marker, start, end in segments(buf):
+            last = end
+            if marker == SOS:
+                complete = True
+        if complete or len(buf) < 4:
+            return buf
+        more = f.read(max(WINDOW, last + 4 - len(buf)))
+        if not more:
+            return buf
+        buf += more
+
+class tiffblock():
+    """
+    Read access to the IFDs of a TIFF block (the payload of the EXIF APP1
+    segment after the "Exif" identifier)
+    """
+    def __init__(self, data):
+        """
+        Arguments:
+        data: a bytes-like object holding the TIFF block
+        """
+        self.data = data
+        self.endian = '<' if bytes(data[0:2]) == b'II' else '>'
+        self.ifd0 = self._u32(4)
+
+    def _u16(self, pos):
+        return struct.unpack_from(self.endian + 'H', self.data, pos)[0]
+
+    def _u32(self, pos):
+        return struct.unpack_from(self.endian + 'I', self.data, pos)[0]
+
+    def entries(self, offset):
+        """
+        Return a dictionary tag -> (type, count, value position) for the
+        IFD at offset, where the value position is the offset of the 4 byte
+        value field
+        """
+        result = {}
+        if offset <= 0 or offset + 2 > len(self.data):
+            return result
+        n = self._u16(offset)
+        for i in range(n):
+            pos = offset + 2 + 12 * i
+            if pos + 12 > len(self.data):
+                break
+            tag, ftype, count = struct.unpack_from(self.endian + 'HHI',
+                                                   self.data, pos)
+            result[tag] = (ftype, count, pos + 8)
+        return result
+
+    def integer(self, entries, tag):
+        """
+        Return the value of a SHORT or LONG tag from entries, or None
+        """
+        if tag not in entries:
+            return None
+        ftype, count, pos = entries[tag]
+        if ftype == 3:
+            return self._u16(pos)
+        if ftype == 4:
+            return self._u32(pos)
+        return None
+
+class jpegheader():
+    """
+    A context manager giving zero-copy access to the header of a JPEG file.
+    Inside the with block:
+    exif: a memoryview of the TIFF block of the EXIF APP1 segment, or None
+    exifstart: the offset of the TIFF block in the file
+    tiff: a tiffblock for exif, or None
+    The memoryviews are released when the block exits, or at once if the
+    header cannot be parsed.
+    """
+    def __init__(self, path):
+        """
+        Arguments:
+        path: the JPEG file to scan
+        """
+        self.path = path
+        self.exif = None
+        self.exifstart = 0
+        self.tiff = None
+        self._file = None
+        self._map = None
+        self._views = []
+
+    def __enter__(self):
+        """
+        Map the file, or read its header, and locate the EXIF block
+        """
+        self._file = open(self.path, 'rb')
+        try:
+            try:
+                self._map = mmap.mmap(self._file.fileno(),
+                                      0,
+                                      access=mmap.ACCESS_READ)
+                buf = self._map
+            except (ValueError, OSError):
+                # empty files and some file systems cannot be mapped
+                buf = _readheader(self._file)
+
+            for marker, start, end in segments(buf):
+                if (marker == APP1 and end <= len(buf) and
+                        buf[start:start + 6] == EXIF_ID):
+                    self.exif = self._view(buf, start + 6, end)
+                    self.exifstart = start + 6
+                    self.tiff = tiffblock(self.exif)
+                    break
+        except BaseException:
+            # __exit__ is not called if __enter__ fails, e.g. with a
+            # struct.error for a truncated TIFF header
+            self.__exit__(None, None, None)
+            raise
+        return self
+
+    def _view(self, buf, start, end):
+        """
+        Return a memoryview of buf[start:end], remembered for release
+        """
+        whole = memoryview(buf)
+        self._views.append(whole)
+        view = whole[start:end]
+        self._views.append(view)
+        return view
+
+    def orientation(self):
+        """
+        Return the Orientation tag from IFD0, or None if not recorded
+        """
+        if self.tiff is None:
+            return None
+        return self.tiff.integer(self.tiff.entries(self.tiff.ifd0),
+                                 TAG_ORIENTATION)
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        """
+        Release the memoryviews, the map and the file
+        """
+        self.tiff = None
+        self.exif = None
+        for view in reversed(self._views):
+            view.release()
+        self._views = []
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        self._file.close()
+        return False
+
+def orientation(path):
+    """
+    Return the EXIF Orientation of a JPEG file, or None if it is not
+    recorded in IFD0 or the file cannot be scanned
+    """
+    try:
+        with jpegheader(path) as header:
+            return header.orientation()
+    except (OSError, struct.error):
+        return None
+
+def set_orientation(path, orientation):
+    """
+    Overwrite the Orientation tag in IFD0 of a JPEG file in place, as
+    jpegexiforient does, returning False if it is not recorded there
+    """
+    try:
+        with jpegheader(path) as header:
+            if header.tiff is None:
+                return False
+            entries = header.tiff.entries(header.tiff.ifd0)
+            if entries.get(TAG_ORIENTATION, (0,))[0] != 3:
+                return False
+            pos = header.exifstart + entries[TAG_ORIENTATION][2]
+            endian = header.tiff.endian
+        with open(path, 'r+b') as f:
+            f.seek(pos)
+            f.write(struct.pack(endian + 'H', orientation))
+    except (OSError, struct.error):
+        return False
+    return True
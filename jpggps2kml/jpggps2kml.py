@@ -7,8 +7,8 @@ Copyright (C) 2016 Russell O. Redman
 Create a KML file based on exif data from a set of JPEG files contained in
 a specified set of directories.
 
-Requires exiftool to have been installed, as well as the pykml and pyexiftool
-python packages.  It is also recommended that the jpegtrans package be
+Requires exiftool to have been installed, as well as the pykml python
+package.  It is also recommended that the jpegtrans package be
 installed.  Note that exiftools and jpegtrans are C programs and must be
 installed manually.
 
@@ -25,30 +25,45 @@ installed manually.
     You should have received a copy of the GNU General Public License
     along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+The work is done by the library modules scanner, metadata, gpx, kml and
+orient.  lxml and pykml, and the modules that need them, are imported only
+by the commands that use them, so that each command starts quickly when run
+many times from a shell pipeline.
+
 @author: russell
 @email: russell@roredman.ca
 """
 
 
-import exiftool
-from lxml import etree
-from pykml.factory import KML_ElementMaker as KML
-from pykml.factory import GX_ElementMaker as GX
-
 import argparse
+import array
 import configparser
-import datetime
 import glob
+import itertools
 import os
 import os.path
-import re
-import subprocess
 import sys
 
+from . import kml
+from . import kmlwriter
+from . import metadata
+from . import normalize
+from . import output
+from . import phototracks
+from . import profiling
+from . import records
+from . import scanner
+from . import timestamps
+
+# Number of JPEG files whose EXIF metadata are requested from exiftool at once
+CHUNKSIZE = scanner.CHUNKSIZE
+
 class beginenditem():
     """
     A class for tuples of begin, end, item lists
     """
+    __slots__ = ('begin', 'end', 'item', 'next')
+
     def __init__(self, begin, end, item, nextitem):
         """
         Create the tuple
@@ -62,6 +77,8 @@ class sorteditems():
     """
     A sorted, linked list of begin, end items
     """
+    __slots__ = ('first',)
+
     def __init__(self):
         """
         Initialize a sorted linked list of beginenditems 
@@ -136,6 +153,14 @@ class jpggps2kml():
         self.config = None # placeholder for ConfigParser object
         self.dirs = [] # placeholder for a list of directories
         self.files = [] # placeholder for a list of files
+        self.profile = profiling.stageprofile() # disabled until read_config
+        self.photos = None # photocolumns for --phototracks in makekml
+        self.index = None # metadataindex for --index-out in makekml
+        self.gpxcache = None # gpxcache for --gpx-cache, made on first use
+        self.journal = None # journal for --journal in makekml and orientjpeg
+        self.selection = None # --from, --to and --bbox in makekml
+        self.tzindex = None # tzindex for --tz-boundaries in makekml
+        self.gazetteer = None # gazetteer for --gazetteer in makekml
     
     def read_config(self):
         """
@@ -151,6 +176,7 @@ class jpggps2kml():
         # would always overwrite the values in the config file.
 #        self.config['arguments'] = {}
         self.config.read_dict({'arguments': {'verbosity': 'normal',
+                                             'jobs': '2',
                                              'dir': '.'}})
     
         # Create an ArgumentParser to read the command line.  Every argument
@@ -161,18 +187,98 @@ class jpggps2kml():
         ap.add_argument('-c', '--config',
                         help='configuration file with values for arguments '\
                              'in the [arguments] section')
+        ap.add_argument('--bbox',
+                        help='in makekml, only images and tracks inside '
+                             'WEST,SOUTH,EAST,NORTH in decimal degrees')
+        ap.add_argument('--cprofile',
+                        help='path for a cProfile dump of the whole run')
+        ap.add_argument('--debounce',
+                        help='seconds without changes before --watch reads '
+                             'new files')
+        ap.add_argument('--dedup',
+                        help='in makekml, make one placemark for identical '
+                             'copies of an image in several directories')
         ap.add_argument('-f', '--fmt',
                         help='GPX fmt file used in makegpx()')
+        ap.add_argument('--from',
+                        help='in makekml, only images and trackpoints from '
+                             'this date or date and time onwards')
+        ap.add_argument('--gazetteer',
+                        help='in makekml and mergekml, name tracks and '
+                             'describe images by the nearest place in this '
+                             'GeoNames or CSV file')
+        ap.add_argument('--gazetteer-radius',
+                        help='distance in km beyond which --gazetteer '
+                             'reports no place (default 50, 0 for no '
+                             'limit)')
         ap.add_argument('--geosync',
                         help='offset to be added to DateTimeOriginal '
                              'to compute UTC, in the format +/-HH:MM:SS')
+        ap.add_argument('--gap',
+                        help='split photo-derived tracks where consecutive '
+                             'images are more than this many seconds apart')
         ap.add_argument('-g', '--gpx',
                         help='directory containing GPX files')
+        ap.add_argument('--index-out',
+                        help='in makekml, also write the normalized image '
+                             'metadata to this .csv, .sqlite or .parquet '
+                             'file, reusing its rows on the next run')
+        ap.add_argument('--gpx-cache',
+                        help='directory in which parsed GPX files are kept '
+                             'for reuse by later runs')
+        ap.add_argument('--interval',
+                        help='seconds between rewrites of the output in '
+                             '--watch mode')
+        ap.add_argument('--journal',
+                        help='in makekml and orientjpeg, record completed '
+                             'work in this file for --resume')
+        ap.add_argument('-j', '--jobs',
+                        help='number of exiftool sessions makekml keeps '
+                             'reading concurrently')
+        ap.add_argument('--max-accel',
+                        help='in makekml, drop GPS glitches that imply an '
+                             'acceleration above this many m/s/s')
+        ap.add_argument('--max-speed',
+                        help='in makekml, drop GPS glitches that imply a '
+                             'speed above this many km/h')
+        ap.add_argument('-m', '--merge',
+                        help='in makekml, merge overlapping GPX logs into '
+                             'one track per day')
         ap.add_argument('-o', '--out',
                         help='output filename')
+        ap.add_argument('--phototracks',
+                        choices=phototracks.GROUPINGS,
+                        help='in makekml, derive a track from the image '
+                             'positions for each day or each directory')
+        ap.add_argument('--profile',
+                        choices=['table', 'json'],
+                        help='report the time, files, bytes and points in '
+                             'each stage to stderr at the end of the run')
         ap.add_argument('-r', '--replace',
                         help='Replace dupicate Elements in an existing KML '
                              'file, otherwise skip the new item')
+        ap.add_argument('--resume',
+                        help='replay the --journal of an interrupted run '
+                             'and skip the work it records')
+        ap.add_argument('--shard',
+                        help='in makekml, write a fragment of the document '
+                             'to --out for mergekml to combine')
+        ap.add_argument('--sort-memory',
+                        help='megabytes of image records makekml sorts in '
+                             'memory before spilling them to temporary files')
+        ap.add_argument('--to',
+                        help='in makekml, only images and trackpoints up to '
+                             'and including this date or date and time')
+        ap.add_argument('--tz-boundaries',
+                        help='in makekml, convert image times to UTC in the '
+                             'timezone at each position, read from this '
+                             'GeoJSON file of timezone boundaries')
+        ap.add_argument('--trackstats',
+                        help='in makekml, add the distance, duration, moving '
+                             'time and top speed to each GPX track')
+        ap.add_argument('--update',
+                        help='in makekml, add the new tracks and images to '
+                             'the existing --out file instead of replacing it')
         ap.add_argument('-u', '--url',
                         help='''base url for files, e.g.
                             for disk files file:///absolute/path/to/directory/
@@ -180,8 +286,14 @@ class jpggps2kml():
         ap.add_argument('--utc',
                         help='UTC date time (findoffset) or offset (editgps)')
         ap.add_argument('-v', '--verbosity',
-                        choices=['none','normal','debug'],
+                        choices=['quiet', 'none', 'normal', 'debug'],
                         help='verbosity message verbosity')
+        ap.add_argument('-w', '--window',
+                        help='seconds in which a single GPX source is chosen '
+                             'when merging overlapping logs')
+        ap.add_argument('--watch',
+                        help='in makekml, keep running and update the output '
+                             'as JPEG and GPX files are added or changed')
         ap.add_argument('dir', nargs='*',
                         help='directories to search for JPEG files')
         self.a = vars(ap.parse_args())
@@ -249,7 +361,7 @@ class jpggps2kml():
                                   os.path.expandvars(args['out'])))
 
         self.verbosity = 1
-        if args['verbosity'] == 'quiet':
+        if args['verbosity'] in ('quiet', 'none'):
             self.verbosity = 0
         elif args['verbosity'] == 'debug':
             self.verbosity = 2
@@ -258,91 +370,87 @@ class jpggps2kml():
             print('ERROR: no input directories specified', file=sys.stderr)
             sys.exit(-1)
 
-    def colourStyle(self,
-                   doc,
-                   colourID,
-                   colour_normal,
-                   width_normal,
-                   colour_highlight,
-                   width_highlight):
+        self.profile = profiling.stageprofile(
+                           os.path.basename(sys.argv[0]),
+                           enabled=('profile' in args and 
+                                    bool(args['profile'])))
+        if 'cprofile' in args and args['cprofile']:
+            self.profile.start_cprofile()
+
+    def open_journal(self, command):
         """
-        Append line style elements to a KML document.
-        Arguments:
-        doc: KML document to hold the new styles
-        colourID: the base ID for the styles
-        colour_normal: normal colour for the line
-        width_normal: normal width for the line
-        colour_highlight: highlighted colour for the line
-        width_highlight: highlighted width for the line
-        """
-        doc.append(
-            KML.Style(
-                KML.IconStyle(
-                    KML.Icon(),
-                    id="no_icon_n"
-                ),
-                KML.LineStyle(
-                    KML.color(colour_normal),
-                    KML.width(width_normal)
-                ),
-                id=(colourID + '_n')
-            )
-        )
-        doc.append(
-            KML.Style(
-                KML.IconStyle(
-                    KML.Icon(),
-                    id="no_icon_h"
-                ),
-                KML.LineStyle(
-                    KML.color(colour_highlight),
-                    KML.width(width_highlight)
-                ),
-                id=(colourID + '_h')
-            )
-        )
-        doc.append(
-            KML.StyleMap(
-                KML.Pair(
-                    KML.key('normal'),
-                    KML.styleUrl('#' + colourID + '_n')
-                ),
-                KML.Pair(
-                    KML.key('highlight'),
-                    KML.styleUrl('#' + colourID + '_h')
-                ),
-                id=colourID
-            )
-        )
-        
+        Set self.journal for --journal, exiting with an error if the 
+        journal cannot be resumed or --resume was given without --journal.
+        """
+        args = self.config['arguments']
+        resume = 'resume' in args and bool(args['resume'])
+        if not ('journal' in args and args['journal']):
+            if resume:
+                print('ERROR: --resume requires --journal', file=sys.stderr)
+                sys.exit(-1)
+            return
+        from . import journal
+        self.journal = journal.journal(
+                           os.path.abspath(
+                               os.path.expanduser(
+                                   os.path.expandvars(args['journal']))),
+                           command,
+                           resume)
+        message = self.journal.check()
+        if message:
+            print('ERROR: ' + message, file=sys.stderr)
+            sys.exit(-1)
+
+    def finish_journal(self):
+        """
+        Remove the journal once the run has completed
+        """
+        if self.journal is not None:
+            self.journal.remove()
+
+    def report_profile(self):
+        """
+        At the end of a run, write the stage profile requested by --profile
+        to stderr and the cProfile dump requested by --cprofile.
+        """
+        args = self.config['arguments']
+        if 'cprofile' in args and args['cprofile']:
+            self.profile.stop_cprofile(
+                os.path.abspath(
+                    os.path.expanduser(
+                        os.path.expandvars(args['cprofile']))))
+        if 'profile' in args and args['profile']:
+            self.profile.report(args['profile'])
+
+    def listjpeg(self, directory):
+        """
+        Return a sorted list of (filename, filebase) tuples for the JPEG
+        files in directory.  This is the discovery stage of each command.
+        """
+        return scanner.listjpeg(directory, self.profile)
+
     def gpxfiles(self):
         """
-        Returns a list of (abspath, basename) tuples of GPX files in --gpx 
+        Returns a list of (abspath, basename) tuples of GPX files in --gpx
         """
         args = self.config['arguments']
-        gpxlist = []
-        
+
         # if --gpx was specified, search there for GX files and ignore any
         # found in dirs.  Otherwise search for all GPX files in dirs.
+        # A GPX file specified on the command line is always included.
         if 'gpx' in args and args['gpx']:
             gpxdirs = [args['gpx']]
         else:
             gpxdirs = self.dirs
-        
-        for gpxdir in gpxdirs:
-            for f in os.listdir(gpxdir):
-                fbase, fext = os.path.splitext(f)
-                
-                if fext in ('.gpx', '.GPX'):
-                    gpxlist.append((os.path.join(gpxdir, f), fbase))
-        
-        # If a GPX file is specified on the command line, include it
-        for f in self.files:
-            fbase, fext = os.path.split(f)
-            fbase = os.path.basename(fbase)
-            if fext in ('.gpx', '.GPX') and os.path.isfile(f):
-                gpxlist.append((f, fbase))
-        
+        gpxlist = scanner.gpxfiles(gpxdirs, self.files, self.profile)
+        if self.selection is not None:
+            # Leave out logs whose names or directories date them outside
+            # --from and --to
+            gpxlist = [(g, gbase) for g, gbase in gpxlist
+                       if self.selection.name_in_range(gbase) and
+                          self.selection.name_in_range(
+                              os.path.basename(os.path.dirname(g)))]
+
         if self.verbosity > 1:
             print(repr(gpxlist), file=sys.stderr)
         
@@ -367,444 +475,608 @@ class jpggps2kml():
         On successful exit, trackfolder and colourIndex will have been updated.
         """
         args = self.config['arguments']
-        gpxtree = etree.parse(filepath).getroot()        
-        namespace = gpxtree.nsmap[None]
-        if self.verbosity > 1:
-            print('namespace for ' + filepath + ': ' + namespace, 
-                  file=sys.stderr)
-        
-        print('{%s}trk' % namespace, file=sys.stderr)
-        print(namespace + 'trk', file=sys.stderr)
-        for gpxtrack in gpxtree.getiterator('{%s}trk' % namespace):
-            print('got here', file=sys.stderr)
-            # Extract the track name from the GPX track
-            try:
-                trackname = gpxtrack.find('{%s}name' % namespace).text
-            except:
-                print('track does not have name in ' + filepath, 
+        columns = self.read_gpx(filepath)
+        limits = self.track_limits()
+
+        existing = kml.placemarks(trackfolder)
+        for trackname, rowlist in columns.segment_rows(self.selection):
+            if self.selection is not None and not rowlist:
+                # nothing in --from, --to and --bbox
+                continue
+            if not trackname:
+                print('track does not have name in ' + filepath,
                       file=sys.stderr)
                 trackname = filebase
-            print('trackname = ' + trackname, file=sys.stderr)
+            if self.gazetteer is not None:
+                lat = columns.values('lat')
+                lon = columns.values('lon')
+                place = self.place_near([lat[i] for rows in rowlist
+                                         for i in rows],
+                                        [lon[i] for rows in rowlist
+                                         for i in rows])
+                if place:
+                    trackname += ' near ' + place
+            if self.verbosity > 1:
+                print('trackname = ' + trackname, file=sys.stderr)
 
             # does a Placemark already exist with this name?
-            placemark = None
-            for pm in trackfolder.findall('GX.Placemark'):
-                if pm.find('KML.name').text == trackname:
-                    placemark = pm
-                    break
-            if 'replace' in args and args['replace']:
-                trackfolder.drop(placemark)
-                placemark = None
-            
-            if not placemark:
+            if trackname in existing:
+                if 'replace' in args and args['replace']:
+                    trackfolder.remove(existing[trackname])
+                else:
+                    continue
+
+            description = trackname + ' from ' + filebase
+            if limits is not None:
+                rowlist, text = self.clean_track(trackname,
+                                                 columns.values('epoch'),
+                                                 columns.values('lat'),
+                                                 columns.values('lon'),
+                                                 rowlist,
+                                                 limits)
+                if text:
+                    description += ': ' + text
+
+            with self.profile.stage('kml build') as sc:
                 # Create a new Placemark to hold the KML track(s)
                 colourID = '#colour' + str(self.colourIndex)
                 self.colourIndex = (self.colourIndex + 1) % self.colourSetLen
 
-                placemark = KML.Placemark(
-                    KML.visibility('1'),
-                    KML.name(trackname),
-                    KML.description(trackname + ' from ' + filebase),
-                    KML.styleUrl(colourID)
-                    )
+                placemark = kml.track_placemark(trackname,
+                                                description,
+                                                colourID)
                 trackfolder.append(placemark)
 
+                # A GPX trkseg translates into a gx:Track
                 tracklist = []
-                for gpxtrkseg in gpxtrack.getiterator('{%s}trkseg' % namespace):
-                    # A GPX trkseg translates into aGX.track
-                    kmltrack = GX.Track(
-                        KML.altitudeMode('clampToGround')
-                        )
-                    whenlist = []
-                    coordlist = []
-                    for gpxtrkpoint in gpxtrkseg:
-                        lat = gpxtrkpoint.attrib['lat']
-                        lon = gpxtrkpoint.attrib['lon']
-                        alt = gpxtrkpoint.find('{%s}ele'% namespace).text
-                        time = gpxtrkpoint.find('{%s}time'% namespace).text
-                        
-                        whenlist.append(GX.when(time))
-                        coordlist.append(GX.coord('{0} {1} {2}'.format(lon, 
-                                                                       lat, 
-                                                                       alt)))
-                    for w in whenlist:
-                        kmltrack.append(w)
-                    for c in coordlist:
-                        kmltrack.append(c)
-                    tracklist.append(kmltrack)
-                
+                for rows in rowlist:
+                    whens, coords = columns.segment_texts(rows)
+                    tracklist.append(kml.gxtrack(whens, coords))
+                    sc.add(points=len(whens))
+
                 if tracklist:
                     if len(tracklist) > 1:
-                        multitrack = GX.MultiTrack()
-                        for t in tracklist:
-                            multitrack.append(t)
-                        placemark.append(multitrack)
+                        placemark.append(kml.multitrack(tracklist))
                     else:
                         placemark.append(tracklist[0])
                 else:
                     print('no tracks found in ' + filepath, file=sys.stderr)
         
-    def read_image_placemarks_from_jpeg(self, 
-                                        jpegdisk,
-                                        jpegrooted,
-                                        jpegbase, 
-                                        imagefolder,
-                                        et):
-        """
-        Read a JPEG file and extract the GPS location, if present. Create a 
-        Placemark for the image and append or replace it in the imagefolder.  
-        This fills the imagefolder in makekml.
+    def track_limits(self):
+        """
+        Return (maximum speed in metres per second, maximum acceleration,
+        True if statistics are wanted) from --max-speed, --max-accel and 
+        --trackstats, or None if none of them was given
+        """
+        args = self.config['arguments']
+        max_speed = max_accel = 0.0
+        if 'max_speed' in args and args['max_speed']:
+            # given in km/h
+            max_speed = float(args['max_speed']) / 3.6
+        if 'max_accel' in args and args['max_accel']:
+            max_accel = float(args['max_accel'])
+        withstats = 'trackstats' in args and bool(args['trackstats'])
+        if not (max_speed or max_accel or withstats):
+            return None
+        return max_speed, max_accel, withstats
+
+    def clean_track(self, trackname, epoch, lat, lon, rowlist, limits):
+        """
+        Return (rowlist, text), where rowlist holds the rows of each 
+        segment of a track with its GPS glitches removed and text gives the
+        statistics of the track if they are wanted, otherwise ''.
         
         Arguments:
-        jpegdisk: the full path to the JPEG file on the disk
-        jpegrooted: the path to the JPEG file relative to the root 
-        jpegbase: the basename of the JPEG file, used as an image label
-        imagefolder: a KML.Folder to hold image Placemarks
-        et: an existing ExifTool object
-        
-        On successful exit, imagefolder will have been updated.
+        trackname: the name of the track, for messages
+        epoch, lat, lon: the time and position columns of the points
+        rowlist: the rows of the points in each segment
+        limits: the tuple returned by track_limits()
+        """
+        from . import trackstats
         
-        If the path on disk for the file is like
-            jpegdisk = /path/to/root/relative/to/root
-        then
-            jpegrooted = relative/to/root
-        and the full url to locate the image in the KML file will be
-            '/'.join(self.url, jpegrooted)
+        max_speed, max_accel, withstats = limits
+        points = sum(len(rows) for rows in rowlist)
+        with self.profile.stage('track stats', points=points):
+            rowlist = [trackstats.clean(epoch, 
+                                        lat, 
+                                        lon, 
+                                        rows, 
+                                        max_speed, 
+                                        max_accel) for rows in rowlist]
+            rowlist = [rows for rows in rowlist if len(rows)]
+            text = ''
+            if withstats:
+                st = trackstats.stats()
+                for rows in rowlist:
+                    st.add(epoch, lat, lon, rows)
+                text = st.text()
+        dropped = points - sum(len(rows) for rows in rowlist)
+        if self.verbosity > 0 and dropped:
+            print('dropped ' + str(dropped) + ' glitches from ' + trackname,
+                  file=sys.stderr)
+        return rowlist, text
+
+    def read_gpx(self, filepath):
         """
+        Return the gpxcache.trackcolumns of a GPX file, taken from the 
+        cache in --gpx-cache if it is current, otherwise parsed (and stored 
+        in the cache if --gpx-cache was given).
+        """
+        from . import gpxcache
+
         args = self.config['arguments']
+        if (self.gpxcache is None and 
+                'gpx_cache' in args and args['gpx_cache']):
+            self.gpxcache = gpxcache.gpxcache(
+                                os.path.abspath(
+                                    os.path.expanduser(
+                                        os.path.expandvars(
+                                            args['gpx_cache']))))
         
-        # Does a placemark for this image already exist in the imagefolder?
-        for pm in imagefolder:
-            name = pm.find('Name')
-            if name and name.text == jpegbase:
+        with self.profile.stage('gpx parse', files=1) as sc:
+            columns = None
+            if self.gpxcache is not None:
+                columns = self.gpxcache.load(filepath)
+            if columns is None:
+                from . import gpx
+                sc.add(nbytes=os.path.getsize(filepath))
+                gpxtree, namespace = gpx.parse(filepath)
                 if self.verbosity > 1:
-                    print(jpegbase,'found in imagefolder', file=sys.stderr)
-                
-                # image already present
-                if 'replace' in args and args['replace']:
-                    # replace the image by dropping the existing copy
-                    if self.verbosity > 1:
-                        print('replace ' + jpegbase, file=sys.stderr)
-                    imagefolder.drop(pm)
-                else:
-                    # keep the image, so bail from further processing
-                    if self.verbosity > 1:
-                        print('retain existing ' + jpegbase, file=sys.stderr)
-                    return
+                    print('namespace for ' + filepath + ': ' + namespace,
+                          file=sys.stderr)
+                columns = gpxcache.trackcolumns.from_gpx(gpxtree, namespace)
+                if self.gpxcache is not None:
+                    self.gpxcache.store(filepath, columns)
+            elif self.verbosity > 1:
+                print('cached ' + filepath, file=sys.stderr)
+            sc.add(points=columns.count)
+        return columns
+
+    def read_merged_tracks(self, gpxlist, trackfolder):
+        """
+        Merge the trackpoints of every GPX file in gpxlist into one track 
+        for each UTC day, choosing the best logger in each --window seconds,
+        and append or replace a Placemark for each day in the trackfolder.
+        This fills the trackfolder in makekml when --merge is given.
         
-        # Get here only if we need to generate a new Placemark        
-        tags = et.get_tags(self.items, jpegdisk)
-        if self.verbosity > 1:
-            for k in tags:
-                if k in self.items:
-                    print(k, ' = ', tags[k], file=sys.stderr)
-
-        lat = lon = None
-        datestr = timestr = ''
-        alt = 0
-
-        if "EXIF:GPSLatitude" in tags:
-            lat = tags['EXIF:GPSLatitude']
-            if ('EXIF:GPSLatitudeRef' in tags and 
-                tags['EXIF:GPSLatitudeRef'] == 'S'):
-
-                lat = -lat
-
-        if "EXIF:GPSLongitude" in tags:
-            lon = tags['EXIF:GPSLongitude']
-            if ('EXIF:GPSLongitudeRef' in tags and 
-                tags['EXIF:GPSLongitudeRef'] == 'W'):
-
-                lon = -lon
-
-        if "EXIF:GPSAltitude" in tags:
-            alt = tags['EXIF:GPSAltitude']
-
-        if "EXIF:DateTimeOriginal" in tags:
-            m = re.match(r'\s*(\d+:\d+:\d+)\s+'
-                         r'(\d+:\d+:[\d.]+)\s*',
-                         tags['EXIF:DateTimeOriginal'])
-            datestr = re.sub(r':', '-', m.group(1))
-            timestr = m.group(2)
-
-        if self.verbosity > 1:
-            print(datestr,
-                  timestr,
-                  lat,
-                  lon,
-                  alt,
-                  '\n',
-                  file=sys.stderr)
-
-        in_kml = ''
-        if datestr and timestr and lat and lon:
-            in_kml = ' in kml'
+        Arguments:
+        gpxlist: a list of (filepath, filebase) tuples from gpxfiles()
+        trackfolder: a KML.Folder to hold track Placemarks
+        """
+        from . import gpxmerge
 
-            if 'url' in args and args['url']:
-                jpegurl = '/'.join([self.config['arguments']['url'], 
-                                    jpegrooted])
-            else:
-                jpegurl = '/'.join(['file:/', jpegdisk])
+        args = self.config['arguments']
+        window = gpxmerge.WINDOW
+        if 'window' in args and args['window']:
+            window = float(args['window'])
+
+        existing = kml.placemarks(trackfolder)
+        limits = self.track_limits()
+
+        paths = [g for g, gbase in gpxlist]
+        points = gpxmerge.merged(paths, window)
+        if self.selection is not None:
+            # Stop reading the logs at the end of --to
+            points = self.selection.trim(points)
+        dayiter = gpxmerge.days(points)
+        while True:
+            with self.profile.stage('gpx merge') as sc:
+                day, points = next(dayiter, (None, None))
+                if day is None:
+                    break
+                sc.add(points=len(points))
+            if (self.selection is not None and
+                    not self.selection.enters_bbox([p.lat for p in points],
+                                                   [p.lon for p in points])):
+                continue
             
- #           cdatakey = 'CDATA' + jpegrooted + datestr + jpegbase
-            cdatakey = datestr + jpegbase
-            self.cdatatext[cdatakey] = ('<![CDATA[<img src="' + 
-                jpegurl + '" width=400/><br/>' + 
-                'in ' + os.path.dirname(jpegrooted) + 
-                ' at ' + timestr +
-                ' on ' + datestr + '<br/>]]>')
+            text = ''
+            if limits is not None:
+                rowlist, text = self.clean_track(
+                                    'merged ' + day,
+                                    array.array('d', [p.epoch 
+                                                      for p in points]),
+                                    array.array('d', [float(p.lat) 
+                                                      for p in points]),
+                                    array.array('d', [float(p.lon) 
+                                                      for p in points]),
+                                    [range(len(points))],
+                                    limits)
+                if not rowlist:
+                    continue
+                points = [points[i] for i in rowlist[0]]
             
+            trackname = 'merged ' + day
+            if self.gazetteer is not None:
+                place = self.place_near([float(p.lat) for p in points],
+                                        [float(p.lon) for p in points])
+                if place:
+                    trackname += ' near ' + place
+            if trackname in existing:
+                if 'replace' in args and args['replace']:
+                    trackfolder.remove(existing[trackname])
+                else:
+                    continue
             
-            imagefolder.append( 
-                KML.Placemark(
-                    KML.visibility('1'),
-                    KML.styleUrl('#picture'),
-                    KML.name(jpegbase),
-                    KML.description('{' + cdatakey + '}'),
-                    KML.Point(KML.coordinates('{0},{1},{2}'.format(lon, 
-                                                                   lat, 
-                                                                   alt)))
-                    )
-                )
-
-        if self.verbosity > 0:
-            print('    ' + jpegrooted, in_kml, file=sys.stderr)
+            with self.profile.stage('kml build', points=len(points)):
+                colourID = '#colour' + str(self.colourIndex)
+                self.colourIndex = (self.colourIndex + 1) % self.colourSetLen
+                
+                sources = sorted(set(os.path.basename(paths[p.source]) 
+                                     for p in points))
+                description = ('Merged track on ' + day + ' from ' + 
+                               ', '.join(sources))
+                if text:
+                    description += ': ' + text
+                placemark = kml.track_placemark(trackname,
+                                                description,
+                                                colourID)
+                placemark.append(kml.gxtrack(
+                    [p.time for p in points],
+                    ['{0} {1} {2}'.format(p.lon, p.lat, p.ele or '0')
+                     for p in points]))
+                trackfolder.append(placemark)
             
+            if self.verbosity > 0:
+                print(trackname + ': ' + str(len(points)) + ' points from ' +
+                      ', '.join(sources), file=sys.stderr)
 
-    def makeKmlDoc(self):
+    def image_records(self, jpeglist, batch):
         """
+        Return the imagerecords of the images in a chunk that have a GPS 
+        location, reporting each image at normal verbosity.
+        
+        Arguments:
+        jpeglist: a list of (jpegdisk, jpegrooted, jpegbase) tuples, where
+            jpegdisk: the full path to the JPEG file on the disk
+            jpegrooted: the path to the JPEG file relative to the root 
+            jpegbase: the basename of the JPEG file, used as an image label
+        batch: the normalized gpsbatch for jpeglist from read_jpeg_batch()
+        """
+        if self.verbosity > 0:
+            for i, (jpegdisk, jpegrooted, jpegbase) in enumerate(jpeglist):
+                print('    ' + jpegrooted, 
+                      ' in kml' if batch.located(i) else '', 
+                      file=sys.stderr)
+        imagerecords = batch.records(jpeglist)
+        if self.tzindex is not None:
+            # Convert first, so that --from and --to apply in UTC
+            with self.profile.stage('timezones', files=len(imagerecords)):
+                self.tzindex.to_utc(imagerecords)
+        if self.selection is not None:
+            imagerecords = [r for r in imagerecords
+                            if self.selection.contains(
+                                   r.datestr, 
+                                   r.timestr, 
+                                   r.lat, 
+                                   r.lon,
+                                   r.epoch if (self.tzindex is not None and
+                                               r.utc) else None)]
+        return imagerecords
+
+    def unique_images(self, imagerecords):
+        """
+        Return imagerecords with identical copies of an image removed if 
+        --dedup was given, recording the copies as alternates of the one 
+        that is kept, otherwise return imagerecords unchanged.
         """
-        self.cdatatext = {}
         args = self.config['arguments']
+        if not ('dedup' in args and args['dedup']):
+            return imagerecords
         
-        trackfolder = imagefolder = None
-        self.colourIndex = 0
-        
-        if ('update' in self.config['arguments'] and 
-            self.config['arguments']['update']):
-            
-            with open(args['out'], 'r') as f:
-                doc = KML.parse(f)
-            # Find a folder that contains a Name with the text "tracks"
-            trackfolder = doc.find('./Folder/[Name="tracks"]/..')
-            # Find a folder that contains a Name with the text "tracks"
-            imagefolder = doc.find('./Folder/[Name="images"]/..')
-
-            if trackfolder:
-                self.colourIndex = \
-                    ((len(trackfolder.findall(KML.PlaceMark)) - 1) % 
-                      self.colourSetLen)
-        else:
-            # create a new KML structure from scratch
-            doc = KML.Document(
-                      KML.description('Tracks and image placemarks'),
-                      KML.visibility('1'),
-                      KML.open('1'),
-                      KML.name("Tracks and Images")
-                  )
-    
-            # Append a style for pictures using the camera icon
-            doc.append(
-                KML.Style(
-                    KML.IconStyle(
-                        KML.scale(1.0),
-                        KML.Icon(
-                            KML.href(
-                                'http://maps.google.com/mapfiles/kml/'\
-                                'shapes/camera.png'),
-                        ),
-                        id="picture_style"
-                    ),
-                    id='picture'
-                )
-            )
-    
-            # Append styles for lines in different colours
-            colourSet = [['7fff0000', 6, 'ffff0000', 8],
-                         ['7f00ff00', 6, 'ff00ff00', 8],
-                         ['7f0000ff', 6, 'ff0000ff', 8],
-                         ['7fffff00', 6, 'ffffff00', 8],
-                         ['7fff00ff', 6, 'ffff00ff', 8],
-                         ['7f00ffff', 6, 'ff00ffff', 8]]
-            self.colourSetLen = len(colourSet)
-            
-            for colourIndex in range(len(colourSet)):
-                normal, narrow, highlight, wide = colourSet[colourIndex]
-                colourID = 'colour' + str(colourIndex)
-                self.colourStyle(doc, 
-                                 colourID, 
-                                 normal, 
-                                 narrow,
-                                 highlight,
-                                 wide)
-            
-            trackfolder = KML.Folder(
-                              KML.Name('tracks')
-                              )
-            doc.append(trackfolder)
-            
-            imagefolder = KML.Folder(
-                              KML.Name('images')
-                              )
-            doc.append(imagefolder)
-
-        return (doc, trackfolder, imagefolder)
+        from . import dedup
+        kept = dedup.unique(imagerecords, self.profile)
+        if self.verbosity > 0 and len(kept) < len(imagerecords):
+            print('dropped ' + str(len(imagerecords) - len(kept)) +
+                  ' duplicate images', file=sys.stderr)
+        if self.verbosity > 1:
+            for r in kept:
+                if r.alternates:
+                    print(r.rooted + ' also in ' + ', '.join(r.alternates),
+                          file=sys.stderr)
+        return kept
 
-    def appendTrackPlacemarks(self, doc, directory, et):
+    def write_image_placemarks(self, imagerecords, out):
         """
-        Append to the KML document doc a folder containing one or more tracks 
-        for the JPEG files in directory, and a folder containing a set of 
-        placemarks for each file.  A separate track will be generated for 
-        each day, assigning colours in a cycle from the colourSet.
+        Write a Placemark for each imagerecord into the output stream in 
+        date, time and path order, using the precompiled template in 
+        kmlwriter rather than pykml elements.
         
         Arguments:
-        doc: the KML document to which the folder will be appended
-        directory: the abspath to the directory containing the files
-        et: an ExifTool object
-        """
-        # Extract time, orientation and GPS metadata from EXIF
-        items = ['EXIF:DateTimeOriginal',
-                 'EXIF:GPSStatus',
-                 'EXIF:GPSMeasureMode',
-                 'EXIF:GPSLongitude',
-                 'EXIF:GPSLongitudeRef',
-                 'EXIF:GPSLatitude',
-                 'EXIF:GPSLatitudeRef',
-                 'EXIF:GPSAltitude']
-        basedir = os.path.basename(directory)
-
-        # Gather JPEG metadata into places
-        places = {}
-        for f in os.listdir(directory):
-            if self.verbosity > 0:
-                print('search for JPEG files in ' + directory, 
-                      file=sys.stderr)
-
-            filebase, fileext = os.path.splitext(f)
-            if fileext in ('.jpg', '.JPG', '.jpeg', '.JPEG'):
-                filepath = os.path.join(directory, f)
-                in_kml = ''
-
-                tags = et.get_tags(items, filepath)
-                if self.verbosity > 1:
-                    for k in tags:
-                        print(k, ' = ', tags[k], file=sys.stderr)
-
-                if 'EXIF:GPSLongitude' in tags:
-                    # GPS metadata id available
-                    lat = lon = None
-                    datestr = timestr = ''
-                    alt = 0
-
-                    if "EXIF:GPSLatitude" in tags:
-                        lat = tags['EXIF:GPSLatitude']
-                        if 'EXIF:GPSLatitudeRef' in tags and \
-                           tags['EXIF:GPSLatitudeRef'] == 'S':
-
-                            lat = -lat
+        imagerecords: a list of imagerecords, which will be sorted in place
+        out: a text stream positioned inside the images folder
+        """
+        with self.profile.stage('serialize'):
+            imagerecords.sort(key=records.imagerecord.sortkey)
+        self.stream_image_placemarks(iter(imagerecords), out)
 
-                    if "EXIF:GPSLongitude" in tags:
-                        lon = tags['EXIF:GPSLongitude']
-                        if 'EXIF:GPSLongitudeRef' in tags and \
-                           tags['EXIF:GPSLongitudeRef'] == 'W':
+    def stream_image_placemarks(self, imagerecords, out):
+        """
+        Write a Placemark for each imagerecord from an iterator that 
+        already yields them in order, CHUNKSIZE at a time.
+        
+        Arguments:
+        imagerecords: an iterator over imagerecords
+        out: a text stream positioned inside the images folder
+        """
+        while True:
+            chunk = list(itertools.islice(imagerecords, CHUNKSIZE))
+            if not chunk:
+                break
+            places = [None] * len(chunk)
+            if self.gazetteer is not None:
+                with self.profile.stage('places', points=len(chunk)):
+                    places = self.gazetteer.nearest_many(
+                                 [r.lat for r in chunk],
+                                 [r.lon for r in chunk])
+            with self.profile.stage('serialize', 
+                                    files=len(chunk),
+                                    points=len(chunk)):
+                text = ''.join([kmlwriter.placemark(
+                                    output.printable(r.name),
+                                    self.image_description(r.path,
+                                                           r.rooted,
+                                                           r.datestr,
+                                                           r.timestr,
+                                                           r.alternates,
+                                                           place),
+                                    r.lon,
+                                    r.lat,
+                                    r.alt) for r, place in zip(chunk, 
+                                                               places)])
+            with self.profile.stage('write', nbytes=len(text)):
+                out.write(text)
+
+    def read_jpeg_batch(self, jpegpaths, et):
+        """
+        Read the EXIF metadata in self.items for a list of JPEG files in a 
+        single exiftool request and return the normalized gpsbatch.
+        
+        Arguments:
+        jpegpaths: a list of full paths to JPEG files
+        et: an existing ExifTool object
+        """
+        return metadata.read_batch(et,
+                                   self.items,
+                                   jpegpaths,
+                                   self.profile,
+                                   self.verbosity)
 
-                            lon = -lon
+    def read_jpeg_chunk(self, jpegpaths, et):
+        """
+        As read_jpeg_batch(), but if --index-out was given take the files 
+        that are unchanged since the existing index was written from there
+        and fill in the size and mtime of every file.
+        """
+        if self.index is None:
+            return self.read_jpeg_batch(jpegpaths, et)
+        return self.index.read(jpegpaths, 
+                               lambda paths: self.read_jpeg_batch(paths, et))
 
-                    if "EXIF:DateTimeOriginal" in tags:
-                        m = re.match(r'\s*(\d+:\d+:\d+)\s+'
-                                     r'(\d+:\d+:[\d.]+)\s*',
-                                     tags['EXIF:DateTimeOriginal'])
-                        datestr = re.sub(r':', '-', m.group(1))
-                        timestr = m.group(2)
+    def read_selected_chunk(self, jpeglist, et):
+        """
+        As read_jpeg_chunk(), but first drop the files that cannot be in
+        --from, --to and --bbox, judged by their modification times and 
+        their current rows in the --index-out index, returning the
+        (jpeglist, gpsbatch) of the files that remain.
+        
+        Arguments:
+        jpeglist: a list of (jpegdisk, jpegrooted, jpegbase) tuples
+        et: an existing ExifTool object
+        """
+        from . import index
+        from . import pushdown
+        
+        with self.profile.stage('discovery'):
+            kept = []
+            for t in jpeglist:
+                size, mtime = index.stamp(t[0])
+                if not self.selection.mtime_in_range(mtime):
+                    continue
+                if self.index is not None:
+                    row = self.index.rows.get(t[0])
+                    if (row is not None and 
+                            row[3] == size and 
+                            row[4] == mtime and
+                            not self.selection.contains(
+                                    row[6], 
+                                    row[7], 
+                                    row[8], 
+                                    row[9],
+                                    # the epoch of the row may be camera 
+                                    # time, up to a day from UTC
+                                    row[5] if self.tzindex is not None 
+                                    else None,
+                                    pushdown.MARGIN)):
+                        continue
+                kept.append(t)
+        if not kept:
+            return kept, normalize.gpsbatch(0)
+        return kept, self.read_jpeg_chunk([t[0] for t in kept], et)
+
+    def place_near(self, lats, lons):
+        """
+        Return the label of the place in --gazetteer nearest the centre of 
+        a track, or None if there is no such place.
+        
+        Arguments:
+        lats, lons: the latitude and longitude of each point of the track
+        """
+        from . import gazetteer
+        with self.profile.stage('places', points=len(lats)):
+            centre = gazetteer.centroid(lats, lons)
+            found = self.gazetteer.nearest(*centre) if centre else None
+        return found[0] if found else None
 
-                    if "EXIF:GPSAltitude" in tags:
-                        alt = tags['EXIF:GPSAltitude']
+    def places_near(self, tracks):
+        """
+        Return the label of the place in --gazetteer nearest the centre of 
+        each of a list of tracks, looked up together, with None where 
+        there is no such place.
+        
+        Arguments:
+        tracks: a list of (lat, lon, indices), where lat and lon are 
+            columns and indices picks the points of the track from them
+        """
+        from . import gazetteer
+        with self.profile.stage('places') as sc:
+            centres = [gazetteer.centroid([lat[i] for i in indices],
+                                          [lon[i] for i in indices])
+                       for lat, lon, indices in tracks]
+            sc.add(points=sum(len(t[2]) for t in tracks))
+            found = self.gazetteer.nearest_many(
+                        [c[0] for c in centres if c],
+                        [c[1] for c in centres if c])
+        labels = iter([f[0] if f else None for f in found])
+        return [next(labels) if c else None for c in centres]
+
+    def read_gazetteer(self):
+        """
+        Load the index of the --gazetteer file into self.gazetteer, if it 
+        is given, building it first if needed.
+        """
+        args = self.config['arguments']
+        if 'gazetteer' in args and args['gazetteer']:
+            from . import gazetteer
+            radius = gazetteer.RADIUS
+            if 'gazetteer_radius' in args and args['gazetteer_radius']:
+                try:
+                    km = float(args['gazetteer_radius'])
+                except ValueError:
+                    km = -1.0
+                if not km >= 0.0:
+                    print('ERROR: --gazetteer-radius must be a distance in '
+                          'km, or 0 for no limit: ' + 
+                          args['gazetteer_radius'], file=sys.stderr)
+                    sys.exit(-1)
+                # 0 removes the limit
+                radius = 1000.0 * km if km else None
+            try:
+                with self.profile.stage('places'):
+                    self.gazetteer = gazetteer.gazetteer.load(
+                                         os.path.abspath(
+                                             os.path.expanduser(
+                                                 os.path.expandvars(
+                                                     args['gazetteer']))),
+                                         self.verbosity,
+                                         radius)
+            except (OSError, ValueError) as e:
+                print('ERROR: cannot read --gazetteer: ' + str(e),
+                      file=sys.stderr)
+                sys.exit(-1)
 
-                    if self.verbosity > 1:
-                        print(datestr,
-                              timestr,
-                              lat,
-                              lon,
-                              alt,
-                              '\n',
-                              file=sys.stderr)
+    def image_description(self, jpegdisk, jpegrooted, datestr, timestr,
+                          alternates=None, place=None):
+        """
+        Return the HTML displayed in the popup for an image placemark.
+        
+        Arguments:
+        jpegdisk: the full path to the JPEG file on the disk
+        jpegrooted: the path to the JPEG file relative to the root 
+        datestr: the date the image was taken, as YYYY-MM-DD
+        timestr: the time the image was taken, as HH:MM:SS
+        alternates: the rooted paths of identical copies, if any
+        place: the (label, metres) of the nearest place in --gazetteer
+        """
+        args = self.config['arguments']
+        if 'url' in args and args['url']:
+            jpegurl = '/'.join([args['url'], output.urlpath(jpegrooted)])
+        else:
+            jpegurl = '/'.join(['file:/', output.urlpath(jpegdisk)])
+        
+        description = ('<img src="' + jpegurl + '" width=400/><br/>' + 
+                       'in ' + output.printable(os.path.dirname(jpegrooted)) +
+                       ' at ' + timestr +
+                       ' on ' + datestr + '<br/>')
+        if alternates:
+            description += ('also in ' + 
+                            output.printable(', '.join(alternates)) + '<br/>')
+        if place is not None:
+            from . import gazetteer
+            description += ('near ' + kmlwriter.escape(place[0]) + ' (' +
+                            gazetteer.distance_text(place[1]) + ')<br/>')
+        return description
 
-                    if datestr and timestr and lat and lon:
-                        in_kml = ' in kml'
-
-                        if datestr not in places:
-                            places[datestr] = {}
-                        
-                        timefile = timestr + filebase
-                        if timefile not in places[datestr]:
-                            places[datestr][timefile] = {}
-                    
-                        jpegmeta = places[datestr][timefile]
-                        jpegmeta['filebase'] = filebase
-                        jpegmeta['time'] = GX.when('T'.join(datestr, timestr))
-                        jpegmeta['place'] = \
-                            GX.coord('{0} {1} {2}'.format(lon, 
-                                                          lat, 
-                                                          alt))
-                        jpegmeta['point'] = \
-                            KML.Point(
-                                KML.coordinates('{0},{1},{2}'.format\
-                                                (lon, lat, 0)))
-                        if self.config['arguments']['url']:
-                            jpegmeta['fileurl'] = '/'.join(
-                                self.config['arguments']['url'], basedir, f)
-                        else:
-                            jpegmeta['fileurl'] = '/'.join('file:/', filepath)
+    def makeKmlDoc(self):
+        """
+        Create a new KML document skeleton, returning 
+        (doc, trackfolder, imagefolder), and start the track colours at the 
+        beginning of the colour set.  An existing file is never parsed into
+        the skeleton; --update streams it instead (see kmlupdate).
+        """
+        self.cdatatext = {}
+        self.colourIndex = 0
+        self.colourSetLen = len(kml.COLOURSET)
+        return kml.document()
 
-                if self.verbosity > 0:
-                    print('    ' + f, in_kml, file=sys.stderr)
-
-        # Build the track folder and placemark folder
-        track_folder = KML.Folder()
-        image_folder = KML.Folder()
-        for datestr in sorted(places.keys()):
-            colourID = '#colour' + str(self.colourIndex)
-            placemark = KML.Placemark(
-                KML.visibility('1'),
-                KML.name(basedir),
-                KML.description('Path taken at ' + basedir + ' on ' + 
-                                datestr),
-                KML.styleUrl(colourID)
-                )
-            self.colourIndex = (self.colourIndex + 1) % self.colourSetLen
-
-            track = GX.Track(
-                KML.altitudeMode('clampToGround')
-                )
-            for tf in sorted(places[datestr].keys()):
-                # append when elements
-                track.append(places[datestr][tf]['time'])
-            for tf in sorted(places[datestr].keys()):
-                # append coord elements
-                track.append(jpegmeta[tf]['place'])
-            placemark.append(track)
-            track_folder.append(placemark)
+    def split_document(self, doc, trackfolder, imagefolder):
+        """
+        Serialize the skeleton doc with placeholders in its (empty) track 
+        and image folders, returning the (head, middle, tail) text to be 
+        written before the tracks, between the tracks and the images, and
+        after the images.
+        """
+        trackfolder.append(kml.comment(kmlwriter.TRACK_PLACEHOLDER))
+        imagefolder.append(kml.comment(kmlwriter.PLACEHOLDER))
+        head, rest = kmlwriter.split_skeleton(
+                         kml.tostring(doc).format_map(self.cdatatext), 
+                         kmlwriter.TRACK_PLACEHOLDER_COMMENT)
+        middle, tail = kmlwriter.split_skeleton(rest)
+        return head, middle, tail
+
+    def appendTrackPlacemarks(self, trackfolder):
+        """
+        Append to trackfolder a Placemark holding a track derived from the 
+        positions of the images in self.photos for each day, or each 
+        directory if --phototracks=dir, assigning colours in a cycle from the
+        colourSet.  If --gap is given, a track is also split wherever 
+        consecutive images are more than that many seconds apart.
+        
+        Arguments:
+        trackfolder: a KML.Folder to hold track Placemarks
+        """
+        args = self.config['arguments']
+        gap = 0.0
+        if 'gap' in args and args['gap']:
+            gap = float(args['gap'])
+        
+        with self.profile.stage('kml build'):
+            segments = self.photos.segments(args['phototracks'], gap)
+        
+        places = [None] * len(segments)
+        if self.gazetteer is not None:
+            places = self.places_near([(self.photos.lat, 
+                                        self.photos.lon, 
+                                        indices)
+                                       for key, indices in segments])
+        
+        with self.profile.stage('kml build') as sc:
+            existing = kml.placemarks(trackfolder)
             
-            for tf in sorted(places[datestr].keys()):
-                jpegmeta = places[datestr][tf]
+            for (key, indices), place in zip(segments, places):
+                trackname = 'photos ' + key
+                if place:
+                    trackname += ' near ' + place
+                if trackname in existing:
+                    if 'replace' in args and args['replace']:
+                        trackfolder.remove(existing[trackname])
+                    else:
+                        continue
                 
-                jpg = jpegmeta['filebase']
-                cdatakey = 'CDATA' + directory + datestr + jpg
-                self.cdatatext[cdatakey] = ('<![CDATA[<img src="' + 
-                    jpegmeta['fileurl'] + ' width=400/><br/>' + 
-                    'Taken at ' + directory + ' on ' + datestr + '<br/>]]>')
-                image_folder.append( 
-                    KML.Placemark(
-                        KML.visibility('1'),
-                        KML.styleUrl('#picture'),
-                        KML.name(jpg),
-                        KML.description('{' + cdatakey + '}'),
-                        jpegmeta['point']
-                    )
-                )
-
-        doc.append(track_folder)
-        doc.append(image_folder)
+                colourID = '#colour' + str(self.colourIndex)
+                self.colourIndex = (self.colourIndex + 1) % self.colourSetLen
+                placemark = kml.track_placemark(
+                    trackname,
+                    'Path derived from ' + str(len(indices)) + 
+                    ' images in ' + key,
+                    colourID)
+                placemark.append(self.photos.gxtrack(indices))
+                trackfolder.append(placemark)
+                sc.add(points=len(indices))
+                
+                if self.verbosity > 0:
+                    print(trackname + ': ' + str(len(indices)) + ' images',
+                          file=sys.stderr)
         
     def makekml(self):
         """
@@ -817,78 +1089,360 @@ class jpggps2kml():
             print('--out is required for makekml', file=sys.stderr)
             sys.exit(-1)
         
-        self.items = ['EXIF:DateTimeOriginal',
-                      'EXIF:GPSStatus',
-                      'EXIF:GPSMeasureMode',
-                      'EXIF:GPSLongitude',
-                      'EXIF:GPSLongitudeRef',
-                      'EXIF:GPSLatitude',
-                      'EXIF:GPSLatitudeRef',
-                      'EXIF:GPSAltitude']
-
-        # Get the KML documant, or make a new one        
-        doc, trackfolder, imagefolder = self.makeKmlDoc()
+        self.items = normalize.GPS_ITEMS
+        shard = 'shard' in args and args['shard']
+        if shard and (('watch' in args and args['watch']) or
+                      ('update' in args and args['update'])):
+            print('ERROR: --shard cannot be combined with --watch or --update',
+                  file=sys.stderr)
+            sys.exit(-1)
+        if 'watch' in args and args['watch'] and \
+                'journal' in args and args['journal']:
+            print('ERROR: --journal cannot be combined with --watch',
+                  file=sys.stderr)
+            sys.exit(-1)
+        self.open_journal('makekml')
+        from . import pushdown
+        try:
+            self.selection = pushdown.from_args(args)
+        except ValueError as e:
+            print('ERROR: ' + str(e), file=sys.stderr)
+            sys.exit(-1)
+        if 'tz_boundaries' in args and args['tz_boundaries']:
+            from . import tzindex
+            try:
+                with self.profile.stage('timezones'):
+                    self.tzindex = tzindex.tzindex.load(
+                                       os.path.abspath(
+                                           os.path.expanduser(
+                                               os.path.expandvars(
+                                                   args['tz_boundaries']))),
+                                       self.verbosity)
+            except (OSError, ValueError) as e:
+                print('ERROR: cannot read --tz-boundaries: ' + str(e),
+                      file=sys.stderr)
+                sys.exit(-1)
+        self.read_gazetteer()
+        # A shard leaves the photo-derived tracks to mergekml
+        if 'phototracks' in args and args['phototracks'] and not shard:
+            self.photos = phototracks.photocolumns(self.tzindex is not None)
+        if 'index_out' in args and args['index_out']:
+            from . import index
+            self.index = index.metadataindex(
+                             os.path.abspath(
+                                 os.path.expanduser(
+                                     os.path.expandvars(args['index_out']))))
+            message = self.index.check()
+            if message:
+                print('ERROR: ' + message, file=sys.stderr)
+                sys.exit(-1)
+            with self.profile.stage('index'):
+                self.index.load()
+
+        kmlpath = os.path.abspath(
+                      os.path.expanduser(
+                          os.path.expandvars(args['out'])))
+        if 'watch' in args and args['watch']:
+            # Keep the output up to date until interrupted
+            from . import watch
+            watch.kmlwatcher(self, kmlpath, CHUNKSIZE).run()
+            return
+        
+        update = 'update' in args and args['update']
+        if update:
+            # Only the names of the existing placemarks are kept
+            from . import kmlupdate
+            if not os.path.isfile(kmlpath):
+                print('ERROR: --update requires an existing ' + kmlpath,
+                      file=sys.stderr)
+                sys.exit(-1)
+            with self.profile.stage('kml read', 
+                                    files=1, 
+                                    nbytes=os.path.getsize(kmlpath)) as sc:
+                try:
+                    existing = kmlupdate.scan(kmlpath)
+                except ValueError as e:
+                    print('ERROR: cannot update ' + str(e), file=sys.stderr)
+                    sys.exit(-1)
+                sc.add(points=sum(len(n) for n in existing.values()))
+        
+        # Make a new KML document skeleton
+        with self.profile.stage('kml build'):
+            doc, trackfolder, imagefolder = self.makeKmlDoc()
+        self.read_tracks(trackfolder)
+        
+        # Read the images and collect the records of the located ones
+        from . import pipeline
+        images = pipeline.kmlpipeline(self, int(args['jobs']))
+        images.collect()
+        if shard:
+            # Write the tracks and images as a fragment for mergekml
+            from . import shard
+            shard.write(kmlpath, trackfolder, images.records, self.profile)
+            images.records.close()
+            self.finish_journal()
+            self.report_profile()
+            return
+        if self.photos is not None:
+            self.appendTrackPlacemarks(trackfolder)
+        
+        if update:
+            # Stream the existing document into the new one, splicing in 
+            # the new tracks and images
+            self.update_kml(kmlpath, 
+                            doc, 
+                            trackfolder, 
+                            imagefolder, 
+                            existing,
+                            images.records)
+            images.records.close()
+        else:
+            # Serialize the skeleton with a placeholder in the image folder
+            # and write the image Placemarks into the gap
+            with self.profile.stage('serialize'):
+                imagefolder.append(kml.comment(kmlwriter.PLACEHOLDER))
+                head, tail = kmlwriter.split_skeleton(
+                    kml.tostring(doc).format_map(self.cdatatext))
+            
+            with output.atomicwriter(kmlpath) as OUT:
+                with self.profile.stage('write', nbytes=len(head)):
+                    OUT.write(head)
+                images.write(OUT)
+                with self.profile.stage('write', nbytes=len(tail)):
+                    print(tail, file=OUT)
+
+        self.finish_journal()
+        self.report_profile()
+
+    def update_kml(self, 
+                   kmlpath, 
+                   doc, 
+                   trackfolder, 
+                   imagefolder, 
+                   existing, 
+                   imagerecords):
+        """
+        Rewrite the KML file at kmlpath, copying each existing Placemark 
+        from a stream of the old file and adding the new tracks in 
+        trackfolder and the new imagerecords.  A new item whose name is 
+        already in the file is skipped, or replaces the old one if 
+        --replace was given.  New tracks follow the old ones, continuing 
+        the cycle of colours, and new images follow the old images.
+        
+        Arguments:
+        kmlpath: the existing KML file, replaced atomically
+        doc, trackfolder, imagefolder: the new skeleton from makeKmlDoc()
+            with the new tracks in trackfolder
+        existing: the folder -> names dictionary from kmlupdate.scan()
+        imagerecords: an extsort.recordsorter holding the new imagerecords
+        """
+        from . import kmlupdate
+
+        args = self.config['arguments']
+        replace = 'replace' in args and args['replace']
+        
+        with self.profile.stage('serialize'):
+            # The names of the old placemarks replaced by new ones
+            replaced = {'tracks': set(), 'images': set()}
+            
+            tracks = []
+            for pm in list(trackfolder.iterchildren(kml.KMLNS + 
+                                                    'Placemark')):
+                name = pm.findtext(kml.KMLNS + 'name')
+                if name in existing['tracks'] and not replace:
+                    if self.verbosity > 1:
+                        print('retain existing ' + name, file=sys.stderr)
+                else:
+                    if name in existing['tracks']:
+                        replaced['tracks'].add(name)
+                    # Serialize while pm is still in the document, so that
+                    # it keeps the namespace prefixes of the document
+                    tracks.append(kml.placemark_text(pm, kmlwriter.INDENT))
+                trackfolder.remove(pm)
                 
-        # Read tracks from GPX files into the KML file
-        for gpx, gpxbase in self.gpxfiles():
-            self.read_track_from_gpx(gpx,
-                                     gpxbase,
-                                     trackfolder,
-                                     self.colourIndex)
+            if replace:
+                for r in imagerecords.sorted():
+                    if r.name in existing['images']:
+                        replaced['images'].add(r.name)
+            
+            head, middle, tail = self.split_document(doc, 
+                                                     trackfolder, 
+                                                     imagefolder)
         
-        # Create Placemarks for each JPEG image in self.dirs
-        with exiftool.ExifTool() as et:
-            for d in self.dirs:
-                for f in os.listdir(d):
-                    jpegbase, jpegext = os.path.splitext(f)
-                    if jpegext in ('.jpg', '.JPG', '.jpeg', '.JPEG'):
-                        jpegpath = os.path.join(d, f)
-                        jpegrooted = os.path.join(os.path.basename(d), f)
-                        
-                        self.read_image_placemarks_from_jpeg(jpegpath,
-                                                             jpegrooted,
-                                                             jpegbase,
-                                                             imagefolder,
-                                                             et)
+        def new_images():
+            for r in imagerecords.sorted():
+                if r.name in existing['images'] and not replace:
+                    if self.verbosity > 1:
+                        print('retain existing ' + r.name, file=sys.stderr)
+                    continue
+                yield r
         
-        kmlstr = str(etree.tostring(doc, pretty_print=True),
-                     encoding='UTF-8').format_map(self.cdatatext)
-    
-        if 'out' in args and args['out']:
-            kmlpath = os.path.abspath(
-                          os.path.expanduser(
-                              os.path.expandvars(args['out'])))
-            if (not os.path.isfile(kmlpath) or 
-                'update' not in args or
-                not args['update']):
+        def write_tracks(OUT, nextcolour):
+            # Continue the colour cycle after the tracks already written
+            self.colourIndex = nextcolour
+            for text in tracks:
+                text = kmlwriter.recolour(text, self.colourIndex)
+                self.colourIndex = ((self.colourIndex + 1) % 
+                                    self.colourSetLen)
+                with self.profile.stage('write', nbytes=len(text)):
+                    OUT.write(text)
+            with self.profile.stage('write', nbytes=len(middle)):
+                OUT.write(middle)
+        
+        with output.atomicwriter(kmlpath) as OUT:
+            with self.profile.stage('write', nbytes=len(head)):
+                OUT.write(head)
+            
+            nextcolour = 0
+            infolder = 'tracks'
+            for folder, name, text in kmlupdate.placemarks(kmlpath):
+                if folder != infolder:
+                    write_tracks(OUT, nextcolour)
+                    infolder = folder
+                if name in replaced[folder]:
+                    if self.verbosity > 1:
+                        print('replace ' + name, file=sys.stderr)
+                    continue
+                with self.profile.stage('write', nbytes=len(text)):
+                    OUT.write(text)
+                if folder == 'tracks':
+                    # Follow the colour of the last track kept, whatever
+                    # colours the tracks replaced before it had
+                    colour = kmlwriter.colour(text)
+                    if colour is None:
+                        colour = nextcolour
+                    nextcolour = (colour + 1) % self.colourSetLen
+            if infolder == 'tracks':
+                write_tracks(OUT, nextcolour)
+            
+            self.stream_image_placemarks(new_images(), OUT)
+            with self.profile.stage('write', nbytes=len(tail)):
+                print(tail, file=OUT)
+
+    def mergekml(self):
+        """
+        Merge the fragments written by makekml --shard, given as the file 
+        arguments, into one KML file.  The tracks and then the images of 
+        all the fragments are merged in date order in one streaming pass, 
+        and the line styles of the tracks are assigned in output order.  
+        Photo-derived tracks are made here rather than in the shards.
+        """
+        self.read_config()
+        args = self.config['arguments']
+        if not ('out' in args and args['out']):
+            print('--out is required for mergekml', file=sys.stderr)
+            sys.exit(-1)
+
+        self.read_gazetteer()
+        
+        from . import shard
+        kmlpath = os.path.abspath(
+                      os.path.expanduser(
+                          os.path.expandvars(args['out'])))
+
+        with self.profile.stage('kml build'):
+            doc, trackfolder, imagefolder = self.makeKmlDoc()
+        
+        fragments = []
+        try:
+            for f in self.files:
+                fragments.append(shard.fragment(f))
+            
+            if 'phototracks' in args and args['phototracks']:
+                # The photo-derived tracks need every image before the
+                # tracks are written, so merge the images once to build 
+                # them, in date order so that the directories are numbered
+                # as they first appear
+                self.photos = phototracks.photocolumns(
+                                  'tz_boundaries' in args and
+                                  bool(args['tz_boundaries']))
+                prepass = [shard.fragment(f) for f in self.files]
+                try:
+                    images = shard.merged_images(prepass)
+                    while True:
+                        chunk = list(itertools.islice(images, CHUNKSIZE))
+                        if not chunk:
+                            break
+                        self.photos.add(chunk)
+                finally:
+                    for frag in prepass:
+                        frag.close()
+                self.appendTrackPlacemarks(trackfolder)
+            
+            with self.profile.stage('serialize'):
+                # Take the photo-derived tracks out of the skeleton, to be
+                # written after the merged tracks
+                phototracklist = []
+                for pm in list(trackfolder.iterchildren(kml.KMLNS + 
+                                                        'Placemark')):
+                    phototracklist.append(kml.placemark_text(pm, 
+                                                             kmlwriter.INDENT))
+                    trackfolder.remove(pm)
+                head, middle, tail = self.split_document(doc, 
+                                                         trackfolder, 
+                                                         imagefolder)
+            
+            with output.atomicwriter(kmlpath) as OUT:
+                with self.profile.stage('write', nbytes=len(head)):
+                    OUT.write(head)
                 
-                with open(kmlpath, 'w') as OUT:            
-                    print(kmlstr, file=OUT)
-            else:
-                print('ERROR: use --update to overwrite ' + kmlpath,
-                      file=sys.stderr)
-                sys.exit(-1)
+                # Assign the line styles in the order the tracks are written
+                self.colourIndex = 0
+                tracktext = itertools.chain(
+                    (t[2] for t in shard.merged_tracks(fragments)),
+                    phototracklist)
+                for text in tracktext:
+                    text = kmlwriter.recolour(text, self.colourIndex)
+                    self.colourIndex = ((self.colourIndex + 1) % 
+                                        self.colourSetLen)
+                    with self.profile.stage('write', nbytes=len(text)):
+                        OUT.write(text)
+                
+                with self.profile.stage('write', nbytes=len(middle)):
+                    OUT.write(middle)
+                self.stream_image_placemarks(shard.merged_images(fragments), 
+                                             OUT)
+                with self.profile.stage('write', nbytes=len(tail)):
+                    print(tail, file=OUT)
+        except ValueError as e:
+            # A file that is not a fragment, or a malformed line in one;
+            # the output is left untouched
+            print('ERROR: ' + str(e), file=sys.stderr)
+            sys.exit(-1)
+        finally:
+            for f in fragments:
+                f.close()
+
+        self.report_profile()
+
+    def read_tracks(self, trackfolder):
+        """
+        Read tracks from the GPX files into the trackfolder, either one 
+        track per GPX track or, with --merge, one merged track per day
+        """
+        args = self.config['arguments']
+        gpxlist = self.gpxfiles()
+        if 'merge' in args and args['merge']:
+            self.read_merged_tracks(gpxlist, trackfolder)
         else:
-            print(kmlstr)
+            for gpx, gpxbase in gpxlist:
+                self.read_track_from_gpx(gpx,
+                                         gpxbase,
+                                         trackfolder,
+                                         self.colourIndex)
+
+    def dirchunks(self, directory):
+        """
+        Return the JPEG files in directory as a list of chunks of at most
+        CHUNKSIZE (jpegdisk, jpegrooted, jpegbase) tuples.
+        """
+        return scanner.dirchunks(directory, CHUNKSIZE, self.profile)
 
 def jpegiter(jpggps):
     """
     Iterator over the JPEG files found in jpggps.files and in jpggps.dirs
     """
-    for f in jpggps.files:
-        fb, fe = os.path.splitext(f)
-        fe = fe.lower()
-        fb = os.path.basename(fb)
-        if fe in ('.jpg', '.jpeg'):
-            yield (f, fb)
-        
-    for d in jpggps.dirs:
-        for f in os.listdir(d):
-            fp = os.path.join(d, f)
-            fb, fe = os.path.splitext(f)
-            fe = fe.lower()
-            if fe in ('.jpg', '.jpeg'):
-                yield (fp, fb)
+    return scanner.jpegfiles(jpggps.files, jpggps.dirs, jpggps.profile)
                 
 def offset_to_string(offset):
     """
@@ -933,20 +1487,27 @@ def findoffset():
         sys.exit(-1)
 
     tags = {}
-    iso8601 = ('(\d{4})[-:](\d{2})[-:](\d{2})[ Tt]'
-               '(\d{2}):(\d{2}):(\d{2})')
     offset_distribution = {}
-    
-    for (f, fb) in jpegiter(jpggps):
-        if jpggps.verbosity > 1:
-            print('fileabs = ' + f, file=sys.stderr)
 
-        with exiftool.ExifTool() as et:
-            items = ['EXIF:DateTimeOriginal',
-                     'EXIF:GPSStatus',
-                     'EXIF:GPSDateStamp',
-                     'EXIF:GPSTimeStamp']
-            tags = et.get_tags(items, f)
+    # --utc is parsed once, not once per file
+    argutc = None
+    if 'utc' in args and args['utc']:
+        argutc = timestamps.parse_datetime(args['utc'])
+        if argutc is None:
+            print('could not parse --utc=' + args['utc'], file=sys.stderr)
+            sys.exit(-1)
+    
+    with metadata.session(jpggps.verbosity) as et:
+        items = metadata.OFFSET_ITEMS
+
+        # With --utc only the first file is needed
+        for f, fb, tags in metadata.iter_tags(et, 
+                                              items, 
+                                              jpegiter(jpggps),
+                                              jpggps.profile,
+                                              1 if argutc else CHUNKSIZE):
+            if jpggps.verbosity > 1:
+                print('fileabs = ' + f, file=sys.stderr)
 
             if not tags:
                 print('could not read EXIF metadata from ' + f,
@@ -954,64 +1515,47 @@ def findoffset():
                 sys.exit(-1)
             
             thisutc = None
-            mutc = None
-            if 'utc' in args and args['utc']:
+            if argutc:
                 # --utc is available, so get the UTC from there
                 if jpggps.verbosity > 1:
                     print('UTC from --utc = ' + args['utc'], file=sys.stderr)
-                mutc = re.match(iso8601, args['utc'])
+                thisutc = argutc
             elif 'EXIF:GPSStatus' in tags and tags['EXIF:GPSStatus'] == 'A':
                 # Try to extract UTC from GPSTimeStamp
                 if jpggps.verbosity > 1:
                     print('GPSStatus = ' + 
                           tags['EXIF:GPSStatus'], file=sys.stderr)
                     print('UTC from GPSTimeStamp = ' + 
-                          tags['EXIF:GPSTimeStamp'], file=sys.stderr)
-                mutc = re.match(iso8601, tags['EXIF:GPSDateStamp'] + ' ' +
-                                         tags['EXIF:GPSTimeStamp'])
+                          str(tags.get('EXIF:GPSTimeStamp')), 
+                          file=sys.stderr)
+                thisutc = timestamps.gps_datetime(tags)
             else:
                 # UTC not available
                 if jpggps.verbosity > 1:
                     print('tags = ' + repr(tags), file=sys.stderr)
-                mutc = None
             
             if jpggps.verbosity > 1:
-                print('mutc = ' + repr(mutc), file=sys.stderr)
-            if mutc:
-                gutc = mutc.groups()
-                if jpggps.verbosity > 1:
-                    print('--utc', file=sys.stderr)
-                    for k in gutc:
-                        print(k, file=sys.stderr)
-                thisutc = datetime.datetime(int(gutc[0]),
-                                            int(gutc[1]),
-                                            int(gutc[2]),
-                                            int(gutc[3]),
-                                            int(gutc[4]),
-                                            int(gutc[5]))
-            else:
+                print('thisutc = ' + repr(thisutc), file=sys.stderr)
+            if not thisutc:
                 # Skip processing for this file
                 if jpggps.verbosity > 1:
                     print('no UTC available for ' + fb, file=sys.stderr)
                 continue
             
-            mlocal = re.match(iso8601, tags['EXIF:DateTimeOriginal'])
-            if mlocal:
-                local = mlocal.groups()
-                if jpggps.verbosity > 1:
-                    print('EXIF:DateTimeOriginal', file=sys.stderr)
-                    for k in local:
-                        print(k, file=sys.stderr)
-                localtime = datetime.datetime(int(local[0]),
-                                             int(local[1]),
-                                             int(local[2]),
-                                             int(local[3]),
-                                             int(local[4]),
-                                             int(local[5]))
-            if thisutc and localtime:
-                offset = localtime - thisutc
+            # The offset is between the camera clock and UTC, so compare 
+            # wall clock times and ignore any recorded OffsetTimeOriginal
+            with jpggps.profile.stage('parse/normalize', files=1, points=1):
+                localtime = timestamps.exif_datetime(tags)
+            if jpggps.verbosity > 1:
+                print('EXIF:DateTimeOriginal = ' + repr(localtime), 
+                      file=sys.stderr)
+            if localtime:
+                if thisutc.tzinfo is not None:
+                    thisutc = thisutc.astimezone(
+                                  timestamps.UTC).replace(tzinfo=None)
+                offset = localtime.replace(tzinfo=None) - thisutc
                 
-                offset_secs = 86400*offset.days + offset.seconds
+                offset_secs = int(round(offset.total_seconds()))
                 
                 if offset_secs <= -86400 or offset_secs > 86400:
                     print('WARNING: abs(offset) = > 1 day')
@@ -1021,7 +1565,7 @@ def findoffset():
                     else:
                         offset_distribution[offset_secs] = 1
                             
-            if 'utc' in args and args['utc']:
+            if argutc:
                 # if --utc was supplied, process only one file
                 break
 
@@ -1045,6 +1589,8 @@ def findoffset():
         print('most negative = ' + offset_to_string(most_negative))
         print('mode = ' + offset_to_string(mode))
 
+    jpggps.report_profile()
+
 def makegpx():
     """
     Call exiftool to construct GPX files from the EXIF:GPS metadata from JPEG
@@ -1055,6 +1601,8 @@ def makegpx():
     the exiftool source directory in fmt_files/gpx.fmt.  Specify --update 
     if the operation is  intended to overwrite existing files. 
     """
+    import subprocess
+
     jpggps = jpggps2kml()
     jpggps.read_config()
     args = jpggps.config['arguments']
@@ -1095,21 +1643,82 @@ def makegpx():
             print('WARNING: Set --update to replace existing file: ' + 
                   gpxpath, file=sys.stderr)
 
-        exiftool_cmd = ("exiftool -r -if '$gpsdatetime' " +
-                        '-fileOrder gpsdatetime -p ' + 
-                        fmtabs + 
-                        ' -d %Y-%m-%dT%H:%M:%SZ ' + d +
-                        ' > ' + gpxpath)
+        exiftool_cmd = ['exiftool', '-r', '-if', '$gpsdatetime',
+                        '-fileOrder', 'gpsdatetime', 
+                        '-p', fmtabs, 
+                        '-d', '%Y-%m-%dT%H:%M:%SZ', 
+                        d]
         if jpggps.verbosity > 0:
-            print('exiftool_cmd: ' + exiftool_cmd, 
+            print('exiftool_cmd: ' + ' '.join(exiftool_cmd), 
                   file=sys.stderr)
-        subprocess.call(exiftool_cmd, shell=True)
-#        if gpx:
-#            with open(gpxpath, 'w') as GPX:
-#                GPX.write(gpx)
-#        else:
-#            print('WARNING: no output from exiftool_cmd: ' + exiftool_cmd,
-#                  file=sys.stderr)
+        # Stream the output of exiftool into a temporary file that replaces
+        # gpxpath only if exiftool produced something
+        with jpggps.profile.stage('exif read') as sc:
+            with output.atomicwriter(gpxpath) as GPX:
+                proc = subprocess.Popen(exiftool_cmd, stdout=subprocess.PIPE)
+                for data in iter(lambda: proc.stdout.read(output.CHUNKSIZE),
+                                 b''):
+                    GPX.writebytes(data)
+                proc.stdout.close()
+                proc.wait()
+                if not GPX.nbytes:
+                    print('WARNING: no output from exiftool_cmd: ' + 
+                          ' '.join(exiftool_cmd), file=sys.stderr)
+                    GPX.discard()
+                else:
+                    sc.add(files=1, nbytes=GPX.nbytes)
+
+    jpggps.report_profile()
+
+def mergegpx():
+    """
+    Merge the GPX files in --gpx (or in the dir argument) recorded by 
+    several overlapping loggers into one consolidated GPX file per UTC day, 
+    written as YYYY-MM-DD.gpx into the directory given by the mandatory 
+    --out argument.  In each --window seconds (default 60) only the points
+    from the logger with the best fix quality, HDOP and point density are 
+    kept, and repeated timestamps are dropped.  Existing files are skipped 
+    unless --replace is given.
+    """
+    from . import gpxmerge
+
+    jpggps = jpggps2kml()
+    jpggps.read_config()
+    args = jpggps.config['arguments']
+    if 'out' not in args or not args['out']:
+        print('Required argument --out is not defined. This is the directory '
+              'that will contain the merged gpx files.', file=sys.stderr)
+        sys.exit(-1)
+    outdir = args['out']
+    if not os.path.isdir(outdir):
+        os.makedirs(outdir)
+    
+    window = gpxmerge.WINDOW
+    if 'window' in args and args['window']:
+        window = float(args['window'])
+    
+    paths = [g for g, gbase in jpggps.gpxfiles()]
+    dayiter = gpxmerge.days(gpxmerge.merged(paths, window))
+    while True:
+        with jpggps.profile.stage('gpx merge') as sc:
+            day, points = next(dayiter, (None, None))
+            if day is None:
+                break
+            sc.add(points=len(points))
+        
+        gpxpath = os.path.join(outdir, day + '.gpx')
+        if os.path.exists(gpxpath) and not args.get('replace', False):
+            print('WARNING: Set --replace to replace existing file: ' + 
+                  gpxpath, file=sys.stderr)
+            continue
+        if jpggps.verbosity > 0:
+            print('write ' + str(len(points)) + ' points to ' + gpxpath,
+                  file=sys.stderr)
+        with jpggps.profile.stage('write', files=1, points=len(points)):
+            with output.atomicwriter(gpxpath) as GPX:
+                gpxmerge.write_gpx(GPX, day, points, paths)
+
+    jpggps.report_profile()
 
 def editgps():
     """
@@ -1122,63 +1731,49 @@ def editgps():
     
     # Read all the GPX files in --gpx, ordering them by their earliest and 
     # latest GPSDateStamp times.
+    # editgps is still a stub that reads the tags but never writes the GPS
+    # metadata, so it keeps the original sorteditems list of GPX intervals;
+    # when the writing is implemented it should take its positions from the
+    # time-ordered points of gpxmerge.merged() instead.
     sortedgpx = sorteditems()
     
-    for gpx, gpxbase in jpggps.gpxfiles():
-        gpxtree = etree.parse(gpx).getroot()
-        namespace = gpxtree.attrib('xmlns')
-        if jpggps.verbosity > 1:
-            print(gpx + ': ' + namespace, file=sys.stderr)
-        
-        for gpxtrack in gpxtree.getiterator(namespace + ':trk'):
-            begin = end = ''
-            for trkseg in gpxtrack.getiterator(namespace + ':trkseg'):
-                for trkpt in trkseg.getiterator(namespace + ':trkpt'):
-                    thistime = trkpt.find('time')
-                    
-                    if not begin or begin > thistime:
-                        begin = thistime
-                    if not end or end < thistime:
-                        end = thistime
-        
+    for gpxpath, gpxbase in jpggps.gpxfiles():
+        begin, end, count = jpggps.read_gpx(gpxpath).time_range()
         if begin and end:
-            sortedgpx.add(begin, end, gpx)
+            sortedgpx.add(begin, end, gpxpath)
             
     # find all the JPEG files in dir, calling exiftool to update the EXIF:GPS
     # metadata as required.
-    with exiftool.ExifTool() as et:
-        items = ['EXIF:DateTimeOriginal',
-                 'EXIF:GPSStatus',
-                 'EXIF:GPSMeasureMode']
+    with metadata.session(jpggps.verbosity) as et:
+        items = metadata.EDIT_ITEMS
         
-        for d in jpggps.dir:
-            for f in os.listdir(d):
-                fbase, fext = os.path.splitext(f)
-                if fext in ('.jpg', '.JPG', '.jpeg', '.JPEG'):
-                    fabs = os.path.join(d, f)
-                    tags = et.get_tags(items, fabs)
-                    if jpggps.verbosity > 1:
-                        for k in tags:
-                            print(k, ' = ', tags[k], file=sys.stderr)
+        for d in jpggps.dirs:
+            for fabs, fbase, tags in metadata.iter_tags(
+                                         et,
+                                         items,
+                                         [(os.path.join(d, f), fbase) for 
+                                          f, fbase in jpggps.listjpeg(d)],
+                                         jpggps.profile):
+                if jpggps.verbosity > 1:
+                    for k in tags:
+                        print(k, ' = ', tags[k], file=sys.stderr)
     
-                    # GPS metadata id available
-                    datestr = timestr = ''
-
-                    if "EXIF:DateTimeOriginal" in tags:
-                        m = re.match(r'\s*(\d+:\d+:\d+)\s+'
-                                     r'(\d+:\d+:[\d.]+)\s*',
-                                     tags['EXIF:DateTimeOriginal'])
-                        datestr = re.sub(r':', '-', m.group(1))
-                        timestr = m.group(2)
-                        print(datestr, timestr)
+                # GPS metadata id available
+                datestr = timestr = ''
+
+                dt = timestamps.exif_datetime(tags)
+                if dt:
+                    datestr = dt.strftime('%Y-%m-%d')
+                    timestr = dt.strftime('%H:%M:%S')
                 
-                    # EXIF:GPS metadata should be updated from GPX if
-                    # --force was specified, or
-                    # EXIF:GPSStatus is not in tags, or
-                    # EXIF:GPSStatus is in tags with the value 0, or
-                    # EXIFMeasureMode is in tags with a value < 2                      
-            
+                # EXIF:GPS metadata should be updated from GPX if
+                # --force was specified, or
+                # EXIF:GPSStatus is not in tags, or
+                # EXIF:GPSStatus is in tags with the value 0, or
+                # EXIFMeasureMode is in tags with a value < 2                      
     
+    jpggps.report_profile()
+
 
 def orientjpeg():
     """
@@ -1188,55 +1783,88 @@ def orientjpeg():
     Independent JPEG Group at http://jpegclub.org/exif_orientation.html.
     This version should work for any OS and shell, provided exiftools and
     jpegtran are installed.
+    With --journal each file is recorded once it has been oriented, and
+    --resume skips the files and directories already recorded.
     """
+    from . import orient
+
     jpggps = jpggps2kml()
     jpggps.read_config()
-    transform = [[],
-                 ['-flip horizontal'],
-                 ['-rotate', '180'],
-                 ['-flip', 'vertical'],
-                 ['-transpose'],
-                 ['-rotate', '90'],
-                 ['-transverse'],
-                 ['-rotate', '270']
-                ]
-    items = ['EXIF:Orientation']
-    with exiftool.ExifTool() as et:
-        for d in jpggps.dirs:
-            if jpggps.verbosity > 0:
-                print('Orient JPEG files in ' + d, file=sys.stderr)
-            for f in os.listdir(d):
-                newf = 'new' + f
-                filebase, fileext = os.path.splitext(f)
-                if fileext in ('.jpg', '.JPG', '.jpeg', '.JPEG'):
+    jpggps.open_journal('orientjpeg')
+    journal = jpggps.journal
+    donedirs = set()
+    donefiles = set()
+    if journal is not None:
+        with jpggps.profile.stage('journal') as sc:
+            for entry in journal.replay():
+                if 'dir' in entry:
+                    donedirs.add(entry['dir'])
+                else:
+                    donefiles.add(entry['file'])
+            sc.add(files=len(donefiles))
+            journal.open()
+        if jpggps.verbosity > 0 and (donedirs or donefiles):
+            print('resumed ' + str(len(donefiles)) + ' files from ' + 
+                  journal.path, file=sys.stderr)
+
+    # The journal is kept if the run is interrupted
+    try:
+        # exiftool is started only if a file has no Orientation in its header
+        with metadata.lazysession(jpggps.verbosity) as session:
+            for d in jpggps.dirs:
+                if d in donedirs:
+                    continue
+                if jpggps.verbosity > 0:
+                    print('Orient JPEG files in ' + d, file=sys.stderr)
+                for f, filebase in jpggps.listjpeg(d):
                     filepath = os.path.join(d, f)
-                    newfilepath = os.path.join(d, newf)
-                    tags = et.get_tags(items, filepath)
+                    if filepath in donefiles:
+                        continue
+                    # Scan only the JPEG header for the Orientation, asking 
+                    # exiftool only if it is not in the EXIF IFD0
+                    with jpggps.profile.stage('exif read', files=1):
+                        orientation = orient.orientation(filepath,
+                                                         session,
+                                                         jpggps.verbosity)
                     if jpggps.verbosity > 1:
-                        for k in tags:
-                            print(k, ' = ', tags[k], file=sys.stderr)
-                    orient = int(tags['EXIF:Orientation'])
-                    if orient:
-                        jpegtran_cmd = (['jpegtran', '-copy', 'all'] +
-                                        transform[orient - 1] +
-                                        ['-outfile', newfilepath, filepath])
-                        if jpggps.verbosity > 1:
-                            print('jpegtran_cmd: ' + ' '.join(jpegtran_cmd), 
-                                  file=sys.stderr)
+                        print('Orientation = ' + str(orientation), 
+                              file=sys.stderr)
+                    if 1 < orientation <= len(orient.TRANSFORMS):
                         try:                    
-                            output = subprocess.call(jpegtran_cmd)
-                            if not output:
-                                os.remove(filepath)
-                                os.rename(newfilepath, filepath)
-                                
+                            with jpggps.profile.stage(
+                                     'transform', 
+                                     files=1,
+                                     nbytes=os.path.getsize(filepath)):
+                                orient.reorient(filepath, 
+                                                orientation, 
+                                                jpggps.verbosity,
+                                                session)
                         except OSError:
-                            print(output, file=sys.stderr)
                             print('Is jpegtran installed?', file=sys.stderr)
                             raise
+                    if journal is not None:
+                        journal.append({'file': filepath, 
+                                        'orientation': orientation}, 
+                                       1)
+                if journal is not None:
+                    journal.append({'dir': d})
+    finally:
+        if journal is not None:
+            journal.close()
+
+    jpggps.finish_journal()
+    jpggps.report_profile()
 
 def makekml():
     """
     entry point for the method makekml
     """
     jpggps = jpggps2kml()
-    jpggps.makekml()
\ No newline at end of file
+    jpggps.makekml()
+
+def mergekml():
+    """
+    entry point for the method mergekml
+    """
+    jpggps = jpggps2kml()
+    jpggps.mergekml()
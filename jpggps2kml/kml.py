@@ -0,0 +1,232 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 21:19:50 2026
+Copyright (C) 2016 Russell O. Redman
+
+Building the KML document skeleton and its track placemarks.
+
+The pykml factories and lxml are imported by the functions that use them,
+not when this module is imported, so commands that never build KML start
+without them.
+
+@author: russell
+@email: russell@roredman.ca
+"""
+
+KMLNS = '{http://www.opengis.net/kml/2.2}'
+GXNS = '{http://www.google.com/kml/ext/2.2}'
+
+# Line styles for the tracks, assigned in a cycle:
+# [normal colour, normal width, highlight colour, highlight width]
+COLOURSET = [['7fff0000', 6, 'ffff0000', 8],
+             ['7f00ff00', 6, 'ff00ff00', 8],
+             ['7f0000ff', 6, 'ff0000ff', 8],
+             ['7fffff00', 6, 'ffffff00', 8],
+             ['7fff00ff', 6, 'ffff00ff', 8],
+             ['7f00ffff', 6, 'ff00ffff', 8]]
+
+def factories():
+    """
+    Return the pykml (KML, GX) element factories
+    """
+    from pykml.factory import KML_ElementMaker, GX_ElementMaker
+    return KML_ElementMaker, GX_ElementMaker
+
+def colour_style(doc,
+                 colourID,
+                 colour_normal,
+                 width_normal,
+                 colour_highlight,
+                 width_highlight):
+    """
+    Append line style elements to a KML document.
+    Arguments:
+    doc: KML document to hold the new styles
+    colourID: the base ID for the styles
+    colour_normal: normal colour for the line
+    width_normal: normal width for the line
+    colour_highlight: highlighted colour for the line
+    width_highlight: highlighted width for the line
+    """
+    KML, GX = factories()
+    doc.append(
+        KML.Style(
+            KML.IconStyle(
+                KML.Icon(),
+                id="no_icon_n"
+            ),
+            KML.LineStyle(
+                KML.color(colour_normal),
+                KML.width(width_normal)
+            ),
+            id=(colourID + '_n')
+        )
+    )
+    doc.append(
+        KML.Style(
+            KML.IconStyle(
+                KML.Icon(),
+                id="no_icon_h"
+            ),
+            KML.LineStyle(
+                KML.color(colour_highlight),
+                KML.width(width_highlight)
+            ),
+            id=(colourID + '_h')
+        )
+    )
+    doc.append(
+        KML.StyleMap(
+            KML.Pair(
+                KML.key('normal'),
+                KML.styleUrl('#' + colourID + '_n')
+            ),
+            KML.Pair(
+                KML.key('highlight'),
+                KML.styleUrl('#' + colourID + '_h')
+            ),
+            id=colourID
+        )
+    )
+
+def document():
+    """
+    Create a new KML document holding the picture and track styles and
+    empty tracks and images folders, returning
+    (doc, trackfolder, imagefolder)
+    """
+    KML, GX = factories()
+    doc = KML.Document(
+              KML.description('Tracks and image placemarks'),
+              KML.visibility('1'),
+              KML.open('1'),
+              KML.name("Tracks and Images")
+          )
+
+    # Append a style for pictures using the camera icon
+    doc.append(
+        KML.Style(
+            KML.IconStyle(
+                KML.scale(1.0),
+                KML.Icon(
+                    KML.href(
+                        'http://maps.google.com/mapfiles/kml/'\
+                        'shapes/camera.png'),
+                ),
+                id="picture_style"
+            ),
+            id='picture'
+        )
+    )
+
+    # Append styles for lines in different colours
+    for colourIndex in range(len(COLOURSET)):
+        normal, narrow, highlight, wide = COLOURSET[colourIndex]
+        colour_style(doc,
+                     'colour' + str(colourIndex),
+                     normal,
+                     narrow,
+                     highlight,
+                     wide)
+
+    trackfolder = KML.Folder(
+                      KML.Name('tracks')
+                      )
+    doc.append(trackfolder)
+
+    imagefolder = KML.Folder(
+                      KML.Name('images')
+                      )
+    doc.append(imagefolder)
+
+    return (doc, trackfolder, imagefolder)
+
+def placemarks(folder):
+    """
+    Return a dictionary name -> Placemark of the Placemarks in folder
+    """
+    result = {}
+    for pm in folder.iterchildren(KMLNS + 'Placemark'):
+        result[pm.findtext(KMLNS + 'name')] = pm
+    return result
+
+def track_placemark(trackname, description, styleurl):
+    """
+    Return a new, visible Placemark for a track, without geometry
+    """
+    KML, GX = factories()
+    return KML.Placemark(
+        KML.visibility('1'),
+        KML.name(trackname),
+        KML.description(description),
+        KML.styleUrl(styleurl)
+        )
+
+def gxtrack(whens, coords):
+    """
+    Return a gx:Track clamped to the ground holding the when texts followed
+    by the coord texts
+    """
+    KML, GX = factories()
+    kmltrack = GX.Track(
+        KML.altitudeMode('clampToGround')
+        )
+    for w in whens:
+        kmltrack.append(GX.when(w))
+    for c in coords:
+        kmltrack.append(GX.coord(c))
+    return kmltrack
+
+def multitrack(tracks):
+    """
+    Return a gx:MultiTrack holding the gx:Tracks in tracks
+    """
+    KML, GX = factories()
+    result = GX.MultiTrack()
+    for t in tracks:
+        result.append(t)
+    return result
+
+def comment(text):
+    """
+    Return an XML comment element
+    """
+    from lxml import etree
+    return etree.Comment(text)
+
+def _strip_namespaces(text):
+    """
+    Remove the namespace declarations lxml adds to the opening tag when an
+    element is serialized on its own
+    """
+    import re
+    head, sep, rest = text.partition('>')
+    return re.sub(r' xmlns(:\w+)?="[^"]*"', '', head) + sep + rest
+
+def placemark_text(pm, indent):
+    """
+    Serialize the Placemark pm as pretty printed text with every line
+    prefixed by indent, as it appears inside a folder of the document,
+    without the namespace declarations lxml adds to a detached element
+    """
+    from lxml import etree
+    text = _strip_namespaces(str(etree.tostring(pm, pretty_print=True),
+                                 encoding='UTF-8'))
+    return ''.join(indent + line + '\n' for line in text.splitlines())
+
+def element_text(element, indent):
+    """
+    Serialize an element parsed from an existing document, which keeps the
+    whitespace it was written with, prefixing only its first line by indent
+    """
+    from lxml import etree
+    return indent + _strip_namespaces(
+                        str(etree.tostring(element, with_tail=False),
+                            encoding='UTF-8')) + '\n'
+
+def tostring(doc):
+    """
+    Serialize doc as pretty printed text
+    """
+    from lxml import etree
+    return str(etree.tostring(doc, pretty_print=True), encoding='UTF-8')
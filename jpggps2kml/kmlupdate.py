@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 09:02:51 2026
+Copyright (C) 2016 Russell O. Redman
+
+Streaming access to an existing KML file for makekml --update.
+
+The existing document is never held in memory.  It is read twice with
+lxml.etree.iterparse, clearing each Placemark once it has been handled:
+scan() collects only the names of the Placemarks in the tracks and images
+folders, which is all that is needed to decide which new items to add or
+replace, and placemarks() then yields the serialized text of each old
+Placemark so that it can be copied into the new document around the
+additions.  Memory is proportional to the number of names and to the new
+items, not to the size of the existing file.
+
+@author: russell
+@email: russell@roredman.ca
+"""
+
+from . import kml
+from . import kmlwriter
+from . import output
+
+# The folders of a document written by makekml, in document order
+FOLDERS = ('tracks', 'images')
+
+def _local(tag):
+    """
+    Return the tag without its namespace
+    """
+    return tag.rpartition('}')[2]
+
+def _events(path):
+    """
+    Iterate over (folder, Placemark) for each Placemark in the KML file at
+    path, where folder is the name of the enclosing Folder (None if it has
+    none), clearing each Placemark and its predecessors once the caller
+    has seen it.  CDATA sections are preserved for serialization.
+    """
+    from lxml import etree
+    folders = []
+    with output.openread(path) as f:
+        for event, element in etree.iterparse(f,
+                                              events=('start', 'end'),
+                                              strip_cdata=False,
+                                              huge_tree=True):
+            tag = _local(element.tag)
+            if event == 'start':
+                if tag == 'Folder':
+                    folders.append(None)
+                continue
+            if tag == 'Folder':
+                folders.pop()
+            elif tag in ('Name', 'name') and folders and \
+                    _local(element.getparent().tag) == 'Folder':
+                folders[-1] = (element.text or '').strip()
+            elif tag == 'Placemark':
+                yield (folders[-1] if folders else None), element
+                element.clear()
+                parent = element.getparent()
+                while element.getprevious() is not None:
+                    del parent[0]
+
+def scan(path):
+    """
+    Return a dictionary folder -> set of Placemark names for the tracks
+    and images folders of the KML file at path.  Raise ValueError if a
+    Placemark lies outside those folders or the images come before the
+    tracks, which makekml never writes, or if the file is not well formed.
+    """
+    from lxml import etree
+    names = {folder: set() for folder in FOLDERS}
+    last = 0
+    try:
+        for folder, pm in _events(path):
+            if folder not in names:
+                raise ValueError(path + ' has a Placemark outside the '
+                                 'tracks and images folders')
+            order = FOLDERS.index(folder)
+            if order < last:
+                raise ValueError(path + ' has tracks after its images')
+            last = order
+            names[folder].add(pm.findtext('{*}name'))
+    except etree.XMLSyntaxError as e:
+        raise ValueError(path + ': ' + str(e))
+    return names
+
+def placemarks(path):
+    """
+    Iterate over (folder, name, text) for each Placemark of the KML file
+    at path in document order, where text is serialized as it appears
+    inside a folder of the document
+    """
+    for folder, pm in _events(path):
+        yield (folder,
+               pm.findtext('{*}name'),
+               kml.element_text(pm, kmlwriter.INDENT))
@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 11:05:48 2026
+Copyright (C) 2016 Russell O. Redman
+
+Fast serialization of image placemarks.
+
+Every image placemark has the same fixed shape
+    Placemark/visibility/styleUrl/name/description/Point/coordinates
+so rather than building each one from nested pykml factory calls, the text
+is generated from a precompiled template and written straight into the
+output stream.  The pykml element tree is still used for the document
+skeleton, the tracks and for merging into an existing file in --update mode.
+
+@author: russell
+@email: russell@roredman.ca
+"""
+
+import re
+
+# Marker left in the image folder of the skeleton document, replaced by the
+# streamed placemarks when the document is written
+PLACEHOLDER = 'imageplacemarks'
+PLACEHOLDER_COMMENT = '<!--' + PLACEHOLDER + '-->'
+
+# The same for the track placemarks, used when mergekml streams the tracks
+# of several fragments
+TRACK_PLACEHOLDER = 'trackplacemarks'
+TRACK_PLACEHOLDER_COMMENT = '<!--' + TRACK_PLACEHOLDER + '-->'
+
+# Indentation of a Placemark inside a folder of the document
+INDENT = '    '
+
+STYLEURL = re.compile(r'<styleUrl>#colour(\d+)</styleUrl>')
+
+# Coordinates are written in fixed point, never in scientific notation such
+# as 1e-05; 7 decimals of a degree is about a centimetre
+PLACEMARK_TEMPLATE = ('    <Placemark>\n'
+                      '      <visibility>1</visibility>\n'
+                      '      <styleUrl>{0}</styleUrl>\n'
+                      '      <name>{1}</name>\n'
+                      '      <description>{2}</description>\n'
+                      '      <Point>\n'
+                      '        <coordinates>{3:.7f},{4:.7f},{5:.3f}'
+                      '</coordinates>\n'
+                      '      </Point>\n'
+                      '    </Placemark>\n').format
+
+def escape(text):
+    """
+    Escape &, < and > in text, as xml.sax.saxutils.escape() does without
+    the cost of importing the xml.sax package
+    """
+    return text.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+
+def cdata(text):
+    """
+    Wrap text in a CDATA section, splitting any embedded "]]>" so that the
+    section cannot be terminated early.
+    """
+    return '<![CDATA[' + text.replace(']]>', ']]]]><![CDATA[>') + ']]>'
+
+def placemark(name, description, lon, lat, alt, style='#picture'):
+    """
+    Return the serialized text of one image placemark.
+
+    Arguments:
+    name: the placemark label, escaped for XML
+    description: HTML shown in the popup, wrapped in CDATA
+    lon, lat, alt: the position in decimal degrees and metres
+    style: the styleUrl of the placemark icon
+    """
+    return PLACEMARK_TEMPLATE(escape(style),
+                              escape(name),
+                              cdata(description),
+                              float(lon),
+                              float(lat),
+                              float(alt))
+
+def split_skeleton(kmltext, placeholder=PLACEHOLDER_COMMENT):
+    """
+    Split the serialized skeleton document at the placemark placeholder,
+    returning the (head, tail) text to be written around the placemarks.
+    """
+    head, sep, tail = kmltext.partition(placeholder)
+    if not sep:
+        raise ValueError('placeholder ' + placeholder + ' not found')
+    # Drop the indentation lxml put in front of the placeholder
+    return head.rstrip(' '), tail.lstrip('\n')
+
+def colour(text):
+    """
+    Return the line style colourIndex of the serialized placemark text of
+    a track, or None if it has none
+    """
+    match = STYLEURL.search(text)
+    return int(match.group(1)) if match else None
+
+def recolour(text, colourIndex):
+    """
+    Return the serialized placemark text of a track using the line style 
+    colourIndex
+    """
+    return STYLEURL.sub('<styleUrl>#colour' + str(colourIndex) + '</styleUrl>',
+                        text,
+                        count=1)
@@ -0,0 +1,332 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 21:04:41 2026
+Copyright (C) 2016 Russell O. Redman
+
+Reading the EXIF metadata of JPEG files through exiftool.
+
+Each session is one "exiftool -stay_open" process run in numeric mode
+(-n), so that values come back as numbers rather than as text to be
+reinterpreted, and every read adds -fast2, which stops exiftool at the end
+of the metadata instead of scanning the rest of the file.  The requests are
+numbered, so the end of each response is recognized without a wrapper
+library, and a request that takes longer than its timeout or that kills
+exiftool is abandoned: the process is restarted and the files of the batch
+are read one at a time, so that one corrupt file costs only its own tags.
+To bound the memory of the Perl process, a session is also restarted after
+RECYCLE_FILES files or RECYCLE_SECONDS seconds.
+
+lazysession starts the exiftool process only when a command actually needs
+it, so a command that can answer from the JPEG header alone never pays for
+it.
+
+@author: russell
+@email: russell@roredman.ca
+"""
+
+import itertools
+import json
+import os
+import queue
+import subprocess
+import sys
+import threading
+import time
+
+from . import normalize
+from . import profiling
+from . import scanner
+
+# The exiftool command line, ahead of the -stay_open arguments
+EXIFTOOL = ['exiftool']
+
+# Arguments applied to every request: group names, numeric values and
+# UTF-8 file names
+COMMON_ARGS = ['-G', '-n', '-charset', 'filename=utf8']
+
+# Arguments added to every read
+READ_ARGS = ['-j', '-fast2']
+
+# A session is restarted after reading this many files or running this
+# many seconds
+RECYCLE_FILES = 20000
+RECYCLE_SECONDS = 1800.0
+
+# Seconds allowed for a request, plus TIMEOUT_PER_FILE for each file
+TIMEOUT = 10.0
+TIMEOUT_PER_FILE = 1.0
+
+# Tags read by findoffset
+OFFSET_ITEMS = ['EXIF:DateTimeOriginal',
+                'EXIF:SubSecTimeOriginal',
+                'EXIF:GPSStatus',
+                'EXIF:GPSDateStamp',
+                'EXIF:GPSTimeStamp']
+
+# Tags read by editgps
+EDIT_ITEMS = ['EXIF:DateTimeOriginal',
+              'EXIF:GPSStatus',
+              'EXIF:GPSMeasureMode']
+
+def session(verbosity=1):
+    """
+    Return a new, unstarted exiftool -stay_open session, which reports the
+    files it cannot read if verbosity is 1 or more
+    """
+    return exifsession(verbosity=verbosity)
+
+class exifsession():
+    """
+    An exiftool -stay_open process answering numbered requests, restarted
+    when a request fails and recycled after a number of files or seconds.
+    It provides the start(), terminate(), get_tags_batch(), get_tags() and
+    execute() methods that jpggps2kml uses.
+    """
+    def __init__(self,
+                 recycle_files=RECYCLE_FILES,
+                 recycle_seconds=RECYCLE_SECONDS,
+                 verbosity=1):
+        """
+        Arguments:
+        recycle_files: restart exiftool after reading this many files
+        recycle_seconds: restart exiftool after running this many seconds
+        verbosity: at 1 or more files that cannot be read are reported
+        """
+        self.recycle_files = recycle_files
+        self.recycle_seconds = recycle_seconds
+        self.verbosity = verbosity
+        self.process = None
+        self.blocks = None
+        self.request = 0
+        self.files = 0
+        self.started = 0.0
+        self.restarts = 0
+        self.failed = []
+
+    def start(self):
+        """
+        Start the exiftool process and a thread that reads its output
+        """
+        self.process = subprocess.Popen(EXIFTOOL + ['-stay_open', 'True',
+                                                    '-@', '-',
+                                                    '-common_args'] +
+                                        COMMON_ARGS,
+                                        stdin=subprocess.PIPE,
+                                        stdout=subprocess.PIPE,
+                                        stderr=subprocess.DEVNULL)
+        self.blocks = queue.Queue()
+        threading.Thread(target=self._reader,
+                         args=(self.process.stdout, self.blocks),
+                         daemon=True).start()
+        self.files = 0
+        self.started = time.monotonic()
+
+    @staticmethod
+    def _reader(stdout, blocks):
+        """
+        Queue each block of output as it arrives, and b'' at the end
+        """
+        fd = stdout.fileno()
+        while True:
+            block = os.read(fd, 65536)
+            blocks.put(block)
+            if not block:
+                break
+
+    def terminate(self):
+        """
+        Ask exiftool to exit, killing it if it does not
+        """
+        if self.process is None:
+            return
+        try:
+            self.process.stdin.write(b'-stay_open\nFalse\n')
+            self.process.stdin.flush()
+            self.process.wait(TIMEOUT)
+        except (OSError, subprocess.TimeoutExpired):
+            self.process.kill()
+            self.process.wait()
+        self.process.stdin.close()
+        self.process.stdout.close()
+        self.process = None
+
+    def restart(self):
+        """
+        Replace the exiftool process by a new one
+        """
+        self.terminate()
+        self.start()
+        self.restarts += 1
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.terminate()
+        return False
+
+    def execute(self, *params, timeout=TIMEOUT):
+        """
+        Run one exiftool command with params (str or bytes) and return its
+        output as bytes.  File names are passed as their bytes on disk, even
+        if they are not UTF-8.  Raise TimeoutError, after killing exiftool, if
+        the command takes longer than timeout seconds, and OSError if
+        exiftool exits.
+        """
+        self.request += 1
+        ready = '{ready' + str(self.request) + '}'
+        text = b''.join([os.fsencode(p) + b'\n' for p in params])
+        self.process.stdin.write(text + b'-execute' +
+                                 str(self.request).encode('ascii') + b'\n')
+        self.process.stdin.flush()
+
+        output = b''
+        deadline = time.monotonic() + timeout
+        end = ready.encode('ascii')
+        while not output.rstrip().endswith(end):
+            try:
+                block = self.blocks.get(timeout=max(0.0, deadline -
+                                                    time.monotonic()))
+            except queue.Empty:
+                self.process.kill()
+                raise TimeoutError('exiftool did not answer in ' +
+                                   str(timeout) + ' s')
+            if not block:
+                raise OSError('exiftool exited')
+            output += block
+        return output.rstrip()[:-len(end)]
+
+    def _read(self, items, filepaths):
+        """
+        Return the tag dictionaries for filepaths from a single request
+        """
+        output = self.execute(*(READ_ARGS +
+                                ['-' + t for t in items] +
+                                filepaths),
+                              timeout=TIMEOUT +
+                                      TIMEOUT_PER_FILE * len(filepaths))
+        # SourceFile holds the file name as given, which need not be UTF-8
+        taglist = (json.loads(output.decode('utf-8', 'surrogateescape'))
+                   if output.strip() else [])
+        if len(taglist) == len(filepaths):
+            return taglist
+        # exiftool leaves out the files it could not open
+        bysource = {tags.get('SourceFile'): tags for tags in taglist}
+        return [bysource.get(f, {}) for f in filepaths]
+
+    def get_tags_batch(self, items, filepaths):
+        """
+        Return the tag dictionaries of items for a list of files, an empty
+        dictionary for each file that could not be read
+        """
+        if (self.files >= self.recycle_files or
+                time.monotonic() - self.started >= self.recycle_seconds):
+            self.restart()
+        self.files += len(filepaths)
+        try:
+            return self._read(items, filepaths)
+        except (OSError, ValueError):
+            pass
+        # A file stalled or crashed exiftool, so read them one at a time 
+        # in a new process and lose only the tags of that file
+        self.restart()
+        taglist = []
+        for f in filepaths:
+            try:
+                taglist.extend(self._read(items, [f]))
+            except (OSError, ValueError):
+                self.restart()
+                self.failed.append(f)
+                if self.verbosity > 0:
+                    print('WARNING: exiftool could not read ' + f,
+                          file=sys.stderr)
+                taglist.append({})
+        return taglist
+
+    def get_tags(self, items, filepath):
+        """
+        Return the tag dictionary of items for one file
+        """
+        return self.get_tags_batch(items, [filepath])[0]
+
+def iter_tags(et, items, files, profile=None, chunksize=scanner.CHUNKSIZE):
+    """
+    Iterate over (filepath, filebase, tags) for an iterable of (filepath,
+    filebase) tuples, requesting items from et for chunksize files at a
+    time in the exif read stage of profile
+    """
+    if profile is None:
+        profile = profiling.stageprofile()
+    files = iter(files)
+    while True:
+        chunk = list(itertools.islice(files, chunksize))
+        if not chunk:
+            break
+        with profile.stage('exif read', files=len(chunk)):
+            taglist = et.get_tags_batch(items, [f for f, fb in chunk])
+        for (f, fb), tags in zip(chunk, taglist):
+            yield f, fb, tags
+
+class lazysession():
+    """
+    A context manager holding an exiftool session that is started on the
+    first call to get() and terminated when the with block exits
+    """
+    def __init__(self, verbosity=1):
+        self.verbosity = verbosity
+        self.et = None
+
+    def __enter__(self):
+        return self
+
+    def get(self):
+        """
+        Return the running session, starting it if necessary
+        """
+        if self.et is None:
+            self.et = session(self.verbosity)
+            self.et.start()
+        return self.et
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if self.et is not None:
+            self.et.terminate()
+            self.et = None
+        return False
+
+def read_batch(et, items, jpegpaths, profile=None, verbosity=1):
+    """
+    Read the EXIF metadata in items for a list of JPEG files in a single
+    exiftool request and return the normalized gpsbatch.
+
+    Arguments:
+    et: a running exiftool session
+    items: the tags to request, normally normalize.GPS_ITEMS
+    jpegpaths: a list of full paths to JPEG files
+    profile: the stageprofile charged with the work, if any
+    verbosity: at 2 or more the tags and normalized values are listed
+    """
+    if profile is None:
+        profile = profiling.stageprofile()
+    with profile.stage('exif read', files=len(jpegpaths)):
+        taglist = et.get_tags_batch(items, jpegpaths)
+    if verbosity > 1:
+        for tags in taglist:
+            for k in tags:
+                print(k, ' = ', tags[k], file=sys.stderr)
+    with profile.stage('parse/normalize', files=len(jpegpaths)) as sc:
+        batch = normalize.normalize_tags(taglist)
+        if profile.enabled:
+            sc.add(points=sum(1 for i in range(len(batch))
+                              if batch.located(i)))
+    if verbosity > 1:
+        for i in range(len(batch)):
+            print(batch.datestr[i],
+                  batch.timestr[i],
+                  batch.lat[i],
+                  batch.lon[i],
+                  batch.alt[i],
+                  '\n',
+                  file=sys.stderr)
+    return batch
@@ -0,0 +1,258 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 09:12:40 2026
+Copyright (C) 2016 Russell O. Redman
+
+Batch normalization of the EXIF GPS and date tags returned by exiftool.
+
+The tag dictionaries for a chunk of JPEG files are converted in a single pass
+into typed columns: decimal latitude, longitude and altitude with the S/W
+reference already applied, epoch timestamps and the date and time strings
+used to label placemarks.  Missing or unparseable values are stored as NaN.
+
+exiftool is asked for the Composite GPS position, which in numeric mode is
+already signed from the reference tags, so the common case is a plain
+number.  The EXIF coordinates and their references are still understood in
+any of the forms exiftool can print.
+
+@author: russell
+@email: russell@roredman.ca
+"""
+
+import array
+import math
+import re
+
+from . import records
+from . import timestamps
+
+# Tags needed to place a JPEG file on the map
+GPS_ITEMS = ['EXIF:DateTimeOriginal',
+             'EXIF:GPSStatus',
+             'EXIF:GPSMeasureMode',
+             'Composite:GPSLongitude',
+             'Composite:GPSLatitude',
+             'Composite:GPSAltitude',
+             'EXIF:SubSecTimeOriginal',
+             'EXIF:OffsetTimeOriginal',
+             'EXIF:Orientation',
+             'EXIF:SerialNumber']
+
+NAN = float('nan')
+
+# Compiled once and shared by every batch
+RATIONAL_RE = re.compile(r'\s*([-+]?\d+(?:\.\d*)?)\s*/\s*(\d+(?:\.\d*)?)\s*$')
+DMS_RE = re.compile(r'\s*([-+]?\d+(?:\.\d*)?)(?:\s*deg)?'
+                    r'(?:[\s,]+(\d+(?:\.\d*)?)\'?)?'
+                    r'(?:[\s,]+(\d+(?:\.\d*)?)"?)?'
+                    r'\s*([NSEW])?\s*$')
+
+def rational_to_float(value):
+    """
+    Convert an EXIF value that may be a number, a rational string "num/den"
+    or a plain numeric string into a float.  Return NaN if the value cannot
+    be interpreted.
+    """
+    if isinstance(value, (int, float)):
+        return float(value)
+    m = RATIONAL_RE.match(value)
+    if m:
+        den = float(m.group(2))
+        return float(m.group(1)) / den if den else NAN
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return NAN
+
+def dms_to_degrees(value):
+    """
+    Convert a coordinate to unsigned decimal degrees.  The value may already
+    be numeric (exiftool -n), a rational string, or a degrees/minutes/seconds
+    string such as "49 deg 15' 30.50\\" N" or "49 15 30.5".  Return NaN if the
+    value cannot be interpreted.  The sign is handled by the caller from the
+    reference tag, since EXIF coordinates are unsigned.
+    """
+    if isinstance(value, (int, float)):
+        return float(value)
+    m = DMS_RE.match(value)
+    if not m:
+        return rational_to_float(value)
+    deg = float(m.group(1))
+    if m.group(2):
+        deg += float(m.group(2)) / 60.0
+    if m.group(3):
+        deg += float(m.group(3)) / 3600.0
+    if m.group(4) in ('S', 'W'):
+        deg = -deg
+    return deg
+
+def is_negative_ref(ref, negative):
+    """
+    Return True if the reference tag indicates the negative hemisphere.
+    negative is 'S' for latitude and 'W' for longitude.  Both the single
+    letter (exiftool -n) and the spelled-out form ("South") are accepted.
+    """
+    return isinstance(ref, str) and ref[:1].upper() == negative
+
+class gpsbatch():
+    """
+    Typed columns holding the normalized GPS metadata for a chunk of files.
+    Each column has one entry per file, in the order the tag dictionaries
+    were supplied:
+    lat, lon, alt: decimal degrees and metres (array of double, NaN if absent)
+    epoch: DateTimeOriginal (plus SubSecTimeOriginal) as seconds since
+        1970-01-01, converted to UTC if OffsetTimeOriginal is recorded and
+        otherwise read from the camera clock (array of double, NaN if absent)
+    utc: 1 if epoch is in UTC because OffsetTimeOriginal was recorded, 0 if
+        it is camera clock time (array of unsigned char)
+    datestr: DateTimeOriginal date as YYYY-MM-DD ('' if absent)
+    timestr: DateTimeOriginal time as HH:MM:SS[.ffffff] ('' if absent)
+    orientation: the EXIF Orientation (array of unsigned char, 0 if absent)
+    serial: the camera serial number as text ('' if absent)
+    status: the GPSStatus as text ('' if absent)
+    size, mtime: the file size and modification time in nanoseconds
+        (array of long long), filled in only when a metadata index is kept
+    """
+    def __init__(self, n):
+        """
+        Allocate columns for n files, initialized to the missing value
+        """
+        self.lat = array.array('d', [NAN]) * n
+        self.lon = array.array('d', [NAN]) * n
+        self.alt = array.array('d', [0.0]) * n
+        self.epoch = array.array('d', [NAN]) * n
+        self.utc = array.array('B', [0]) * n
+        self.datestr = [''] * n
+        self.timestr = [''] * n
+        self.orientation = array.array('B', [0]) * n
+        self.serial = [''] * n
+        self.status = [''] * n
+        self.size = array.array('q', [0]) * n
+        self.mtime = array.array('q', [0]) * n
+
+    def __len__(self):
+        """
+        Number of files in the batch
+        """
+        return len(self.lat)
+
+    def located(self, i):
+        """
+        Return True if file i has a date, a time and a usable position
+        """
+        return (self.datestr[i] != '' and
+                not math.isnan(self.lat[i]) and
+                not math.isnan(self.lon[i]))
+
+    def records(self, jpeglist):
+        """
+        Return an imagerecord for each located file in the batch.
+
+        Arguments:
+        jpeglist: the (jpegdisk, jpegrooted, jpegbase) tuples of the files, 
+            in the order of the batch
+        """
+        return [records.imagerecord(jpegdisk,
+                                    jpegrooted,
+                                    jpegbase,
+                                    self.epoch[i],
+                                    self.datestr[i],
+                                    self.timestr[i],
+                                    self.lat[i],
+                                    self.lon[i],
+                                    self.alt[i],
+                                    self.orientation[i],
+                                    self.serial[i],
+                                    bool(self.utc[i]))
+                for i, (jpegdisk, jpegrooted, jpegbase) in enumerate(jpeglist)
+                if self.located(i)]
+
+def normalize_tags(taglist):
+    """
+    Normalize a list of exiftool tag dictionaries into a gpsbatch.
+
+    Arguments:
+    taglist: list of dictionaries keyed by group:tag, as returned by
+        ExifTool.get_tags_batch() for the items in GPS_ITEMS, or for the 
+        EXIF GPS coordinates and their reference tags
+    """
+    batch = gpsbatch(len(taglist))
+    lat = batch.lat
+    lon = batch.lon
+    alt = batch.alt
+    epoch = batch.epoch
+    datestr = batch.datestr
+    timestr = batch.timestr
+    exif_datetime = timestamps.exif_datetime
+    to_epoch = timestamps.to_epoch
+
+    for i, tags in enumerate(taglist):
+        if not tags:
+            continue
+
+        # The Composite position is signed by exiftool from the references
+        value = tags.get('Composite:GPSLatitude')
+        if value is not None:
+            lat[i] = dms_to_degrees(value)
+        else:
+            value = tags.get('EXIF:GPSLatitude')
+            if value is not None:
+                v = abs(dms_to_degrees(value))
+                if is_negative_ref(tags.get('EXIF:GPSLatitudeRef'), 'S'):
+                    v = -v
+                lat[i] = v
+
+        value = tags.get('Composite:GPSLongitude')
+        if value is not None:
+            lon[i] = dms_to_degrees(value)
+        else:
+            value = tags.get('EXIF:GPSLongitude')
+            if value is not None:
+                v = abs(dms_to_degrees(value))
+                if is_negative_ref(tags.get('EXIF:GPSLongitudeRef'), 'W'):
+                    v = -v
+                lon[i] = v
+
+        value = tags.get('Composite:GPSAltitude')
+        if value is not None:
+            v = rational_to_float(value)
+            if not math.isnan(v):
+                alt[i] = v
+        else:
+            value = tags.get('EXIF:GPSAltitude')
+            if value is not None:
+                v = rational_to_float(value)
+                if not math.isnan(v):
+                    # GPSAltitudeRef == 1 means below sea level
+                    if str(tags.get('EXIF:GPSAltitudeRef', '0')).strip() in (
+                            '1', 'Below Sea Level'):
+                        v = -v
+                    alt[i] = v
+
+        value = tags.get('EXIF:Orientation')
+        if isinstance(value, int) and 0 < value < 256:
+            batch.orientation[i] = value
+
+        value = tags.get('EXIF:GPSStatus')
+        if value is not None:
+            batch.status[i] = str(value).strip()
+
+        value = tags.get('EXIF:SerialNumber')
+        if value is not None:
+            batch.serial[i] = str(value).strip()
+
+        dt = exif_datetime(tags)
+        if dt is not None:
+            datestr[i] = '{0:04d}-{1:02d}-{2:02d}'.format(dt.year,
+                                                          dt.month,
+                                                          dt.day)
+            timestr[i] = '{0:02d}:{1:02d}:{2:02d}'.format(dt.hour,
+                                                          dt.minute,
+                                                          dt.second)
+            if dt.microsecond:
+                timestr[i] += ('.{0:06d}'.format(dt.microsecond)).rstrip('0')
+            epoch[i] = to_epoch(dt)
+            if dt.tzinfo is not None:
+                batch.utc[i] = 1
+
+    return batch
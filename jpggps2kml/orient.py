@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 21:27:14 2026
+Copyright (C) 2016 Russell O. Redman
+
+Lossless rotation of JPEG files to their EXIF Orientation with jpegtran.
+
+The Orientation is taken from the JPEG header with jpegscan, and exiftool
+is consulted only for files where it is not found there, so most runs
+never start an exiftool process.  This follows the shell script provided
+by the Independent JPEG Group at http://jpegclub.org/exif_orientation.html,
+which resets the Orientation of the rotated file to 1.  Here it is reset in
+the rotated copy before that replaces the original, so a file is always
+either untouched or rotated and reset, and an interrupted run can never
+leave a file that would be rotated a second time.
+
+@author: russell
+@email: russell@roredman.ca
+"""
+
+import os
+import sys
+
+from . import jpegscan
+
+# jpegtran arguments that undo each EXIF Orientation, indexed by
+# Orientation - 1
+TRANSFORMS = [[],
+              ['-flip', 'horizontal'],
+              ['-rotate', '180'],
+              ['-flip', 'vertical'],
+              ['-transpose'],
+              ['-rotate', '90'],
+              ['-transverse'],
+              ['-rotate', '270']
+             ]
+
+ITEMS = ['EXIF:Orientation']
+
+def orientation(filepath, session=None, verbosity=1):
+    """
+    Return the EXIF Orientation of a JPEG file, 0 if it is not recorded.
+
+    Arguments:
+    filepath: the JPEG file
+    session: a metadata.lazysession asked for the tag if it is not found
+        in the JPEG header, or None to rely on the header alone
+    verbosity: at 2 or more the tags read by exiftool are listed
+    """
+    orient = jpegscan.orientation(filepath)
+    if orient is None and session is not None:
+        tags = session.get().get_tags(ITEMS, filepath)
+        if verbosity > 1:
+            for k in tags:
+                print(k, ' = ', tags[k], file=sys.stderr)
+        orient = int(tags.get('EXIF:Orientation', 0))
+    return orient or 0
+
+def jpegtran_command(filepath, newfilepath, orient):
+    """
+    Return the jpegtran command that writes filepath, rotated to undo
+    orient, to newfilepath, or None if no rotation is needed
+    """
+    if orient > 1 and orient <= len(TRANSFORMS):
+        return (['jpegtran', '-copy', 'all'] +
+                TRANSFORMS[orient - 1] +
+                ['-outfile', newfilepath, filepath])
+    return None
+
+def reorient(filepath, orient, verbosity=1, session=None):
+    """
+    Rotate filepath in place to undo orient with jpegtran and reset its
+    Orientation to 1, returning True if the file was replaced.  OSError is
+    raised if jpegtran cannot be run.
+
+    Arguments:
+    filepath: the JPEG file
+    orient: its EXIF Orientation
+    verbosity: at 2 or more the jpegtran command is listed
+    session: a metadata.lazysession used to reset the Orientation if it is
+        not in the JPEG header
+    """
+    d, f = os.path.split(filepath)
+    # A hidden name without a JPEG extension, so a copy left behind by an
+    # interrupted run is never taken for an image
+    newfilepath = os.path.join(d, '.' + f + '.tmp')
+    jpegtran_cmd = jpegtran_command(filepath, newfilepath, orient)
+    if jpegtran_cmd is None:
+        return False
+    import subprocess
+    if verbosity > 1:
+        print('jpegtran_cmd: ' + ' '.join(jpegtran_cmd), file=sys.stderr)
+    if subprocess.call(jpegtran_cmd):
+        if os.path.exists(newfilepath):
+            os.remove(newfilepath)
+        return False
+    if not jpegscan.set_orientation(newfilepath, 1) and session is not None:
+        session.get().execute('-EXIF:Orientation=1',
+                              '-overwrite_original',
+                              newfilepath)
+    os.replace(newfilepath, filepath)
+    return True
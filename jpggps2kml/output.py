@@ -0,0 +1,233 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 18:34:50 2026
+Copyright (C) 2016 Russell O. Redman
+
+Atomic, buffered writes of the output files.
+
+Every output file is written to a temporary file in the same directory,
+encoded to UTF-8 and passed down in large chunks, then flushed, fsynced and
+renamed over the target.  A reader, including a later makekml --update,
+therefore sees either the complete old file or the complete new one, never
+a file truncated by a crash.  If the target name ends in .gz or .kmz the
+stream is compressed on the fly, with gzip or as the doc.kml member of a
+KMZ (zip) archive.  The compression and temporary file modules are only
+imported when a file is opened.
+
+File names that are not valid UTF-8 reach Python with each undecodable
+byte held as a lone surrogate, which cannot be encoded.  printable() and
+urlpath() turn them into text that can be written: a replacement character
+where the name is shown, and the percent-encoded byte in a link, which
+still opens the file.
+
+@author: russell
+@email: russell@roredman.ca
+"""
+
+import io
+import os
+import os.path
+import re
+
+# Bytes accumulated before they are passed to the file or compressor
+CHUNKSIZE = 1 << 20
+
+# The name of the KML document inside a KMZ archive
+KMZ_MEMBER = 'doc.kml'
+
+# The lone surrogates that hold the undecodable bytes of a file name
+SURROGATE = re.compile('[\udc80-\udcff]')
+
+def printable(name):
+    """
+    Return a file name with each byte that is not valid UTF-8 replaced by
+    U+FFFD, so that it can be encoded
+    """
+    if name.isascii():
+        return name
+    return SURROGATE.sub('\ufffd', name)
+
+def urlpath(path):
+    """
+    Return a file path for a link, with each byte that is not valid UTF-8
+    percent-encoded
+    """
+    if path.isascii():
+        return path
+    return SURROGATE.sub(lambda m: '%{0:02X}'.format(ord(m.group()) - 0xDC00),
+                         path)
+
+def compression_for(path):
+    """
+    Return 'gzip', 'kmz' or None according to the extension of path
+    """
+    ext = os.path.splitext(path)[1].lower()
+    if ext == '.gz':
+        return 'gzip'
+    if ext == '.kmz':
+        return 'kmz'
+    return None
+
+def openread(path):
+    """
+    Open an existing output file for reading as a binary stream,
+    decompressing it according to its extension
+    """
+    compression = compression_for(path)
+    if compression == 'gzip':
+        import gzip
+        return gzip.open(path, 'rb')
+    if compression == 'kmz':
+        import zipfile
+        with zipfile.ZipFile(path) as kmz:
+            names = kmz.namelist()
+            member = KMZ_MEMBER if KMZ_MEMBER in names else \
+                     [n for n in names if n.lower().endswith('.kml')][0]
+            return io.BytesIO(kmz.read(member))
+    return open(path, 'rb')
+
+def _mode(path):
+    """
+    Return the permissions for the new file: those of the file it replaces,
+    or the default for a new file under the current umask
+    """
+    try:
+        return os.stat(path).st_mode & 0o7777
+    except OSError:
+        umask = os.umask(0)
+        os.umask(umask)
+        return 0o666 & ~umask
+
+class atomicwriter():
+    """
+    A context manager that writes text or bytes to a temporary file and
+    renames it over path when the with block completes normally.  If the
+    block raises, or discard() is called, the temporary file is removed
+    and path is left untouched.
+    """
+    def __init__(self, path, compression=None, chunksize=CHUNKSIZE):
+        """
+        Arguments:
+        path: the file to be replaced
+        compression: 'gzip', 'kmz' or None; taken from the extension of
+            path if not given
+        chunksize: bytes accumulated before each write to the file
+        """
+        self.path = path
+        self.compression = compression or compression_for(path)
+        self.chunksize = chunksize
+        self.nbytes = 0
+        self.discarded = False
+
+    def __enter__(self):
+        """
+        Create the temporary file and the compression stream, if any
+        """
+        import tempfile
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, self.temppath = tempfile.mkstemp(
+                                dir=directory,
+                                prefix='.' + os.path.basename(self.path) + '.',
+                                suffix='.tmp')
+        self.raw = os.fdopen(fd, 'wb')
+        self.archive = None
+        if self.compression == 'gzip':
+            import gzip
+            self.stream = gzip.GzipFile(
+                              filename=os.path.basename(self.path)[:-3],
+                              mode='wb',
+                              fileobj=self.raw,
+                              mtime=0)
+        elif self.compression == 'kmz':
+            import zipfile
+            self.archive = zipfile.ZipFile(self.raw, 'w', zipfile.ZIP_DEFLATED)
+            self.stream = self.archive.open(KMZ_MEMBER, 'w', force_zip64=True)
+        else:
+            self.stream = self.raw
+        self.pending = []
+        self.pendingsize = 0
+        return self
+
+    def write(self, text):
+        """
+        Encode text as UTF-8 and write it
+        """
+        self.writebytes(text.encode('utf-8'))
+
+    def writebytes(self, data):
+        """
+        Write bytes, passing them on once a chunk has accumulated
+        """
+        self.pending.append(data)
+        self.pendingsize += len(data)
+        self.nbytes += len(data)
+        if self.pendingsize >= self.chunksize:
+            self.flush()
+
+    def flush(self):
+        """
+        Pass the accumulated bytes to the file or compressor
+        """
+        if self.pending:
+            self.stream.write(b''.join(self.pending))
+            self.pending = []
+            self.pendingsize = 0
+
+    def discard(self):
+        """
+        Abandon the output, leaving the existing file in place
+        """
+        self.discarded = True
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        """
+        Sync and rename the temporary file into place, or remove it
+        """
+        try:
+            if exc_type is None and not self.discarded:
+                self.flush()
+                if self.stream is not self.raw:
+                    self.stream.close()
+                if self.archive is not None:
+                    self.archive.close()
+                self.raw.flush()
+                os.fsync(self.raw.fileno())
+                self.raw.close()
+                os.chmod(self.temppath, _mode(self.path))
+                os.replace(self.temppath, self.path)
+                self._sync_directory()
+                return False
+        except BaseException:
+            self._remove()
+            raise
+        self._remove()
+        return False
+
+    def _remove(self):
+        """
+        Close and delete the temporary file
+        """
+        try:
+            self.raw.close()
+        except OSError:
+            pass
+        try:
+            os.remove(self.temppath)
+        except OSError:
+            pass
+
+    def _sync_directory(self):
+        """
+        Make the rename durable where the platform allows it
+        """
+        try:
+            fd = os.open(os.path.dirname(os.path.abspath(self.path)),
+                         os.O_RDONLY)
+        except OSError:
+            return
+        try:
+            os.fsync(fd)
+        except OSError:
+            pass
+        finally:
+            os.close(fd)
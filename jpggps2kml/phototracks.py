@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 16:22:57 2026
+Copyright (C) 2016 Russell O. Redman
+
+Tracks derived from the positions recorded in the images themselves.
+
+The located images are gathered into typed columns as their metadata are
+read.  When the tracks are built, the columns are sorted once by timestamp
+(a stable sort by directory follows for per-directory grouping) and split
+into segments in a single pass wherever the group changes or the time
+between consecutive images exceeds the gap threshold.  Each segment becomes
+one gx:Track, built directly with lxml rather than through the pykml
+factories so that a million points take seconds rather than minutes.
+
+@author: russell
+@email: russell@roredman.ca
+"""
+
+import array
+import math
+import os.path
+import time
+
+from . import kml
+
+# Ways of grouping images into tracks
+GROUPINGS = ('day', 'dir')
+
+class photocolumns():
+    """
+    Typed columns holding the located images from every batch:
+    epoch, lon, lat, alt: as in normalize.gpsbatch (array of double)
+    when: the gx:when text, YYYY-MM-DDTHH:MM:SS[.ffffff] camera time, or
+        the UTC time with a Z suffix if the epochs have been converted to
+        UTC with --tz-boundaries
+    day: DateTimeOriginal date as YYYY-MM-DD
+    group: index into dirs of the directory holding the image
+    """
+    def __init__(self, utc=False):
+        """
+        Start with empty columns
+
+        Arguments:
+        utc: True if the epochs of the imagerecords are UTC
+        """
+        self.utc = utc
+        self.epoch = array.array('d')
+        self.lon = array.array('d')
+        self.lat = array.array('d')
+        self.alt = array.array('d')
+        self.when = []
+        self.day = []
+        self.group = array.array('l')
+        self.dirs = []
+        self.dirindex = {}
+
+    def __len__(self):
+        """
+        Number of located images
+        """
+        return len(self.epoch)
+
+    def add(self, imagerecords):
+        """
+        Append a list of imagerecords
+        """
+        for r in imagerecords:
+            if r.epoch != r.epoch:
+                # no usable timestamp
+                continue
+            d = os.path.dirname(r.rooted)
+            if d not in self.dirindex:
+                self.dirindex[d] = len(self.dirs)
+                self.dirs.append(d)
+            self.epoch.append(r.epoch)
+            self.lon.append(r.lon)
+            self.lat.append(r.lat)
+            self.alt.append(r.alt)
+            if self.utc:
+                self.when.append(time.strftime('%Y-%m-%dT%H:%M:%S',
+                                               time.gmtime(
+                                                   math.floor(r.epoch))) +
+                                 r.timestr[8:] + 'Z')
+            else:
+                self.when.append(r.datestr + 'T' + r.timestr)
+            self.day.append(r.datestr)
+            self.group.append(self.dirindex[d])
+
+    def segments(self, grouping='day', gap=0.0):
+        """
+        Sort the images and split them into tracks.
+
+        Arguments:
+        grouping: 'day' for one track per day, 'dir' for one per directory
+        gap: if > 0, also split a track wherever consecutive images are
+            more than gap seconds apart
+
+        Returns a list of (name, indices) tuples, where indices lists the
+        images in the track in time order.
+        """
+        order = sorted(range(len(self)), key=self.epoch.__getitem__)
+        if grouping == 'dir':
+            order.sort(key=self.group.__getitem__)
+            keys = [self.dirs[g] for g in self.group]
+        else:
+            keys = self.day
+
+        result = []
+        start = 0
+        epoch = self.epoch
+        for n in range(1, len(order) + 1):
+            if (n == len(order) or
+                keys[order[n]] != keys[order[n - 1]] or
+                (gap > 0 and epoch[order[n]] - epoch[order[n - 1]] > gap)):
+                result.append((keys[order[start]], order[start:n]))
+                start = n
+
+        # Number the pieces of any group that was split at gaps
+        counts = {}
+        for name, indices in result:
+            counts[name] = counts.get(name, 0) + 1
+        seen = {}
+        for k, (name, indices) in enumerate(result):
+            if counts[name] > 1:
+                seen[name] = seen.get(name, 0) + 1
+                result[k] = (name + ' (' + str(seen[name]) + ')', indices)
+        return result
+
+    def gxtrack(self, indices):
+        """
+        Return a gx:Track element for the images in indices
+        """
+        from lxml import etree
+        track = etree.Element(kml.GXNS + 'Track')
+        etree.SubElement(track,
+                         kml.KMLNS + 'altitudeMode').text = 'clampToGround'
+        when = self.when
+        for i in indices:
+            etree.SubElement(track, kml.KMLNS + 'when').text = when[i]
+        lon = self.lon
+        lat = self.lat
+        alt = self.alt
+        for i in indices:
+            etree.SubElement(track, kml.GXNS + 'coord').text = \
+                '{0:.7f} {1:.7f} {2:.3f}'.format(lon[i], lat[i], alt[i])
+        return track
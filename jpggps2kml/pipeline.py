@@ -0,0 +1,307 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 15:40:22 2026
+Copyright (C) 2016 Russell O. Redman
+
+Asynchronous pipeline that writes the image placemarks of a new KML file.
+
+On network-attached storage most of the time in makekml is spent waiting,
+first for directory listings and then for exiftool to read each file.  The
+pipeline overlaps these waits by running the stages concurrently, joined by
+bounded asyncio queues so that a fast stage cannot run far ahead of a slow
+one:
+
+    discovery -> chunks -> EXIF read/normalize (--jobs sessions) -> batches
+              -> records
+
+Directory listings and exiftool requests are blocking calls, so they run in
+a thread pool; each reader task owns its own exiftool -stay_open session.
+The located images are kept as compact imagerecords in an
+extsort.recordsorter, which spills sorted runs to temporary files beyond
+the --sort-memory budget, and are merged by date, time and path when they
+are written, so the output does not depend on which session finished first.
+
+With --journal the metadata of each chunk is appended to the journal as it
+is collected, and each directory is marked once all of its chunks are in.
+With --resume the journal is replayed before the pipeline starts, and the
+directories and files it records are not read again.
+
+With --from, --to or --bbox, directories whose names date them outside the
+time range are not listed, and the files of each chunk are checked against
+their modification times and the index before exiftool reads the rest (see
+pushdown).  The index rows of the files that were passed over are copied
+to the new index so that a selective run does not lose them.
+
+@author: russell
+@email: russell@roredman.ca
+"""
+
+import asyncio
+import concurrent.futures
+import itertools
+import os.path
+import sys
+
+from . import extsort
+from . import index
+from . import metadata
+from . import output
+from . import scanner
+
+# Chunks allowed to wait in each queue for every exiftool session
+QUEUEDEPTH = 2
+
+class kmlpipeline():
+    """
+    Runs discovery, EXIF reads and normalization of the image metadata for
+    the JPEG files in jpggps.dirs concurrently.
+    """
+    def __init__(self, jpggps, jobs=1):
+        """
+        Arguments:
+        jpggps: the configured jpggps2kml object running makekml
+        jobs: the number of exiftool sessions to keep in flight
+        """
+        self.jpggps = jpggps
+        self.jobs = max(1, jobs)
+        args = jpggps.config['arguments']
+        memory = extsort.MEMORY
+        if 'sort_memory' in args and args['sort_memory']:
+            memory = float(args['sort_memory'])
+        self.records = extsort.recordsorter(extsort.budget(memory),
+                                            jpggps.profile)
+        self.donedirs = set()
+        self.donefiles = set()
+        self.pending = {}
+        self.indexed = set()
+
+    def collect(self):
+        """
+        Read every JPEG file in jpggps.dirs and collect the imagerecords of
+        the located images in self.records, ready for write().  With 
+        --index-out, the metadata of every file is written to the index as 
+        it is read.  Identical copies are then removed if --dedup was given,
+        and the images are added to jpggps.photos in sorted order if 
+        photo-derived tracks were requested, so that the directories are 
+        numbered in the order their first images were taken whichever 
+        session finished first.
+        """
+        if self.jpggps.index is None:
+            self.indexwriter = None
+            self._run()
+        else:
+            with self.jpggps.index.writer() as self.indexwriter:
+                self._run()
+                if self.jpggps.selection is not None:
+                    self._carry_index()
+            if self.jpggps.verbosity > 0:
+                print('reused the metadata of ' + 
+                      str(self.jpggps.index.reused) + ' files from ' +
+                      self.jpggps.index.path, file=sys.stderr)
+        if not self.records.runs:
+            # Everything fits in memory
+            self.records.records = self.jpggps.unique_images(
+                                       self.records.records)
+            self.records.count = len(self.records.records)
+            if self.jpggps.photos is not None:
+                self.jpggps.photos.add(self.records.sorted())
+        else:
+            self._unique_sorted()
+
+    def _unique_sorted(self):
+        """
+        Once runs have been spilled, remove identical copies and fill
+        jpggps.photos in one streaming pass over the merged runs, collecting
+        the images that remain in a new recordsorter
+        """
+        args = self.jpggps.config['arguments']
+        unique = 'dedup' in args and args['dedup']
+        if not unique and self.jpggps.photos is None:
+            return
+        images = self.records.sorted()
+        if unique:
+            from . import dedup
+            images = dedup.unique_sorted(images, self.jpggps.profile)
+        kept = extsort.recordsorter(self.records.limit, self.jpggps.profile)
+        while True:
+            chunk = list(itertools.islice(images, extsort.CHUNKSIZE))
+            if not chunk:
+                break
+            kept.add(chunk)
+            if self.jpggps.photos is not None:
+                self.jpggps.photos.add(chunk)
+        if self.jpggps.verbosity > 0 and len(kept) < len(self.records):
+            print('dropped ' + str(len(self.records) - len(kept)) +
+                  ' duplicate images', file=sys.stderr)
+        self.records.close()
+        self.records = kept
+
+    def _run(self):
+        """
+        Replay the journal, if one is kept, and run the pipeline over the
+        files it does not record
+        """
+        journal = self.jpggps.journal
+        if journal is None:
+            asyncio.run(self._main())
+            return
+        replayed = 0
+        with self.jpggps.profile.stage('journal') as sc:
+            for entry in journal.replay():
+                if 'dir' in entry:
+                    self.donedirs.add(entry['dir'])
+                else:
+                    self._add(*index.from_rows(entry['chunk']))
+                    self.donefiles.update(row[0] for row in entry['chunk'])
+                    replayed += len(entry['chunk'])
+            sc.add(files=replayed)
+            journal.open()
+        if self.jpggps.verbosity > 0 and replayed:
+            print('resumed ' + str(replayed) + ' files from ' + journal.path,
+                  file=sys.stderr)
+        try:
+            asyncio.run(self._main())
+        finally:
+            journal.close()
+
+    def _add(self, jpeglist, batch):
+        """
+        Add a chunk that has been read to the index and the imagerecords
+        """
+        if self.indexwriter is not None:
+            with self.jpggps.profile.stage('index', files=len(jpeglist)):
+                self.indexwriter.write(jpeglist, batch)
+            if self.jpggps.selection is not None:
+                # As the paths were written to the index
+                self.indexed.update(output.printable(t[0]) for t in jpeglist)
+        self.records.add(self.jpggps.image_records(jpeglist, batch))
+
+    def _carry_index(self):
+        """
+        Copy the rows of the existing index that were not written by this
+        run, because the selection passed over their files, to the new one
+        """
+        carried = [row for p, row in self.jpggps.index.rows.items()
+                   if p not in self.indexed]
+        with self.jpggps.profile.stage('index', files=len(carried)):
+            for c in range(0, len(carried), scanner.CHUNKSIZE):
+                self.indexwriter.write(
+                    *index.from_rows(
+                        carried[c:c + scanner.CHUNKSIZE]))
+
+    async def _main(self):
+        """
+        Start the stages and wait for all of them to finish
+        """
+        loop = asyncio.get_running_loop()
+        depth = QUEUEDEPTH * self.jobs
+        chunks = asyncio.Queue(depth)
+        batches = asyncio.Queue(depth)
+        with concurrent.futures.ThreadPoolExecutor(self.jobs + 1) as pool:
+            await asyncio.gather(
+                self._discover(loop, pool, chunks),
+                self._collect(batches),
+                *[self._read(loop, pool, chunks, batches)
+                  for n in range(self.jobs)])
+
+    async def _discover(self, loop, pool, chunks):
+        """
+        List each directory in a worker thread and queue its chunks as
+        (directory, [(jpegdisk, jpegrooted, jpegbase)]) pairs, followed by
+        one None for each reader to mark the end of the input.  Directories
+        and files already recorded in the journal are left out, as are 
+        directories named for dates outside the selection.
+        """
+        selection = self.jpggps.selection
+        for d in self.jpggps.dirs:
+            if d in self.donedirs:
+                continue
+            if (selection is not None and 
+                    not selection.name_in_range(os.path.basename(d))):
+                if self.jpggps.verbosity > 1:
+                    print('skipping ' + d, file=sys.stderr)
+                continue
+            dirchunks = await loop.run_in_executor(pool,
+                                                   self.jpggps.dirchunks,
+                                                   d)
+            if self.donefiles:
+                dirchunks = [c for c in
+                             ([t for t in jpeglist
+                               if t[0] not in self.donefiles]
+                              for jpeglist in dirchunks) if c]
+            self.pending[d] = len(dirchunks)
+            if not dirchunks:
+                self._finish(d)
+            for jpeglist in dirchunks:
+                await chunks.put((d, jpeglist))
+        for n in range(self.jobs):
+            await chunks.put(None)
+
+    async def _read(self, loop, pool, chunks, batches):
+        """
+        Read and normalize the EXIF metadata of each queued chunk with a
+        private exiftool session, queueing (directory, jpeglist, gpsbatch)
+        tuples.  A None is queued when the input is exhausted.
+        """
+        et = metadata.session(self.jpggps.verbosity)
+        await loop.run_in_executor(pool, et.start)
+        try:
+            while True:
+                item = await chunks.get()
+                if item is None:
+                    break
+                d, jpeglist = item
+                if self.jpggps.selection is None:
+                    batch = await loop.run_in_executor(
+                                pool,
+                                self.jpggps.read_jpeg_chunk,
+                                [t[0] for t in jpeglist],
+                                et)
+                else:
+                    jpeglist, batch = await loop.run_in_executor(
+                                          pool,
+                                          self.jpggps.read_selected_chunk,
+                                          jpeglist,
+                                          et)
+                await batches.put((d, jpeglist, batch))
+        finally:
+            await loop.run_in_executor(pool, et.terminate)
+            await batches.put(None)
+
+    async def _collect(self, batches):
+        """
+        Collect the imagerecords from each normalized batch until every
+        reader has finished
+        """
+        running = self.jobs
+        while running:
+            item = await batches.get()
+            if item is None:
+                running -= 1
+            else:
+                d, jpeglist, batch = item
+                self._add(jpeglist, batch)
+                if self.jpggps.journal is not None:
+                    with self.jpggps.profile.stage('journal',
+                                                   files=len(jpeglist)):
+                        self.jpggps.journal.append(
+                            {'chunk': index.rows(jpeglist, batch)},
+                            len(jpeglist))
+                    self.pending[d] -= 1
+                    if not self.pending[d]:
+                        self._finish(d)
+
+    def _finish(self, d):
+        """
+        Record in the journal that every file in directory d has been read
+        """
+        if self.jpggps.journal is not None:
+            self.jpggps.journal.append({'dir': d})
+
+    def write(self, out):
+        """
+        Write the placemarks to out, a text stream positioned inside the 
+        images folder, in date, time and path order
+        """
+        self.jpggps.stream_image_placemarks(self.records.sorted(), out)
+        self.records.close()
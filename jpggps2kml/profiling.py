@@ -0,0 +1,240 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 12:20:13 2026
+Copyright (C) 2016 Russell O. Redman
+
+Per-stage timing and throughput counters for the jpggps2kml commands.
+
+Each command brackets its work in named stages (discovery, EXIF read,
+parse/normalize, GPX parse, KML build, serialize, write, ...).  The elapsed
+wall clock time and the number of files, bytes and points handled in each
+stage are accumulated and reported at the end of the run when --profile is
+given, either as a table or as JSON.
+
+A stage may run in several threads at once, as the EXIF reads of makekml
+--jobs do.  Its seconds are then the wall clock time during which at least
+one thread was in the stage, so that no stage can take longer than the run,
+and the time summed over every thread is reported separately as its thread
+seconds.  The counts are updated under a lock.  --cprofile additionally
+records a cProfile dump for detailed analysis with pstats.
+
+@author: russell
+@email: russell@roredman.ca
+"""
+
+import contextlib
+import sys
+import threading
+import time
+
+# Stages in the order they are normally reported
+STAGES = ['journal',
+          'discovery',
+          'exif read',
+          'parse/normalize',
+          'timezones',
+          'places',
+          'index',
+          'sort',
+          'dedup',
+          'gpx parse',
+          'gpx merge',
+          'track stats',
+          'kml read',
+          'kml build',
+          'serialize',
+          'write']
+
+class stagecounter():
+    """
+    Accumulated time and throughput counts for one stage:
+    seconds: wall clock time with at least one thread in the stage
+    threadseconds: time in the stage summed over every thread
+    calls: the number of times the stage was entered
+    files, bytes, points: the throughput counts
+    """
+    __slots__ = ('seconds', 'threadseconds', 'calls', 'files', 'bytes', 
+                 'points', 'active', 'since', 'lock')
+
+    def __init__(self):
+        """
+        Start with everything zero
+        """
+        self.seconds = 0.0
+        self.threadseconds = 0.0
+        self.calls = 0
+        self.files = 0
+        self.bytes = 0
+        self.points = 0
+        self.active = 0 # threads now in the stage
+        self.since = 0.0 # when the first of them entered it
+        self.lock = threading.Lock()
+
+    def add(self, files=0, nbytes=0, points=0):
+        """
+        Add to the throughput counts
+        """
+        with self.lock:
+            self.files += files
+            self.bytes += nbytes
+            self.points += points
+
+    def enter(self):
+        """
+        Record a thread entering the stage and return the time it did so
+        """
+        with self.lock:
+            now = time.perf_counter()
+            if self.active == 0:
+                self.since = now
+            self.active += 1
+        return now
+
+    def leave(self, start, files=0, nbytes=0, points=0):
+        """
+        Record a thread that entered the stage at start leaving it, adding
+        the throughput counts
+        """
+        with self.lock:
+            now = time.perf_counter()
+            self.threadseconds += now - start
+            self.active -= 1
+            if self.active == 0:
+                self.seconds += now - self.since
+            self.calls += 1
+            self.files += files
+            self.bytes += nbytes
+            self.points += points
+
+# Returned by stage() when profiling is disabled; the counts added to its
+# stagecounter are never reported
+DISABLED = contextlib.nullcontext(stagecounter())
+
+class stageprofile():
+    """
+    Collects stagecounters for a single run of a command.  When disabled,
+    stage() does nothing, so the instrumentation can be left in place
+    permanently.
+    """
+    def __init__(self, command='', enabled=False):
+        """
+        Arguments:
+        command: the name of the command being profiled
+        enabled: True to accumulate timings and counts
+        """
+        self.command = command
+        self.enabled = enabled
+        self.stages = {}
+        self.started = time.perf_counter()
+        self.profiler = None
+
+    def counter(self, name):
+        """
+        Return the stagecounter for name, creating it if necessary.  
+        setdefault keeps this safe when stages run in worker threads.
+        """
+        sc = self.stages.get(name)
+        if sc is None:
+            sc = self.stages.setdefault(name, stagecounter())
+        return sc
+
+    @contextlib.contextmanager
+    def _timed(self, name, files, nbytes, points):
+        """
+        Context manager that adds the elapsed time of its block to a stage
+        """
+        sc = self.counter(name)
+        start = sc.enter()
+        try:
+            yield sc
+        finally:
+            sc.leave(start, files, nbytes, points)
+
+    def stage(self, name, files=0, nbytes=0, points=0):
+        """
+        Return a context manager that times its block as part of the named
+        stage.  The counts can be given here, or added to the stagecounter
+        returned by the with statement once they are known.
+        """
+        if not self.enabled:
+            return DISABLED
+        return self._timed(name, files, nbytes, points)
+
+    def start_cprofile(self):
+        """
+        Start collecting a cProfile for the rest of the run
+        """
+        import cProfile
+        self.profiler = cProfile.Profile()
+        self.profiler.enable()
+
+    def stop_cprofile(self, path):
+        """
+        Stop the cProfile, if one was started, and dump it to path
+        """
+        if self.profiler:
+            self.profiler.disable()
+            self.profiler.dump_stats(path)
+            self.profiler = None
+
+    def ordered(self):
+        """
+        Return the (name, stagecounter) pairs in reporting order
+        """
+        names = [n for n in STAGES if n in self.stages]
+        names.extend(n for n in self.stages if n not in STAGES)
+        return [(n, self.stages[n]) for n in names]
+
+    def as_dict(self):
+        """
+        Return the profile as a dictionary suitable for json.dump()
+        """
+        return {'command': self.command,
+                'total_seconds': time.perf_counter() - self.started,
+                'stages': [{'stage': name,
+                            'seconds': sc.seconds,
+                            'thread_seconds': sc.threadseconds,
+                            'calls': sc.calls,
+                            'files': sc.files,
+                            'bytes': sc.bytes,
+                            'points': sc.points}
+                           for name, sc in self.ordered()]}
+
+    def report(self, fmt='table', out=None):
+        """
+        Write the accumulated profile to out.
+
+        Arguments:
+        fmt: 'table' for a human readable summary, 'json' for a JSON document
+        out: the stream to write to, sys.stderr by default
+        """
+        if not self.enabled:
+            return
+        if out is None:
+            out = sys.stderr
+
+        if fmt == 'json':
+            import json
+            json.dump(self.as_dict(), out, indent=2)
+            print(file=out)
+            return
+
+        total = time.perf_counter() - self.started
+        print('profile for ' + self.command, file=out)
+        print('{0:16s} {1:>9s} {2:>6s} {3:>9s} {4:>9s} {5:>12s} {6:>9s} '
+              '{7:>10s}'
+              .format('stage', 'seconds', '%', 'thread s', 'files', 'bytes', 
+                      'points', 'files/s'), file=out)
+        for name, sc in self.ordered():
+            rate = sc.files / sc.seconds if sc.seconds > 0 else 0.0
+            print('{0:16s} {1:9.3f} {2:6.1f} {3:9.3f} {4:9d} {5:12d} {6:9d} '
+                  '{7:10.1f}'
+                  .format(name,
+                          sc.seconds,
+                          100.0 * sc.seconds / total if total > 0 else 0.0,
+                          sc.threadseconds,
+                          sc.files,
+                          sc.bytes,
+                          sc.points,
+                          rate), file=out)
+        print('{0:16s} {1:9.3f}'.format('total', total), file=out)
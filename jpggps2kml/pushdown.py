@@ -0,0 +1,249 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 13:21:08 2026
+Copyright (C) 2016 Russell O. Redman
+
+The --from, --to and --bbox filters of makekml, pushed down to the
+cheapest check that can rule a file out.
+
+An export of one trip from an archive of many years should not read the
+metadata of every image.  The selection is therefore tested, in order of
+cost, against:
+    the names of directories and GPX files that hold a date of at least a
+        month, such as 2016-01-02, 20160102 or 2016-01, or that are only a
+        year such as 2016 (a directory is not even listed if its date lies
+        outside the time range); a year within other text, as in
+        "EOS 2000D" or "1920x1080", is not taken for a date
+    the modification time of each file, which cannot be earlier than the
+        moment the image was taken, so a file last modified before --from
+        is skipped
+    the row of the file in the --index-out index, if it is still current
+and only the files that survive are read with exiftool, after which the
+images themselves are tested.  The trackpoints of the GPX files are
+trimmed to the same time range, and a track that never enters the --bbox
+is left out.
+
+Times are compared as they are recorded: the DateTimeOriginal of the images
+and the UTC times of the trackpoints, unless --tz-boundaries has converted
+the times of the images to UTC as well, when those are compared instead.  Because camera clocks, modification
+times and the days that name directories can differ from those by up to a
+day, the cheap checks allow MARGIN seconds either side of the range.
+
+@author: russell
+@email: russell@roredman.ca
+"""
+
+import calendar
+import datetime
+import math
+import re
+
+from . import timestamps
+
+# Seconds by which directory dates and modification times may stray
+MARGIN = 86400.0
+
+# Dates in a name: YYYY-MM[-DD] with - _ or . separators, or YYYYMMDD
+NAMEDATE_RE = re.compile(r'(?<!\d)(\d{4})(?:[-_.](\d{2})(?:[-_.](\d{2}))?|'
+                         r'(\d{2})(\d{2}))(?!\d)')
+
+# A name that is only a year
+NAMEYEAR_RE = re.compile(r'\s*(\d{4})\s*')
+
+INF = float('inf')
+
+def _bound(text, upper):
+    """
+    Return the naive datetime of a --from or --to value, which may be a
+    date or a date and time; an upper bound is made exclusive by adding a
+    day to a date and a second to a time.  Raise ValueError if the text
+    cannot be parsed.
+    """
+    dt = timestamps.parse_datetime(text)
+    if dt is not None:
+        if dt.tzinfo is not None:
+            dt = dt.astimezone(timestamps.UTC).replace(tzinfo=None)
+        return dt + datetime.timedelta(seconds=1) if upper else dt
+    m = timestamps.DATE_RE.match(text)
+    if m:
+        try:
+            dt = datetime.datetime(int(m.group(1)),
+                                   int(m.group(2)),
+                                   int(m.group(3)))
+        except ValueError:
+            dt = None
+        if dt is not None:
+            return dt + datetime.timedelta(days=1) if upper else dt
+    raise ValueError('cannot parse the date ' + repr(text))
+
+def _name_range(name):
+    """
+    Return the (begin, end) epochs covered by the dates in a name, or None
+    if it holds no plausible date.  A bare year counts only if it is the
+    whole name, so that the data under a name such as "EOS 2000D" is
+    never dropped.
+    """
+    begin = INF
+    end = -INF
+    dates = [(year, month or cmonth, day or cday)
+             for year, month, day, cmonth, cday in NAMEDATE_RE.findall(name)]
+    m = NAMEYEAR_RE.fullmatch(name)
+    if m:
+        dates.append((m.group(1), '', ''))
+    for year, month, day in dates:
+        year = int(year)
+        if not 1900 <= year <= 2100:
+            continue
+        try:
+            if day:
+                first = datetime.datetime(year, int(month), int(day))
+                last = first + datetime.timedelta(days=1)
+            elif month:
+                first = datetime.datetime(year, int(month), 1)
+                last = datetime.datetime(year + int(month) // 12,
+                                         int(month) % 12 + 1,
+                                         1)
+            else:
+                first = datetime.datetime(year, 1, 1)
+                last = datetime.datetime(year + 1, 1, 1)
+        except ValueError:
+            continue
+        begin = min(begin, calendar.timegm(first.timetuple()))
+        end = max(end, calendar.timegm(last.timetuple()))
+    if begin == INF:
+        return None
+    return begin, end
+
+class selection():
+    """
+    A time range and a region that images and trackpoints must fall in
+    """
+    def __init__(self, begin=None, end=None, bbox=None):
+        """
+        Arguments:
+        begin: the earliest time as a naive datetime, or None
+        end: the first time past the range as a naive datetime, or None
+        bbox: (west, south, east, north) in decimal degrees, or None; west
+            may exceed east for a region that crosses longitude 180
+        """
+        self.begin = begin
+        self.end = end
+        self.bbox = bbox
+        self.beginepoch = (timestamps.to_epoch(begin) if begin is not None
+                           else -INF)
+        self.endepoch = timestamps.to_epoch(end) if end is not None else INF
+        # DateTimeOriginal as compared by contains()
+        self.beginkey = (begin.strftime('%Y-%m-%d %H:%M:%S')
+                         if begin is not None else '')
+        self.endkey = (end.strftime('%Y-%m-%d %H:%M:%S')
+                       if end is not None else '\uffff')
+
+    def name_in_range(self, name):
+        """
+        Return False if name begins with or holds dates that all lie more
+        than MARGIN outside the time range, otherwise True
+        """
+        if self.begin is None and self.end is None:
+            return True
+        span = _name_range(name)
+        if span is None:
+            return True
+        return (span[1] + MARGIN > self.beginepoch and
+                span[0] - MARGIN < self.endepoch)
+
+    def mtime_in_range(self, mtime):
+        """
+        Return False if a file last modified at mtime (in nanoseconds) must
+        have been taken before the time range
+        """
+        return mtime * 1.0e-9 + MARGIN >= self.beginepoch
+
+    def time_in_range(self, epoch):
+        """
+        Return True if the trackpoint time epoch lies in the time range
+        """
+        return self.beginepoch <= epoch < self.endepoch
+
+    def in_bbox(self, lat, lon):
+        """
+        Return True if (lat, lon) lies in the region, or there is none
+        """
+        if self.bbox is None:
+            return True
+        west, south, east, north = self.bbox
+        if not south <= lat <= north:
+            return False
+        if west <= east:
+            return west <= lon <= east
+        return lon >= west or lon <= east
+
+    def contains(self, datestr, timestr, lat, lon, epoch=None, margin=0.0):
+        """
+        Return True if an image taken at datestr and timestr (as recorded
+        in DateTimeOriginal) at (lat, lon) is selected.  If the epoch of
+        the image in UTC is given, it is compared with the time range
+        widened by margin seconds either side instead of the date and time.
+        """
+        if self.begin is not None or self.end is not None:
+            if epoch is not None:
+                if not (self.beginepoch - margin <= epoch < 
+                        self.endepoch + margin):
+                    return False
+            elif not datestr:
+                return False
+            elif not (self.beginkey <= datestr + ' ' + timestr < 
+                      self.endkey):
+                return False
+        if self.bbox is not None:
+            if math.isnan(lat) or math.isnan(lon):
+                return False
+            return self.in_bbox(lat, lon)
+        return True
+
+    def enters_bbox(self, lats, lons):
+        """
+        Return True if any of the positions in the sequences lats and lons
+        lies in the region
+        """
+        if self.bbox is None:
+            return True
+        return any(self.in_bbox(float(lat), float(lon))
+                   for lat, lon in zip(lats, lons))
+
+    def trim(self, points):
+        """
+        Iterate over the trackpoints of a time ordered stream that lie in
+        the time range, stopping at the first one past it so that the rest
+        of the stream is never read
+        """
+        for p in points:
+            if p.epoch >= self.endepoch:
+                break
+            if p.epoch >= self.beginepoch:
+                yield p
+
+def from_args(args):
+    """
+    Return the selection given by --from, --to and --bbox in args, or None
+    if none of them was given.  Raise ValueError if a value is malformed.
+    """
+    begin = end = bbox = None
+    if 'from' in args and args['from']:
+        begin = _bound(args['from'], False)
+    if 'to' in args and args['to']:
+        end = _bound(args['to'], True)
+    if 'bbox' in args and args['bbox']:
+        try:
+            bbox = tuple(float(v) for v in args['bbox'].split(','))
+        except ValueError:
+            bbox = ()
+        if (len(bbox) != 4 or bbox[1] > bbox[3] or
+                not all(-180.0 <= bbox[i] <= 180.0 for i in (0, 2)) or
+                not all(-90.0 <= bbox[i] <= 90.0 for i in (1, 3))):
+            raise ValueError('--bbox must be WEST,SOUTH,EAST,NORTH in '
+                             'degrees, not ' + repr(args['bbox']))
+    if begin is None and end is None and bbox is None:
+        return None
+    if begin is not None and end is not None and end <= begin:
+        raise ValueError('--to is earlier than --from')
+    return selection(begin, end, bbox)
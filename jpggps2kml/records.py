@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 19:55:18 2026
+Copyright (C) 2016 Russell O. Redman
+
+Compact record types for the per-image and per-trackpoint data.
+
+A makekml run over a large archive keeps one record per located image
+until the output is written, and mergegpx holds the trackpoints of the
+current window, so these classes use __slots__ rather than an instance
+__dict__.  A slotted record costs a fixed 8 bytes per field, against
+several hundred bytes for an equivalent dictionary.
+
+@author: russell
+@email: russell@roredman.ca
+"""
+
+import time
+
+class imagerecord():
+    """
+    The normalized metadata of one located image
+    """
+    __slots__ = ('path', 'rooted', 'name', 'epoch', 'datestr', 'timestr',
+                 'lat', 'lon', 'alt', 'orientation', 'serial', 'utc', 
+                 'alternates')
+
+    def __init__(self, path, rooted, name, epoch, datestr, timestr,
+                 lat, lon, alt, orientation=0, serial='', utc=False):
+        """
+        Arguments:
+        path: the full path to the JPEG file on the disk
+        rooted: the path to the JPEG file relative to the root
+        name: the basename of the JPEG file, used as the placemark name
+        epoch: DateTimeOriginal as seconds since 1970-01-01 (see gpsbatch)
+        datestr: DateTimeOriginal date as YYYY-MM-DD
+        timestr: DateTimeOriginal time as HH:MM:SS[.ffffff]
+        lat, lon, alt: decimal degrees and metres
+        orientation: the EXIF Orientation, 0 if not recorded
+        serial: the camera serial number, '' if not recorded
+        utc: True if epoch is in UTC, False if it is camera clock time
+
+        alternates is None, or the list of the rooted paths of identical
+        copies of the image found by dedup.unique()
+        """
+        self.path = path
+        self.rooted = rooted
+        self.name = name
+        self.epoch = epoch
+        self.datestr = datestr
+        self.timestr = timestr
+        self.lat = lat
+        self.lon = lon
+        self.alt = alt
+        self.orientation = orientation
+        self.serial = serial
+        self.utc = utc
+        self.alternates = None
+
+    def sortkey(self):
+        """
+        Return the key that orders placemarks by date, time and path
+        """
+        return (self.datestr, self.timestr, self.rooted)
+
+    def fields(self):
+        """
+        Return the values of FIELDS as a list, ready for json.dumps()
+        """
+        return [getattr(self, f) for f in FIELDS]
+
+    @classmethod
+    def from_fields(cls, values):
+        """
+        Return the imagerecord for a list of values returned by fields()
+        """
+        (datestr, timestr, rooted, path, name, epoch,
+         lat, lon, alt, orientation, serial, utc, alternates) = values
+        r = cls(path, rooted, name, epoch, datestr, timestr, lat, lon, alt,
+                orientation, serial, utc)
+        r.alternates = alternates
+        return r
+
+# The imagerecord fields written to fragments and sort runs, in order
+FIELDS = ('datestr', 'timestr', 'rooted', 'path', 'name', 'epoch',
+          'lat', 'lon', 'alt', 'orientation', 'serial', 'utc', 'alternates')
+
+class trackpoint():
+    """
+    One trackpoint from a GPX file
+    """
+    __slots__ = ('epoch', 'source', 'lat', 'lon', 'ele', 'time', 'fix',
+                 'sat', 'hdop')
+
+    def __init__(self, epoch, source, lat, lon, ele, time, fix, sat, hdop):
+        """
+        Arguments:
+        epoch: the time of the point in seconds since 1970-01-01 UTC
+        source: index of the GPX file in the list being merged
+        lat, lon: position in decimal degrees, as the original text
+        ele: elevation in metres as the original text, or ''
+        time: the original GPX time text
+        fix: the GPX fix type, or '' if not recorded
+        sat: the number of satellites as text, or ''
+        hdop: horizontal dilution of precision as text, or ''
+        """
+        self.epoch = epoch
+        self.source = source
+        self.lat = lat
+        self.lon = lon
+        self.ele = ele
+        self.time = time
+        self.fix = fix
+        self.sat = sat
+        self.hdop = hdop
+
+    def day(self):
+        """
+        Return the UTC date of the point as YYYY-MM-DD
+        """
+        return time.strftime('%Y-%m-%d', time.gmtime(self.epoch))
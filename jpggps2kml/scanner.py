@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 20:58:03 2026
+Copyright (C) 2016 Russell O. Redman
+
+Discovery of the JPEG and GPX files to be processed.
+
+Only the standard library is used, so that commands which do no more than
+list files start quickly.
+
+@author: russell
+@email: russell@roredman.ca
+"""
+
+import os
+import os.path
+
+from . import profiling
+
+JPEG_EXTENSIONS = ('.jpg', '.JPG', '.jpeg', '.JPEG')
+GPX_EXTENSIONS = ('.gpx', '.GPX')
+
+# Number of JPEG files whose EXIF metadata are requested from exiftool at once
+CHUNKSIZE = 256
+
+def listjpeg(directory, profile=None):
+    """
+    Return a sorted list of (filename, filebase) tuples for the JPEG files
+    in directory, counted in the discovery stage of profile if given.
+    """
+    if profile is None:
+        profile = profiling.stageprofile()
+    with profile.stage('discovery') as sc:
+        jpeglist = []
+        nbytes = 0
+        with os.scandir(directory) as it:
+            for entry in it:
+                fbase, fext = os.path.splitext(entry.name)
+                if fext in JPEG_EXTENSIONS:
+                    jpeglist.append((entry.name, fbase))
+                    if profile.enabled:
+                        nbytes += entry.stat().st_size
+        jpeglist.sort()
+        sc.add(files=len(jpeglist), nbytes=nbytes)
+    return jpeglist
+
+def dirchunks(directory, chunksize=CHUNKSIZE, profile=None):
+    """
+    Return the JPEG files in directory as a list of chunks of at most
+    chunksize (jpegdisk, jpegrooted, jpegbase) tuples, where jpegrooted is
+    the path relative to the parent of directory.
+    """
+    basedir = os.path.basename(directory)
+    jpeglist = [(os.path.join(directory, f),
+                 os.path.join(basedir, f),
+                 jpegbase) for f, jpegbase in listjpeg(directory, profile)]
+    return [jpeglist[c:c + chunksize]
+            for c in range(0, len(jpeglist), chunksize)]
+
+def jpegfiles(files, dirs, profile=None):
+    """
+    Iterate over (filepath, filebase) for the JPEG files named in files and
+    those found in each of dirs
+    """
+    for f in files:
+        fb, fe = os.path.splitext(f)
+        if fe.lower() in ('.jpg', '.jpeg'):
+            yield (f, os.path.basename(fb))
+
+    for d in dirs:
+        for f, fb in listjpeg(d, profile):
+            yield (os.path.join(d, f), fb)
+
+def gpxfiles(gpxdirs, files=(), profile=None):
+    """
+    Return a list of (abspath, basename) tuples of the GPX files in each of
+    gpxdirs, followed by those named in files
+    """
+    if profile is None:
+        profile = profiling.stageprofile()
+    gpxlist = []
+    with profile.stage('discovery') as sc:
+        for gpxdir in gpxdirs:
+            for f in os.listdir(gpxdir):
+                fbase, fext = os.path.splitext(f)
+                if fext in GPX_EXTENSIONS:
+                    gpxlist.append((os.path.join(gpxdir, f), fbase))
+        sc.add(files=len(gpxlist))
+
+    for f in files:
+        fbase, fext = os.path.splitext(f)
+        if fext in GPX_EXTENSIONS and os.path.isfile(f):
+            gpxlist.append((f, os.path.basename(fbase)))
+    return gpxlist
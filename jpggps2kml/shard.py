@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 23:20:44 2026
+Copyright (C) 2016 Russell O. Redman
+
+Fragments of a KML document built on several hosts, and their merge.
+
+makekml --shard runs over the directories held on one storage node and
+writes a fragment rather than a KML document.  A fragment is a text file of
+JSON lines (gzip compressed if its name ends in .gz):
+    a header {"format": FORMAT, "tracks": ntracks, "images": nimages}
+    ntracks lines [begin, trackname, placemark text], sorted by the
+        earliest gx:when of the track and its name
+    nimages lines holding the fields of an imagerecord (see
+        records.FIELDS),
+        sorted by date, time and rooted path
+The placemark text of a track is serialized as it would be inside the
+tracks folder of the document.  The image lines keep the normalized
+metadata rather than placemark text, so --url and --phototracks are
+applied when the fragments are merged.
+
+mergekml reads every fragment once, merging the sorted tracks and then the
+sorted images of all the fragments in a single streaming k-way pass (the
+images are read a second time first if --phototracks is given).  The line
+style of each track is reassigned in output order, so the colours cycle
+through the whole document exactly as they would in a single run.
+
+@author: russell
+@email: russell@roredman.ca
+"""
+
+import heapq
+import io
+import json
+
+from . import kml
+from . import kmlwriter
+from . import output
+from . import records
+
+FORMAT = 'jpggps2kml fragment 2'
+
+# Image lines serialized at a time
+CHUNKSIZE = 256
+
+def track_lines(trackfolder):
+    """
+    Return the sorted [begin, trackname, text] lines for the track
+    Placemarks in trackfolder
+    """
+    result = []
+    for name, pm in kml.placemarks(trackfolder).items():
+        begin = pm.findtext('.//' + kml.GXNS + 'when') or ''
+        result.append([begin,
+                       name,
+                       kml.placemark_text(pm, kmlwriter.INDENT)])
+    result.sort(key=lambda t: (t[0], t[1]))
+    return result
+
+def write(path, trackfolder, imagerecords, profile):
+    """
+    Write a fragment holding the tracks in trackfolder and the imagerecords.
+
+    Arguments:
+    path: the fragment file, written atomically
+    trackfolder: a KML.Folder holding the track Placemarks of this shard
+    imagerecords: an extsort.recordsorter holding the imagerecords of the
+        located images
+    profile: the stageprofile charged with the work
+    """
+    with profile.stage('serialize', points=len(imagerecords)):
+        tracks = track_lines(trackfolder)
+
+    with output.atomicwriter(path) as out:
+        text = json.dumps({'format': FORMAT,
+                           'tracks': len(tracks),
+                           'images': len(imagerecords)}) + '\n'
+        text += ''.join(json.dumps(t) + '\n' for t in tracks)
+        with profile.stage('write', nbytes=len(text)):
+            out.write(text)
+        for chunk in imagerecords.chunks(CHUNKSIZE):
+            with profile.stage('serialize'):
+                text = ''.join([json.dumps(r.fields()) + '\n'
+                                for r in chunk])
+            with profile.stage('write', nbytes=len(text)):
+                out.write(text)
+
+class fragment():
+    """
+    A fragment opened for reading, its tracks first and then its images
+    """
+    def __init__(self, path):
+        """
+        Open the fragment at path and read its header, raising ValueError
+        if it is not a fragment
+        """
+        self.path = path
+        self.f = io.TextIOWrapper(output.openread(path), encoding='utf-8')
+        try:
+            header = json.loads(self.f.readline())
+        except ValueError:
+            header = None
+        if not isinstance(header, dict) or header.get('format') != FORMAT:
+            self.f.close()
+            raise ValueError(path + ' is not a jpggps2kml fragment')
+        self.ntracks = header['tracks']
+        self.nimages = header['images']
+        self.unread = self.ntracks
+
+    def _malformed(self):
+        """
+        Return the ValueError raised for a line that cannot be read
+        """
+        return ValueError(self.path + ' holds a malformed line')
+
+    def tracks(self):
+        """
+        Iterate over the (begin, trackname, text) tuples of the tracks,
+        raising ValueError if a line is malformed
+        """
+        while self.unread:
+            self.unread -= 1
+            try:
+                t = json.loads(self.f.readline())
+            except ValueError:
+                raise self._malformed() from None
+            if not isinstance(t, list) or len(t) != 3:
+                raise self._malformed()
+            yield tuple(t)
+
+    def images(self):
+        """
+        Iterate over the imagerecords, which follow the tracks; any tracks
+        not yet read are skipped.  Raise ValueError if a line is malformed.
+        """
+        while self.unread:
+            self.unread -= 1
+            self.f.readline()
+        for line in self.f:
+            try:
+                r = records.imagerecord.from_fields(json.loads(line))
+            except (TypeError, ValueError):
+                raise self._malformed() from None
+            yield r
+
+    def close(self):
+        self.f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+        return False
+
+def merged_tracks(fragments):
+    """
+    Iterate over the (begin, trackname, text) tuples of every fragment in
+    begin and trackname order, dropping later tracks with a name already
+    seen
+    """
+    seen = set()
+    for t in heapq.merge(*[f.tracks() for f in fragments],
+                         key=lambda t: (t[0], t[1])):
+        if t[1] not in seen:
+            seen.add(t[1])
+            yield t
+
+def merged_images(fragments):
+    """
+    Iterate over the imagerecords of every fragment in date, time and path
+    order, dropping repeats of the same image from overlapping shards
+    """
+    last = None
+    for r in heapq.merge(*[f.images() for f in fragments],
+                         key=records.imagerecord.sortkey):
+        key = r.sortkey()
+        if key != last:
+            last = key
+            yield r
@@ -0,0 +1,7 @@
+# -*- coding: utf-8 -*-
+"""
+Tests for the jpggps2kml package, run with
+    python -m pytest jpggps2kml/test
+
+@author: russell
+"""
@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Wed Oct 21 09:14:02 2026
+Copyright (C) 2016 Russell O. Redman
+
+Helpers shared by the tests that run whole commands.
+
+The commands are run in-process on a small synthetic corpus from
+benchmarks/corpus.py, with benchmarks/fakeexiftool.py standing in for the
+exiftool executable, so that the tests need neither real images nor an
+exiftool installation.
+
+@author: russell
+@email: russell@roredman.ca
+"""
+
+import os.path
+import sys
+from unittest import mock
+
+BENCHMARKS = os.path.join(
+                 os.path.dirname(
+                     os.path.dirname(
+                         os.path.dirname(os.path.abspath(__file__)))),
+                 'benchmarks')
+if BENCHMARKS not in sys.path:
+    sys.path.insert(0, BENCHMARKS)
+
+import corpus
+import fakeexiftool
+
+from jpggps2kml import jpggps2kml
+from jpggps2kml import metadata
+
+def make_corpus(root, n=60, days=3, gpx_points=200):
+    """
+    Write a corpus of n images over the given number of days in root and
+    return the list of day directories
+    """
+    return corpus.generate(root, n, days=days, gpx_points=gpx_points)
+
+def run(command, argv):
+    """
+    Run a jpggps2kml command, such as 'makekml', with the command line
+    arguments in argv and the stand-in for exiftool, returning the
+    jpggps2kml object
+    """
+    jpggps = jpggps2kml.jpggps2kml()
+    with mock.patch.object(sys, 'argv', [command] + list(argv)), \
+            mock.patch.object(metadata, 'EXIFTOOL',
+                              [sys.executable,
+                               os.path.abspath(fakeexiftool.__file__)]):
+        getattr(jpggps, command)()
+    return jpggps
+
+def read(path):
+    """
+    Return the contents of a file as text
+    """
+    with open(path, encoding='utf-8') as f:
+        return f.read()
@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Wed Oct 21 11:37:12 2026
+Copyright (C) 2016 Russell O. Redman
+
+The external sort of the imagerecords, forced to spill by a tiny budget.
+
+@author: russell
+@email: russell@roredman.ca
+"""
+
+import os.path
+import random
+import tempfile
+import unittest
+from unittest import mock
+
+from jpggps2kml import extsort
+from jpggps2kml import records
+from jpggps2kml.test import common
+
+def record(i, rng):
+    """
+    Return an imagerecord with a random date and time, many of them
+    repeated so that the paths decide the order
+    """
+    day = rng.randrange(1, 4)
+    second = rng.randrange(20)
+    return records.imagerecord('/trip/{0:04d}.JPG'.format(i),
+                               'trip/{0:04d}.JPG'.format(i),
+                               '{0:04d}.JPG'.format(i),
+                               1451606400.0 + 86400 * day + second,
+                               '2016-01-{0:02d}'.format(day),
+                               '10:00:{0:02d}'.format(second),
+                               49.0 + i * 1.0e-4,
+                               -123.0,
+                               10.0,
+                               i % 8 + 1,
+                               'SN{0}'.format(i % 3))
+
+class TestRecordSorter(unittest.TestCase):
+    def test_spilled_runs_match_sorted(self):
+        rng = random.Random(1)
+        recs = [record(i, rng) for i in range(1000)]
+        rng.shuffle(recs)
+
+        sorter = extsort.recordsorter(limit=64)
+        for c in range(0, len(recs), 50):
+            sorter.add(recs[c:c + 50])
+        self.assertGreater(len(sorter.runs), 1)
+        self.assertEqual(len(sorter), len(recs))
+
+        expected = [r.fields() for r in
+                    sorted(recs, key=records.imagerecord.sortkey)]
+        self.assertEqual([r.fields() for r in sorter.sorted()], expected)
+        # sorted() can be called again once the first pass is done
+        self.assertEqual([r.fields() for c in sorter.chunks(7) for r in c],
+                         expected)
+        sorter.close()
+
+class TestSortMemory(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dirs = common.make_corpus(os.path.join(self.tmp.name, 'trip'))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_tiny_sort_memory(self):
+        expected = os.path.join(self.tmp.name, 'expected.kml')
+        common.run('makekml', ['-v', 'quiet', '--phototracks', 'day',
+                               '--out', expected] + self.dirs)
+
+        spilled = os.path.join(self.tmp.name, 'spilled.kml')
+        with mock.patch.object(extsort.recordsorter, 'spill', autospec=True,
+                               side_effect=extsort.recordsorter.spill) \
+                as spill:
+            common.run('makekml', ['-v', 'quiet', '--phototracks', 'day',
+                                   '--sort-memory', '0.01',
+                                   '--out', spilled] + self.dirs)
+        self.assertGreater(spill.call_count, 1)
+        self.assertEqual(common.read(spilled), common.read(expected))
+
+if __name__ == '__main__':
+    unittest.main()
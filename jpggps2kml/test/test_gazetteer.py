@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 25 10:42:17 2026
+Copyright (C) 2016 Russell O. Redman
+
+The nearest place within --gazetteer-radius, and gazetteers read from .zip
+files.
+
+@author: russell
+@email: russell@roredman.ca
+"""
+
+import csv
+import io
+import os.path
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+import zipfile
+
+from jpggps2kml import gazetteer
+
+class TestGazetteer(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'places.csv')
+        # A grid of places over the Netherlands, about 5 km apart
+        with open(self.path, 'w', newline='') as f:
+            w = csv.writer(f)
+            w.writerow(['name', 'latitude', 'longitude', 'country_code'])
+            for i in range(50):
+                for j in range(50):
+                    w.writerow(['place {0} {1}'.format(i, j),
+                                51.0 + 0.045 * i,
+                                4.0 + 0.07 * j,
+                                'NL'])
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_radius(self):
+        index = gazetteer.gazetteer.load(self.path, 0)
+        self.assertEqual(len(index), 2500)
+        label, metres = index.nearest(51.0, 4.0)
+        self.assertEqual(label, 'place 0 0, NL')
+        self.assertLess(metres, 1.0)
+
+        # About 33 km south of the grid, within the default radius
+        label, metres = index.nearest(50.7, 4.0)
+        self.assertEqual(label, 'place 0 0, NL')
+        self.assertAlmostEqual(metres, 33360.0, delta=100.0)
+
+        # About 67 km south, beyond it
+        self.assertIsNone(index.nearest(50.4, 4.0))
+        self.assertEqual(index.nearest_many([50.7, 50.4, 51.0],
+                                            [4.0, 4.0, 4.0]),
+                         [index.nearest(50.7, 4.0), None,
+                          index.nearest(51.0, 4.0)])
+
+        # New York is far beyond the radius, and is given up once the rings
+        # of 0.2 degree cells searched reach 50 km
+        with mock.patch.object(gazetteer, '_bound',
+                               wraps=gazetteer._bound) as bound:
+            self.assertIsNone(index.nearest(40.71, -74.01))
+        self.assertLessEqual(bound.call_count, 4)
+        self.assertEqual(index.nearest_many([40.71], [-74.01]), [None])
+
+        index = gazetteer.gazetteer.load(self.path, 0, 100000.0)
+        label, metres = index.nearest(50.4, 4.0)
+        self.assertEqual(label, 'place 0 0, NL')
+        index = gazetteer.gazetteer.load(self.path, 0, None)
+        self.assertEqual(index.nearest(48.0, 4.0)[0], 'place 0 0, NL')
+
+    def test_zip(self):
+        archive = os.path.join(self.directory, 'places.zip')
+        with zipfile.ZipFile(archive, 'w') as z:
+            z.write(self.path, 'places.csv')
+        opened = []
+        openfile = io.open
+        def record(*args, **kwargs):
+            f = openfile(*args, **kwargs)
+            opened.append(f)
+            return f
+        with mock.patch('zipfile.io.open', side_effect=record):
+            places = list(gazetteer.read_places(archive))
+        self.assertEqual(places, list(gazetteer.read_places(self.path)))
+        self.assertTrue(opened)
+        self.assertTrue(all(f.closed for f in opened))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 26 09:12:40 2026
+Copyright (C) 2016 Russell O. Redman
+
+Tracks read from GPX logs whose trackpoints lack the optional <ele> or
+have no <time>, parsed and through --gpx-cache.
+
+@author: russell
+@email: russell@roredman.ca
+"""
+
+import glob
+import math
+import os.path
+import re
+import tempfile
+import unittest
+
+from jpggps2kml import gpx
+from jpggps2kml import gpxcache
+from jpggps2kml.test import common
+
+LOG = """<?xml version="1.0" encoding="UTF-8"?>
+<gpx version="1.1" creator="test" xmlns="http://www.topografix.com/GPX/1/1">
+<trk>
+<name>log</name>
+<trkseg>
+<trkpt lat="49.0000000" lon="-122.9700000"><ele>100.0</ele><time>2016-01-02T16:00:00Z</time></trkpt>
+<trkpt lat="49.0006282" lon="-122.9700148"><time>2016-01-02T16:03:00Z</time></trkpt>
+<trkpt lat="49.0012558" lon="-122.9700592"><ele>103.7</ele></trkpt>
+<!-- a logger comment -->
+<trkpt lat="49.0018822" lon="-122.9701331"><ele>105.6</ele><time>2016-01-02T16:09:00Z</time></trkpt>
+</trkseg>
+</trk>
+</gpx>
+"""
+
+class TestOptionalElements(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dirs = common.make_corpus(os.path.join(self.tmp.name, 'trip'),
+                                       n=3,
+                                       days=1)
+        self.path, = glob.glob(os.path.join(self.dirs[0], '*.gpx'))
+        with open(self.path, 'w') as f:
+            f.write(LOG)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_columns(self):
+        columns = gpxcache.trackcolumns.from_gpx(*gpx.parse(self.path))
+        self.assertEqual(columns.tracks, [['log', [3]]])
+        self.assertEqual(columns.count, 3)
+        self.assertEqual(columns.texts('coord')[1],
+                         '-122.9700148 49.0006282 0')
+        ele = columns.values('ele')
+        self.assertEqual(ele[0], 100.0)
+        self.assertTrue(math.isnan(ele[1]))
+
+    def test_makekml(self):
+        plain = os.path.join(self.tmp.name, 'plain.kml')
+        common.run('makekml', ['-v', 'quiet', '--out', plain] + self.dirs)
+        text = common.read(plain)
+        self.assertEqual(len(re.findall('<gx:when>', text)), 3)
+        self.assertIn('<gx:coord>-122.9700148 49.0006282 0</gx:coord>', text)
+
+        # Once to build the cache entry and once to read it
+        cache = os.path.join(self.tmp.name, 'cache')
+        cached = os.path.join(self.tmp.name, 'cached.kml')
+        for n in range(2):
+            common.run('makekml', ['-v', 'quiet', '--gpx-cache', cache,
+                                   '--out', cached] + self.dirs)
+            self.assertEqual(common.read(cached), text)
+
+if __name__ == '__main__':
+    unittest.main()
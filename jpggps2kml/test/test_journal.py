@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Wed Oct 21 10:02:19 2026
+Copyright (C) 2016 Russell O. Redman
+
+makekml --resume from a journal cut short by a crash.
+
+@author: russell
+@email: russell@roredman.ca
+"""
+
+import json
+import os.path
+import tempfile
+import unittest
+from unittest import mock
+
+from jpggps2kml import journal
+from jpggps2kml import metadata
+from jpggps2kml.test import common
+
+class TestResume(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dirs = common.make_corpus(os.path.join(self.tmp.name, 'trip'))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_resume_truncated_journal(self):
+        expected = os.path.join(self.tmp.name, 'expected.kml')
+        common.run('makekml', ['-v', 'quiet', '--out', expected] +
+                              self.dirs)
+
+        # Keep the whole journal of a run, as if it had died at the end
+        path = os.path.join(self.tmp.name, 'makekml.journal')
+        out = os.path.join(self.tmp.name, 'out.kml')
+        with mock.patch.object(journal.journal, 'remove',
+                               journal.journal.close):
+            common.run('makekml', ['-v', 'quiet', '--journal', path,
+                                   '--out', out] + self.dirs)
+        with open(path, 'rb') as f:
+            lines = f.readlines()
+        self.assertGreater(len(lines), 4)
+
+        # Cut it in the middle of the fourth line
+        with open(path, 'wb') as f:
+            f.write(b''.join(lines[:3]) + lines[3][:len(lines[3]) // 2])
+        entries = [json.loads(line) for line in lines[1:3]]
+        done = set()
+        for e in entries:
+            if 'dir' in e:
+                done.update(os.path.join(e['dir'], name)
+                            for name in os.listdir(e['dir'])
+                            if name.endswith('.JPG'))
+            else:
+                done.update(row[0] for row in e['chunk'])
+
+        os.remove(out)
+        with mock.patch.object(metadata, 'read_batch',
+                               wraps=metadata.read_batch) as read_batch:
+            common.run('makekml', ['-v', 'quiet', '--journal', path,
+                                   '--resume', 'True', '--out', out] +
+                                  self.dirs)
+        read = [p for c in read_batch.call_args_list for p in c.args[2]]
+
+        self.assertEqual(common.read(out), common.read(expected))
+        self.assertTrue(done)
+        self.assertFalse(done & set(read))
+        self.assertEqual(len(read), 60 - len(done))
+        # the journal is removed once the run completes
+        self.assertFalse(os.path.exists(path))
+
+if __name__ == '__main__':
+    unittest.main()
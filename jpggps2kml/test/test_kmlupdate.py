@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Wed Oct 21 09:31:47 2026
+Copyright (C) 2016 Russell O. Redman
+
+makekml --update, which streams the existing KML file through
+kmlupdate, against a full rebuild.
+
+@author: russell
+@email: russell@roredman.ca
+"""
+
+import os.path
+import re
+import tempfile
+import unittest
+
+from jpggps2kml import kmlwriter
+from jpggps2kml.test import common
+
+class TestUpdate(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dirs = common.make_corpus(os.path.join(self.tmp.name, 'trip'),
+                                       n=75,
+                                       days=5)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_update_matches_rebuild(self):
+        updated = os.path.join(self.tmp.name, 'updated.kml')
+        common.run('makekml', ['-v', 'quiet', '--out', updated] +
+                              self.dirs[:3])
+        common.run('makekml', ['-v', 'quiet', '--update', 'True', 
+                               '--out', updated] + self.dirs[3:])
+
+        rebuilt = os.path.join(self.tmp.name, 'rebuilt.kml')
+        common.run('makekml', ['-v', 'quiet', '--out', rebuilt] + self.dirs)
+
+        self.assertEqual(common.read(updated), common.read(rebuilt))
+
+    def test_replace_continues_colours(self):
+        path = os.path.join(self.tmp.name, 'replaced.kml')
+        common.run('makekml', ['-v', 'quiet', '--out', path] + self.dirs)
+        common.run('makekml', ['-v', 'quiet', '--update', 'True',
+                               '--replace', 'True', '--out', path,
+                               self.dirs[1]])
+
+        text = common.read(path)
+        tracks = text[:text.index('<Name>images</Name>')]
+        colours = [int(c) for c in kmlwriter.STYLEURL.findall(tracks)]
+        names = re.findall(r'<name>([^<]*)</name>', tracks)
+        self.assertEqual(len(colours), len(self.dirs))
+        # the replaced track moves to the end, after the colour of the
+        # last track kept
+        self.assertEqual(names[-1], os.path.basename(self.dirs[1]))
+        self.assertEqual(colours[-1], colours[-2] + 1)
+
+if __name__ == '__main__':
+    unittest.main()
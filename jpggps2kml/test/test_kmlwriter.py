@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 26 14:05:31 2026
+Copyright (C) 2016 Russell O. Redman
+
+Coordinates near zero written in fixed point, in image placemarks and in
+the gx:coord of photo tracks.
+
+@author: russell
+@email: russell@roredman.ca
+"""
+
+import unittest
+
+from jpggps2kml import kml
+from jpggps2kml import kmlwriter
+from jpggps2kml import phototracks
+
+class TestCoordinates(unittest.TestCase):
+    def test_placemark(self):
+        text = kmlwriter.placemark('near', '', 1e-05, -2.5e-06, 0.0001)
+        self.assertIn('<coordinates>0.0000100,-0.0000025,0.000</coordinates>',
+                      text)
+
+    def test_gxtrack(self):
+        columns = phototracks.photocolumns()
+        columns.lon.append(1e-05)
+        columns.lat.append(51.5)
+        columns.alt.append(-3e-05)
+        columns.when.append('2016-01-02T08:00:00')
+        track = columns.gxtrack([0])
+        self.assertEqual(track.findtext(kml.GXNS + 'coord'),
+                         '0.0000100 51.5000000 -0.000')
+
+if __name__ == '__main__':
+    unittest.main()
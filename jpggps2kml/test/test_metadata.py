@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Wed Oct 21 10:40:55 2026
+Copyright (C) 2016 Russell O. Redman
+
+Reading tags through an exiftool session.
+
+@author: russell
+@email: russell@roredman.ca
+"""
+
+import os
+import os.path
+import sys
+import tempfile
+import unittest
+from unittest import mock
+import xml.etree.ElementTree as ElementTree
+
+from jpggps2kml import index
+from jpggps2kml import metadata
+from jpggps2kml import normalize
+from jpggps2kml.test import common
+
+class TestSession(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dirs = common.make_corpus(os.path.join(self.tmp.name, 'trip'),
+                                       n=3,
+                                       days=1)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_non_utf8_name(self):
+        d = os.fsencode(self.dirs[0])
+        utf8 = os.fsdecode(os.path.join(d, b'IMG_000000.JPG'))
+        latin1 = os.fsdecode(os.path.join(d, b'caf\xe9.JPG'))
+        os.rename(os.path.join(d, b'IMG_000001.JPG'), os.fsencode(latin1))
+
+        with mock.patch.object(metadata, 'EXIFTOOL',
+                               [sys.executable,
+                                os.path.abspath(
+                                    common.fakeexiftool.__file__)]):
+            with metadata.exifsession(verbosity=0) as session:
+                taglist = session.get_tags_batch(normalize.GPS_ITEMS,
+                                                 [utf8, latin1])
+                self.assertEqual(session.failed, [])
+
+        self.assertEqual([t['SourceFile'] for t in taglist], [utf8, latin1])
+        self.assertTrue(all('EXIF:DateTimeOriginal' in t for t in taglist))
+
+    def test_non_utf8_name_makekml(self):
+        d = os.fsencode(self.dirs[0])
+        os.rename(os.path.join(d, b'IMG_000001.JPG'),
+                  os.path.join(d, b'caf\xe9.JPG'))
+        kmlpath = os.path.join(self.tmp.name, 'trip.kml')
+        for ext in ('.csv', '.sqlite'):
+            indexpath = os.path.join(self.tmp.name, 'index' + ext)
+            # The second run takes the other files from the index
+            for n in range(2):
+                common.run('makekml', ['-v', 'quiet', '--out', kmlpath,
+                                       '--index-out', indexpath] + self.dirs)
+                text = common.read(kmlpath)
+                ElementTree.fromstring(text.encode('utf-8'))
+                self.assertIn('<name>caf\ufffd</name>', text)
+                self.assertIn('/caf%E9.JPG"', text)
+
+                rows = index.metadataindex(indexpath)
+                rows.load()
+                self.assertEqual(
+                    sorted(os.path.basename(p) for p in rows.rows),
+                    ['IMG_000000.JPG', 'IMG_000002.JPG', 'caf\ufffd.JPG'])
+
+if __name__ == '__main__':
+    unittest.main()
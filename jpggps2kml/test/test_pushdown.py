@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Wed Oct 21 11:08:36 2026
+Copyright (C) 2016 Russell O. Redman
+
+The dates taken from the names of directories and GPX files to skip them
+without reading them.
+
+@author: russell
+@email: russell@roredman.ca
+"""
+
+import calendar
+import datetime
+import unittest
+
+from jpggps2kml import pushdown
+
+def epoch(*args):
+    return calendar.timegm(datetime.datetime(*args).timetuple())
+
+class TestNameRange(unittest.TestCase):
+    def test_dates(self):
+        day = (epoch(2016, 1, 2), epoch(2016, 1, 3))
+        for name in ('2016-01-02', '20160102', 'trip 2016_01_02 paris',
+                     'IMG_20160102_1234'):
+            self.assertEqual(pushdown._name_range(name), day, name)
+        self.assertEqual(pushdown._name_range('2016-01'),
+                         (epoch(2016, 1, 1), epoch(2016, 2, 1)))
+        self.assertEqual(pushdown._name_range('2016'),
+                         (epoch(2016, 1, 1), epoch(2017, 1, 1)))
+
+    def test_not_dates(self):
+        for name in ('EOS 2000D', 'Wallpapers 1920x1080', 'scans 1999',
+                     '201601', '2016-13', '2015-2016', 'IMG_0001'):
+            self.assertIsNone(pushdown._name_range(name), name)
+
+    def test_embedded_year_kept(self):
+        selection = pushdown.from_args({'from': '2020-01-01'})
+        for name in ('EOS 2000D', 'Wallpapers 1920x1080'):
+            self.assertTrue(selection.name_in_range(name), name)
+        self.assertFalse(selection.name_in_range('2016'))
+        self.assertFalse(selection.name_in_range('2019-12-01'))
+        self.assertTrue(selection.name_in_range('2019-12-31'))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 26 11:20:05 2026
+Copyright (C) 2016 Russell O. Redman
+
+mergekml over the fragments of makekml --shard, against a single run, and
+with a malformed fragment.
+
+@author: russell
+@email: russell@roredman.ca
+"""
+
+import os.path
+import tempfile
+import unittest
+from unittest import mock
+
+from jpggps2kml.test import common
+
+class TestMerge(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dirs = common.make_corpus(os.path.join(self.tmp.name, 'trip'),
+                                       n=60,
+                                       days=4)
+        self.fragments = []
+        for n, dirs in enumerate((self.dirs[:2], self.dirs[2:])):
+            path = os.path.join(self.tmp.name, 'host' + str(n) + '.frag')
+            common.run('makekml', ['-v', 'quiet', '--shard', 'True',
+                                   '--out', path] + dirs)
+            self.fragments.append(path)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_merge_matches_single_run(self):
+        merged = os.path.join(self.tmp.name, 'merged.kml')
+        common.run('mergekml', ['-v', 'quiet', '--phototracks', 'day',
+                                '--out', merged] + self.fragments)
+        single = os.path.join(self.tmp.name, 'single.kml')
+        common.run('makekml', ['-v', 'quiet', '--phototracks', 'day',
+                               '--out', single] + self.dirs)
+        self.assertEqual(common.read(merged), common.read(single))
+
+    def test_malformed_fragment(self):
+        with open(self.fragments[1]) as f:
+            lines = f.readlines()
+        # Cut the last image line short
+        lines[-1] = lines[-1][:len(lines[-1]) // 2] + '\n'
+        with open(self.fragments[1], 'w') as f:
+            f.writelines(lines)
+
+        merged = os.path.join(self.tmp.name, 'merged.kml')
+        for phototracks in ([], ['--phototracks', 'day']):
+            with mock.patch('sys.stderr') as stderr, \
+                    self.assertRaises(SystemExit):
+                common.run('mergekml', ['-v', 'quiet', '--out', merged] +
+                                       phototracks + self.fragments)
+            message = ''.join(c.args[0] for c in stderr.write.call_args_list)
+            self.assertIn('ERROR: ' + self.fragments[1], message)
+            self.assertFalse(os.path.exists(merged))
+
+if __name__ == '__main__':
+    unittest.main()
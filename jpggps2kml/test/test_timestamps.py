@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 26 15:31:48 2026
+Copyright (C) 2016 Russell O. Redman
+
+EXIF date time strings, with and without a fraction, offset or 'Z' suffix.
+
+@author: russell
+@email: russell@roredman.ca
+"""
+
+import datetime
+import unittest
+
+from jpggps2kml import timestamps
+
+class TestParseDatetime(unittest.TestCase):
+    def setUp(self):
+        timestamps.clear_caches()
+
+    def test_suffix(self):
+        plus2 = datetime.timezone(datetime.timedelta(hours=2))
+        for text, expected in (
+                ('2016:01:02 12:00:00',
+                 datetime.datetime(2016, 1, 2, 12)),
+                ('2016:01:02 12:00:00.5',
+                 datetime.datetime(2016, 1, 2, 12, 0, 0, 500000)),
+                ('2016:01:02 12:00:00.5+02:00',
+                 datetime.datetime(2016, 1, 2, 12, 0, 0, 500000, plus2)),
+                ('2016:01:02 12:00:00+02:00',
+                 datetime.datetime(2016, 1, 2, 12, 0, 0, 0, plus2)),
+                ('2016:01:02 12:00:00.25Z',
+                 datetime.datetime(2016, 1, 2, 12, 0, 0, 250000,
+                                   timestamps.UTC)),
+                ('2016:01:02 12:00:00.5 ',
+                 datetime.datetime(2016, 1, 2, 12, 0, 0, 500000))):
+            dt = timestamps.parse_datetime(text)
+            self.assertEqual(dt, expected, text)
+            self.assertEqual(dt.tzinfo, expected.tzinfo, text)
+
+    def test_unset(self):
+        self.assertIsNone(timestamps.parse_datetime('0000:00:00 00:00:00'))
+        self.assertIsNone(timestamps.parse_datetime('2016:01:02 12:00:00.5x'))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Wed Oct 21 13:26:50 2026
+Copyright (C) 2016 Russell O. Redman
+
+The conversion of image times to UTC with --tz-boundaries, and the
+selection of images by --from and --to once they are converted.
+
+@author: russell
+@email: russell@roredman.ca
+"""
+
+import calendar
+import datetime
+import json
+import os.path
+import tempfile
+import unittest
+
+from jpggps2kml import jpggps2kml
+from jpggps2kml import normalize
+from jpggps2kml import pushdown
+from jpggps2kml import tzindex
+
+def epoch(*args):
+    return calendar.timegm(datetime.datetime(*args).timetuple())
+
+def tags(offset=None):
+    """
+    Return the tags of an image taken at 08:00 on 2016-01-02 in Tokyo, with
+    OffsetTimeOriginal if offset is given
+    """
+    result = {'EXIF:DateTimeOriginal': '2016:01:02 08:00:00',
+              'Composite:GPSLatitude': 35.68,
+              'Composite:GPSLongitude': 139.69}
+    if offset is not None:
+        result['EXIF:OffsetTimeOriginal'] = offset
+    return result
+
+class TestToUTC(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        path = os.path.join(self.tmp.name, 'tokyo.json')
+        box = [[120.0, 20.0], [150.0, 20.0], [150.0, 50.0], [120.0, 50.0],
+               [120.0, 20.0]]
+        with open(path, 'w') as f:
+            json.dump({'type': 'FeatureCollection',
+                       'features': [{'type': 'Feature',
+                                     'properties': {'tzid': 'Asia/Tokyo'},
+                                     'geometry': {'type': 'Polygon',
+                                                  'coordinates': [box]}}]},
+                      f)
+        self.index = tzindex.tzindex.load(path, 0)
+        # the first has no offset, so it is in camera time
+        self.taglist = [tags(), tags('+00:00'), tags('Z'), tags('+09:00')]
+        self.jpeglist = [('/trip/{0}.JPG'.format(i),
+                          'trip/{0}.JPG'.format(i),
+                          '{0}.JPG'.format(i))
+                         for i in range(len(self.taglist))]
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_offset_recorded(self):
+        batch = normalize.normalize_tags(self.taglist)
+        self.assertEqual(list(batch.utc), [0, 1, 1, 1])
+        records = batch.records(self.jpeglist)
+        self.index.to_utc(records)
+        self.assertEqual([r.epoch for r in records],
+                         [epoch(2016, 1, 1, 23),
+                          epoch(2016, 1, 2, 8),
+                          epoch(2016, 1, 2, 8),
+                          epoch(2016, 1, 1, 23)])
+        self.assertTrue(all(r.utc for r in records))
+
+    def test_from_in_utc(self):
+        jpggps = jpggps2kml.jpggps2kml()
+        jpggps.verbosity = 0
+        jpggps.selection = pushdown.from_args({'from': '2016-01-02'})
+        batch = normalize.normalize_tags(self.taglist)
+
+        # as recorded, every image was taken on 2016-01-02
+        self.assertEqual(len(jpggps.image_records(self.jpeglist, batch)), 4)
+
+        # in UTC, the images taken at 08:00 in Tokyo were taken on
+        # 2016-01-01
+        jpggps.tzindex = self.index
+        records = jpggps.image_records(self.jpeglist, batch)
+        self.assertEqual([r.name for r in records], ['1.JPG', '2.JPG'])
+
+if __name__ == '__main__':
+    unittest.main()
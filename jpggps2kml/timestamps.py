@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 10:02:17 2026
+Copyright (C) 2016 Russell O. Redman
+
+Parsing of the EXIF and GPS date/time strings used throughout jpggps2kml.
+
+The canonical EXIF form "YYYY:MM:DD HH:MM:SS[.fff]" is decoded by slicing at
+fixed offsets, falling back to precompiled regular expressions for anything
+else (ISO 8601 from the command line, stray whitespace, truncated values).
+Burst shooting produces many identical timestamps, so the parsers are
+memoized in bounded caches.
+
+@author: russell
+@email: russell@roredman.ca
+"""
+
+import calendar
+import datetime
+import functools
+import re
+
+# Upper bound on the number of distinct strings remembered by each parser
+CACHESIZE = 4096
+
+# YYYY[-:]MM[-:]DD[ Tt]HH:MM:SS[.fff][Z|+HH:MM]
+DATETIME_RE = re.compile(r'\s*(\d{4})[-:](\d{2})[-:](\d{2})[ Tt]+'
+                         r'(\d{1,2}):(\d{2}):(\d{2})(\.\d*)?\s*'
+                         r'(Z|[-+]\d{2}:?\d{2})?\s*$')
+DATE_RE = re.compile(r'\s*(\d{4})[-:](\d{2})[-:](\d{2})\s*$')
+TIME_RE = re.compile(r'\s*(\d{1,2}):(\d{1,2}):(\d{1,2})(\.\d*)?\s*'
+                     r'(Z|[-+]\d{2}:?\d{2})?\s*$')
+OFFSET_RE = re.compile(r'\s*([-+])(\d{2}):?(\d{2})(?::?(\d{2}))?\s*$')
+
+UTC = datetime.timezone.utc
+
+def _fraction(text):
+    """
+    Convert a fractional second string like '.5' or '50' (SubSecTime, which
+    omits the decimal point) into integer microseconds.
+    """
+    digits = text.lstrip('.')
+    if not digits or not digits.isdigit():
+        return 0
+    return int((digits + '000000')[:6])
+
+@functools.lru_cache(maxsize=CACHESIZE)
+def parse_offset(text):
+    """
+    Parse a UTC offset like "+07:00", "-0800", "+05:30:15" or "Z" (the
+    OffsetTimeOriginal tag, or the --geosync argument) into a
+    datetime.timezone.  Return None if the text is not an offset.
+    """
+    if text is None:
+        return None
+    if text.strip() in ('Z', 'z'):
+        return UTC
+    m = OFFSET_RE.match(text)
+    if not m:
+        return None
+    sign, hh, mm, ss = m.groups()
+    delta = datetime.timedelta(hours=int(hh),
+                               minutes=int(mm),
+                               seconds=int(ss) if ss else 0)
+    if sign == '-':
+        delta = -delta
+    return datetime.timezone(delta)
+
+@functools.lru_cache(maxsize=CACHESIZE)
+def parse_datetime(text):
+    """
+    Parse an EXIF or ISO 8601 date time string into a datetime.  The result
+    is naive unless the string carries its own offset or 'Z' suffix.
+    Return None if the string cannot be parsed (exiftool reports unset
+    dates as "0000:00:00 00:00:00").
+    """
+    if not text:
+        return None
+    try:
+        # Fast path for the canonical EXIF layout
+        #  0123456789012345678
+        # "YYYY:MM:DD HH:MM:SS[.fff]"
+        # taken only when nothing follows the fraction; an offset or 'Z'
+        # suffix is left to the regular expression
+        if (len(text) >= 19 and text[4] == ':' and text[7] == ':' and
+                text[10] == ' ' and text[13] == ':' and text[16] == ':' and
+                (len(text) == 19 or
+                 (text[19] == '.' and text[20:].isdigit()))):
+            return datetime.datetime(int(text[0:4]),
+                                     int(text[5:7]),
+                                     int(text[8:10]),
+                                     int(text[11:13]),
+                                     int(text[14:16]),
+                                     int(text[17:19]),
+                                     _fraction(text[19:]))
+    except ValueError:
+        return None
+
+    m = DATETIME_RE.match(text)
+    if not m:
+        return None
+    g = m.groups()
+    try:
+        dt = datetime.datetime(int(g[0]), int(g[1]), int(g[2]),
+                               int(g[3]), int(g[4]), int(g[5]),
+                               _fraction(g[6]) if g[6] else 0)
+    except ValueError:
+        return None
+    if g[7]:
+        dt = dt.replace(tzinfo=parse_offset(g[7]))
+    return dt
+
+@functools.lru_cache(maxsize=CACHESIZE)
+def parse_gps_datetime(datestamp, timestamp):
+    """
+    Combine the EXIF GPSDateStamp ("YYYY:MM:DD") and GPSTimeStamp
+    ("HH:MM:SS[.ff]") into a UTC-aware datetime, or None if either part
+    is missing or malformed.
+    """
+    if not datestamp or not timestamp:
+        return None
+    md = DATE_RE.match(datestamp)
+    mt = TIME_RE.match(str(timestamp))
+    if not md or not mt:
+        return None
+    try:
+        return datetime.datetime(int(md.group(1)),
+                                 int(md.group(2)),
+                                 int(md.group(3)),
+                                 int(mt.group(1)),
+                                 int(mt.group(2)),
+                                 int(mt.group(3)),
+                                 _fraction(mt.group(4)) if mt.group(4) else 0,
+                                 tzinfo=UTC)
+    except ValueError:
+        return None
+
+def exif_datetime(tags, which='Original'):
+    """
+    Return the DateTime<which> tag from an exiftool tag dictionary as a
+    datetime, including the SubSecTime<which> fraction and, if recorded, the
+    OffsetTime<which> timezone (which makes the result timezone-aware).
+
+    Arguments:
+    tags: dictionary keyed by group:tag as returned by ExifTool.get_tags()
+    which: 'Original', 'Digitized' or '' for the DateTime tag family
+    """
+    dt = parse_datetime(tags.get('EXIF:DateTime' + which))
+    if dt is None:
+        return None
+
+    subsec = tags.get('EXIF:SubSecTime' + which)
+    if subsec is not None and not dt.microsecond:
+        dt = dt.replace(microsecond=_fraction(str(subsec).strip()))
+
+    offset = tags.get('EXIF:OffsetTime' + which)
+    if offset and dt.tzinfo is None:
+        tz = parse_offset(offset)
+        if tz is not None:
+            dt = dt.replace(tzinfo=tz)
+    return dt
+
+def gps_datetime(tags):
+    """
+    Return the UTC datetime recorded by the GPS receiver in GPSDateStamp and
+    GPSTimeStamp, or None if it is not available.
+    """
+    return parse_gps_datetime(tags.get('EXIF:GPSDateStamp'),
+                              tags.get('EXIF:GPSTimeStamp'))
+
+def to_epoch(dt):
+    """
+    Convert a datetime into seconds since 1970-01-01.  Naive datetimes are
+    read as camera clock time with no timezone correction.
+    """
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(UTC)
+    return (calendar.timegm((dt.year, dt.month, dt.day,
+                             dt.hour, dt.minute, dt.second)) +
+            dt.microsecond * 1.0e-6)
+
+def clear_caches():
+    """
+    Release the memoized parse results
+    """
+    parse_offset.cache_clear()
+    parse_datetime.cache_clear()
+    parse_gps_datetime.cache_clear()
@@ -0,0 +1,280 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 18:37:52 2026
+Copyright (C) 2016 Russell O. Redman
+
+Track statistics and the removal of GPS glitches from tracks.
+
+Loggers often record a few points kilometres away while they acquire a fix
+after a cold start, or a single wild point later on.  Each step between
+consecutive points of a segment has a haversine distance, a time delta and
+so a speed, and a step is impossible if its speed exceeds --max-speed, or
+if it is faster than either of its neighbours by more than --max-accel
+allows in the time between them.  The points responsible are then dropped:
+    a point between two impossible steps (a spike)
+    the first or last point of the segment, if the step to it is impossible
+    failing those, every run of fewer than MINRUN points between impossible
+        steps, except the longest run of the segment (a cluster recorded
+        before the fix)
+and the steps are measured again, until none is impossible or nothing more
+can be dropped.
+
+The statistics of each track are its distance, the time from its first to
+its last point, the time spent in steps faster than MOVING, and its highest
+speed.  With numpy installed every step of a segment is computed at once
+over the memory-mapped columns of the GPX cache; otherwise the same
+arithmetic runs in a Python loop.
+
+@author: russell
+@email: russell@roredman.ca
+"""
+
+import math
+
+# Mean radius of the Earth in metres
+EARTH_RADIUS = 6371008.8
+
+# Speed in metres per second above which a step counts as moving
+MOVING = 0.5
+
+# Points in the shortest run kept between two impossible steps
+MINRUN = 5
+
+# Limit on the passes made over a segment by clean()
+PASSES = 20
+
+def optional_numpy():
+    """
+    Return the numpy module, or None if it is not installed
+    """
+    try:
+        import numpy
+    except ImportError:
+        return None
+    return numpy
+
+def _gather(np, epoch, lat, lon, rows):
+    """
+    Return the epoch, lat and lon values of rows as numpy arrays, or as
+    lists if np is None
+    """
+    if np is None:
+        return ([epoch[i] for i in rows],
+                [lat[i] for i in rows],
+                [lon[i] for i in rows])
+    if isinstance(rows, range):
+        index = slice(rows.start, rows.stop)
+    else:
+        index = np.asarray(rows, dtype=np.intp)
+    return tuple(np.frombuffer(c, dtype=np.float64)[index]
+                 if not isinstance(c, np.ndarray) else c[index]
+                 for c in (epoch, lat, lon))
+
+def _steps(np, t, la, lo):
+    """
+    Return the distance in metres, the time in seconds and the speed in
+    metres per second of each step between consecutive points.  A step
+    that covers a distance in no time has an infinite speed, and one with
+    a missing or backward time has a NaN speed.
+    """
+    if np is None:
+        dist = []
+        dt = []
+        v = []
+        for k in range(len(t) - 1):
+            p1 = math.radians(la[k])
+            p2 = math.radians(la[k + 1])
+            a = (math.sin((p2 - p1) / 2) ** 2 +
+                 math.cos(p1) * math.cos(p2) *
+                 math.sin(math.radians(lo[k + 1] - lo[k]) / 2) ** 2)
+            d = 2 * EARTH_RADIUS * math.asin(math.sqrt(min(a, 1.0)))
+            s = t[k + 1] - t[k]
+            dist.append(d)
+            dt.append(s)
+            if s > 0:
+                v.append(d / s)
+            elif s == 0:
+                v.append(math.inf if d > 0 else 0.0)
+            else:
+                v.append(math.nan)
+        return dist, dt, v
+    p = np.radians(la)
+    a = (np.sin(np.diff(p) / 2) ** 2 +
+         np.cos(p[:-1]) * np.cos(p[1:]) *
+         np.sin(np.radians(np.diff(lo)) / 2) ** 2)
+    dist = 2 * EARTH_RADIUS * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+    dt = np.diff(t)
+    v = np.full(len(dt), np.nan)
+    v[dt == 0] = np.where(dist[dt == 0] > 0, np.inf, 0.0)
+    np.divide(dist, dt, out=v, where=dt > 0)
+    return dist, dt, v
+
+def _impossible(np, dt, v, max_speed, max_accel):
+    """
+    Return a flag for each step that is faster than max_speed, or faster
+    than either neighbour by more than max_accel allows (0 for no limit)
+    """
+    m = len(v)
+    if np is None:
+        def jump(k, j):
+            span = (dt[k] + dt[j]) / 2
+            return span > 0 and (v[k] - v[j]) / span > max_accel
+
+        bad = [max_speed > 0 and s > max_speed for s in v]
+        if max_accel > 0 and m > 1:
+            for k in range(m):
+                if ((k > 0 and jump(k, k - 1)) or
+                        (k < m - 1 and jump(k, k + 1))):
+                    bad[k] = True
+        return bad
+    with np.errstate(invalid='ignore', divide='ignore'):
+        bad = v > max_speed if max_speed > 0 else np.zeros(m, dtype=bool)
+        if max_accel > 0 and m > 1:
+            mid = (dt[:-1] + dt[1:]) / 2
+            rise = (np.diff(v) / mid > max_accel) & (mid > 0)
+            fall = (-np.diff(v) / mid > max_accel) & (mid > 0)
+            # a step is a jump if it rises from the step before it or
+            # falls to the step after it
+            bad[1:] |= rise
+            bad[:-1] |= fall
+    return bad
+
+def _dropped(np, bad):
+    """
+    Return a flag for each point that is dropped for the impossible steps
+    flagged in bad, as described above
+    """
+    m = len(bad)
+    if np is None:
+        drop = [False] + [bad[k - 1] and bad[k] for k in range(1, m)] + \
+               [False]
+        drop[0] = bad[0] and (m == 1 or not bad[1])
+        drop[m] = bad[m - 1] and m > 1 and not bad[m - 2]
+        if any(drop):
+            return drop
+        cuts = [0] + [k + 1 for k in range(m) if bad[k]] + [m + 1]
+        lengths = [cuts[j + 1] - cuts[j] for j in range(len(cuts) - 1)]
+        longest = lengths.index(max(lengths))
+        drop = []
+        for j, n in enumerate(lengths):
+            drop.extend([n < MINRUN and j != longest] * n)
+        return drop
+    drop = np.zeros(m + 1, dtype=bool)
+    drop[1:-1] = bad[:-1] & bad[1:]
+    drop[0] = bad[0] and (m == 1 or not bad[1])
+    drop[-1] = bad[-1] and m > 1 and not bad[-2]
+    if drop.any():
+        return drop
+    cuts = np.concatenate(([0], np.flatnonzero(bad) + 1, [m + 1]))
+    lengths = np.diff(cuts)
+    short = lengths < MINRUN
+    short[np.argmax(lengths)] = False
+    return np.repeat(short, lengths)
+
+def clean(epoch, lat, lon, rows, max_speed=0.0, max_accel=0.0):
+    """
+    Return the rows of a segment without the points of impossible steps.
+
+    Arguments:
+    epoch, lat, lon: columns of the time in seconds and the position in
+        degrees, as sequences of float (or buffers, with numpy)
+    rows: the row numbers of the points of the segment, in time order
+    max_speed: the highest possible speed in metres per second, 0 for none
+    max_accel: the highest possible acceleration in metres per second per
+        second, 0 for none
+    """
+    if not (max_speed > 0 or max_accel > 0) or len(rows) < 2:
+        return rows
+    np = optional_numpy()
+    if np is None:
+        keep = list(rows)
+    elif isinstance(rows, range):
+        keep = np.arange(rows.start, rows.stop)
+    else:
+        keep = np.asarray(rows, dtype=np.intp)
+    for n in range(PASSES):
+        if len(keep) < 2:
+            break
+        t, la, lo = _gather(np, epoch, lat, lon, keep)
+        dist, dt, v = _steps(np, t, la, lo)
+        bad = _impossible(np, dt, v, max_speed, max_accel)
+        if np is None:
+            drop = _dropped(np, bad) if any(bad) else None
+            if not (drop and any(drop)):
+                break
+            keep = [i for i, d in zip(keep, drop) if not d]
+        else:
+            drop = _dropped(np, bad) if bad.any() else None
+            if drop is None or not drop.any():
+                break
+            keep = keep[~drop]
+    if len(keep) == len(rows):
+        return rows
+    return keep
+
+def _hms(seconds):
+    """
+    Return a time in seconds as H:MM:SS
+    """
+    seconds = int(round(seconds))
+    return '{0}:{1:02d}:{2:02d}'.format(seconds // 3600,
+                                        seconds // 60 % 60,
+                                        seconds % 60)
+
+class stats():
+    """
+    The statistics of a track, accumulated over its segments:
+    distance: in metres
+    duration: seconds from the first point to the last of each segment
+    moving: seconds in steps faster than MOVING
+    maxspeed: the highest speed of any step in metres per second
+    points: the number of points
+    """
+    def __init__(self):
+        """
+        Start with everything zero
+        """
+        self.distance = 0.0
+        self.duration = 0.0
+        self.moving = 0.0
+        self.maxspeed = 0.0
+        self.points = 0
+
+    def add(self, epoch, lat, lon, rows):
+        """
+        Add the segment made of the points in rows of the columns epoch,
+        lat and lon (as for clean())
+        """
+        self.points += len(rows)
+        if len(rows) < 2:
+            return
+        np = optional_numpy()
+        t, la, lo = _gather(np, epoch, lat, lon, rows)
+        dist, dt, v = _steps(np, t, la, lo)
+        if np is None:
+            self.distance += sum(d for d in dist if d == d)
+            times = [x for x in t if x == x]
+            if times:
+                self.duration += max(times) - min(times)
+            self.moving += sum(s for s, w in zip(dt, v) if w > MOVING)
+            speeds = [w for s, w in zip(dt, v) if s > 0]
+            if speeds:
+                self.maxspeed = max(self.maxspeed, max(speeds))
+        else:
+            self.distance += float(np.nansum(dist))
+            if not np.isnan(t).all():
+                self.duration += float(np.nanmax(t) - np.nanmin(t))
+            self.moving += float(dt[v > MOVING].sum())
+            speeds = v[dt > 0]
+            if speeds.size:
+                self.maxspeed = max(self.maxspeed, float(speeds.max()))
+
+    def text(self):
+        """
+        Return the statistics as text for a placemark description
+        """
+        return ('{0:.2f} km in {1}, moving {2}, max {3:.1f} km/h'
+                .format(self.distance / 1000.0,
+                        _hms(self.duration),
+                        _hms(self.moving),
+                        self.maxspeed * 3.6))
@@ -0,0 +1,413 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Tue Oct 20 09:41:26 2026
+Copyright (C) 2016 Russell O. Redman
+
+Offline lookup of the IANA timezone at a position, used by makekml to
+convert the camera clock time of each image to UTC.
+
+A single --geosync offset cannot describe a trip that crosses timezones, but
+the position recorded with each image says which zone it was taken in.  The
+zones are read from a GeoJSON file of timezone boundaries, such as the
+combined.json released by the timezone-boundary-builder project, in which
+each feature is a Polygon or MultiPolygon with a "tzid" property.  Parsing
+the boundaries is slow, so they are compiled once into a grid of
+RESOLUTION degree cells and kept in a directory beside the file, named by
+appending INDEXSUFFIX, holding:
+    meta.json   the path, size and mtime of the boundary file, the
+                resolution and the zone names
+    cells.npy   one int32 per cell: the zone that covers the whole cell,
+                OCEAN if no zone does, or -2 - n for boundary cell n
+    x.npy, y.npy   the vertices of every ring (float64 degrees)
+    zone.npy    the zone of the ring that each vertex begins (int32)
+    edges.npy   the first vertex of each edge that meets a boundary cell
+                (int32), grouped by cell
+    start.npy   the offset of the edges of each boundary cell (int32)
+    centre.npy  the zone holding the centre of each boundary cell (int32)
+in the .npy format written by gpxcache.  The index is rebuilt whenever the
+size or mtime of the boundary file changes.
+
+Most positions fall in a cell covered by a single zone and are resolved by
+one lookup.  In a boundary cell the zone is known at the centre, and the
+edges that cross an L-shaped path from the centre to the position within
+the cell say which zones were entered or left on the way.  Positions at sea
+fall outside every zone and get the nautical zone Etc/GMT+N for their
+longitude.
+
+The UTC offset of each zone is taken from pytz and memoized for each zone
+and date, so the millions of images of a trip need only a few hundred
+timezone calculations.  Only images whose epoch was read from the camera
+clock are converted: those that record OffsetTimeOriginal are already in
+UTC and carry the utc flag of their imagerecord, which to_utc() sets on the
+records it converts.  Only the epoch changes.  The date and time, and so
+the order of the image placemarks (imagerecord.sortkey()), stay on the
+camera clock, while the photo-derived tracks are ordered by epoch.
+
+@author: russell
+@email: russell@roredman.ca
+"""
+
+import array
+import calendar
+import datetime
+import functools
+import json
+import math
+import os
+import os.path
+import sys
+
+from . import gpxcache
+
+# Bumped whenever the layout of the index changes
+VERSION = 1
+
+# Size of the grid cells in degrees
+RESOLUTION = 0.25
+
+# Appended to the path of the boundary file to name its index directory
+INDEXSUFFIX = '.index'
+
+# Cell value for no zone
+OCEAN = -1
+
+# Upper bound on the number of (zone, date) offsets remembered
+CACHESIZE = 4096
+
+# Slack in degrees when finding the cells an edge meets
+EPSILON = 1.0e-9
+
+# The columns of the index, as described above
+COLUMNS = ('cells', 'x', 'y', 'zone', 'edges', 'start', 'centre')
+
+def nautical(lon):
+    """
+    Return the Etc/GMT zone of the nautical time at longitude lon
+    """
+    hours = int(round(lon / 15.0))
+    hours = max(-12, min(12, hours))
+    if not hours:
+        return 'Etc/GMT'
+    # The signs of the Etc zones are inverted, as in POSIX TZ strings
+    return 'Etc/GMT{0:+d}'.format(-hours)
+
+def _rings(geometry):
+    """
+    Iterate over the rings of a Polygon or MultiPolygon geometry
+    """
+    if geometry is None:
+        return
+    if geometry.get('type') == 'Polygon':
+        polygons = [geometry['coordinates']]
+    elif geometry.get('type') == 'MultiPolygon':
+        polygons = geometry['coordinates']
+    else:
+        return
+    for polygon in polygons:
+        for ring in polygon:
+            if len(ring) >= 3:
+                yield ring
+
+def read_boundaries(path):
+    """
+    Return (names, rings) from a GeoJSON file of timezone boundaries, where
+    rings is a list of (zone, ring) and ring is a list of [lon, lat]
+    positions.  Raise ValueError if the file is not a FeatureCollection.
+    """
+    with open(path, encoding='utf-8') as f:
+        collection = json.load(f)
+    if (not isinstance(collection, dict) or
+            collection.get('type') != 'FeatureCollection'):
+        raise ValueError(path + ' is not a GeoJSON FeatureCollection')
+    names = []
+    zones = {}
+    rings = []
+    for feature in collection.get('features', []):
+        properties = feature.get('properties') or {}
+        name = properties.get('tzid', properties.get('TZID'))
+        if not name:
+            continue
+        if name not in zones:
+            zones[name] = len(names)
+            names.append(name)
+        for ring in _rings(feature.get('geometry')):
+            rings.append((zones[name], ring))
+    return names, rings
+
+def build(names, rings, resolution=RESOLUTION):
+    """
+    Compile the rings of each zone into the columns of the grid index
+    described above, returned as a dictionary of arrays
+    """
+    cols = int(round(360.0 / resolution))
+    rows = int(round(180.0 / resolution))
+    x = array.array('d')
+    y = array.array('d')
+    zone = array.array('i')
+    starts = array.array('i')
+    for z, ring in rings:
+        first = len(x)
+        for lon, lat in ((p[0], p[1]) for p in ring):
+            x.append(lon)
+            y.append(lat)
+            zone.append(z)
+        if x[first] != x[-1] or y[first] != y[-1]:
+            x.append(x[first])
+            y.append(y[first])
+            zone.append(z)
+        starts.extend(range(first, len(x) - 1))
+
+    def col(lon):
+        return min(cols - 1, max(0, int(math.floor((lon + 180.0) /
+                                                   resolution))))
+
+    def row(lat):
+        return min(rows - 1, max(0, int(math.floor((lat + 90.0) /
+                                                   resolution))))
+
+    # The edges crossing the centre line of each row, and those meeting
+    # each cell
+    rowedges = [[] for r in range(rows)]
+    boundary = {}
+    for e in starts:
+        x1 = x[e]
+        y1 = y[e]
+        x2 = x[e + 1]
+        y2 = y[e + 1]
+        ylo = min(y1, y2)
+        yhi = max(y1, y2)
+        for r in range(max(0, math.ceil((ylo + 90.0) / resolution - 0.5)),
+                       min(rows, math.ceil((yhi + 90.0) / resolution - 0.5))):
+            rowedges[r].append(e)
+        for r in range(row(ylo - EPSILON), row(yhi + EPSILON) + 1):
+            if y1 == y2:
+                xa, xb = x1, x2
+            else:
+                lo = max(ylo, r * resolution - 90.0)
+                hi = min(yhi, (r + 1) * resolution - 90.0)
+                xa = x1 + (lo - y1) * (x2 - x1) / (y2 - y1)
+                xb = x1 + (hi - y1) * (x2 - x1) / (y2 - y1)
+            base = r * cols
+            for c in range(col(min(xa, xb) - EPSILON),
+                           col(max(xa, xb) + EPSILON) + 1):
+                boundary.setdefault(base + c, []).append(e)
+
+    # Fill the cells between the crossings of each zone along the centre
+    # line of each row, so that every cell holds the zone at its centre
+    cells = array.array('i', [OCEAN]) * (rows * cols)
+    for r in range(rows):
+        cy = (r + 0.5) * resolution - 90.0
+        crossings = {}
+        for e in rowedges[r]:
+            x1 = x[e]
+            y1 = y[e]
+            xc = x1 + (cy - y1) * (x[e + 1] - x1) / (y[e + 1] - y1)
+            crossings.setdefault(zone[e], []).append(xc)
+        base = r * cols
+        for z, xs in crossings.items():
+            xs.sort()
+            for k in range(0, len(xs) - 1, 2):
+                c0 = max(0, math.ceil((xs[k] + 180.0) / resolution - 0.5))
+                c1 = min(cols,
+                         math.ceil((xs[k + 1] + 180.0) / resolution - 0.5))
+                if c1 > c0:
+                    cells[base + c0:base + c1] = array.array('i', [z]) * \
+                                                 (c1 - c0)
+
+    edges = array.array('i')
+    start = array.array('i', [0])
+    centre = array.array('i')
+    for n, cell in enumerate(sorted(boundary)):
+        edges.extend(boundary[cell])
+        start.append(len(edges))
+        centre.append(cells[cell])
+        cells[cell] = -2 - n
+    return {'cells': cells,
+            'x': x,
+            'y': y,
+            'zone': zone,
+            'edges': edges,
+            'start': start,
+            'centre': centre}
+
+class tzindex():
+    """
+    The grid index of a timezone boundary file
+    """
+    def __init__(self, names, resolution, columns):
+        """
+        Arguments:
+        names: the zone names, indexed by zone number
+        resolution: the size of the grid cells in degrees
+        columns: a dictionary of the columns described above
+        """
+        self.names = names
+        self.resolution = resolution
+        self.cols = int(round(360.0 / resolution))
+        self.rows = int(round(180.0 / resolution))
+        self.cells = columns['cells']
+        self.x = columns['x']
+        self.y = columns['y']
+        self.zone = columns['zone']
+        self.edges = columns['edges']
+        self.start = columns['start']
+        self.centre = columns['centre']
+
+    @classmethod
+    def load(cls, path, verbosity=1):
+        """
+        Return the index of the boundary file at path, from its index
+        directory if that is current, otherwise building the index and
+        storing it for later runs.  Raise OSError or ValueError if the
+        boundary file cannot be read.
+        """
+        entry = path + INDEXSUFFIX
+        meta = gpxcache.current_entry(entry, path, VERSION)
+        if meta is not None:
+            try:
+                return cls(meta['names'],
+                           meta['resolution'],
+                           gpxcache.map_entry(entry, COLUMNS))
+            except (OSError, ValueError, KeyError):
+                pass
+
+        if verbosity > 0:
+            print('building the timezone index of ' + path, file=sys.stderr)
+        names, rings = read_boundaries(path)
+        columns = build(names, rings)
+        gpxcache.store_entry(entry,
+                             path,
+                             VERSION,
+                             {'resolution': RESOLUTION, 'names': names},
+                             columns)
+        return cls(names, RESOLUTION, columns)
+
+    def lookup(self, lat, lon):
+        """
+        Return the name of the timezone at (lat, lon) in decimal degrees,
+        or None if either is NaN
+        """
+        if math.isnan(lat) or math.isnan(lon):
+            return None
+        lon = (lon + 180.0) % 360.0 - 180.0
+        res = self.resolution
+        r = min(self.rows - 1, max(0, int((lat + 90.0) // res)))
+        c = min(self.cols - 1, max(0, int((lon + 180.0) // res)))
+        v = self.cells[r * self.cols + c]
+        if v >= 0:
+            return self.names[v]
+        if v == OCEAN:
+            return nautical(lon)
+
+        # Walk from the centre of the boundary cell along the row to the
+        # longitude of the position, then along the column to it, noting
+        # the zones whose edges are crossed on the way
+        b = -2 - v
+        cx = (c + 0.5) * res - 180.0
+        cy = (r + 0.5) * res - 90.0
+        xlo, xhi = min(cx, lon), max(cx, lon)
+        ylo, yhi = min(cy, lat), max(cy, lat)
+        x = self.x
+        y = self.y
+        crossed = set()
+        for k in range(self.start[b], self.start[b + 1]):
+            e = self.edges[k]
+            x1 = x[e]
+            y1 = y[e]
+            x2 = x[e + 1]
+            y2 = y[e + 1]
+            n = 0
+            if (y1 <= cy < y2) or (y2 <= cy < y1):
+                xc = x1 + (cy - y1) * (x2 - x1) / (y2 - y1)
+                if xlo < xc <= xhi:
+                    n += 1
+            if (x1 <= lon < x2) or (x2 <= lon < x1):
+                yc = y1 + (lon - x1) * (y2 - y1) / (x2 - x1)
+                if ylo < yc <= yhi:
+                    n += 1
+            if n == 1:
+                crossed ^= {self.zone[e]}
+        inside = crossed ^ ({self.centre[b]} if self.centre[b] >= 0
+                            else set())
+        if not inside:
+            return nautical(lon)
+        return self.names[min(inside)]
+
+    def to_utc(self, imagerecords):
+        """
+        Convert the epoch of each imagerecord that was read from the camera
+        clock to UTC, using the timezone at its position, and flag it as
+        UTC.  Records already in UTC, because OffsetTimeOriginal was
+        recorded, are left alone.
+        """
+        for r in imagerecords:
+            if r.utc or r.epoch != r.epoch:
+                continue
+            name = self.lookup(r.lat, r.lon)
+            if name is None:
+                continue
+            local = _day_epoch(r.datestr) + _seconds(r.timestr)
+            offset = day_offset(name, r.datestr)
+            if offset is None:
+                offset = utc_offset(name, r.datestr, r.timestr)
+            r.epoch = local - offset
+            r.utc = True
+
+@functools.lru_cache(maxsize=CACHESIZE)
+def _day_epoch(datestr):
+    """
+    Return the epoch of 00:00:00 on datestr (YYYY-MM-DD) read as UTC
+    """
+    return calendar.timegm((int(datestr[0:4]),
+                            int(datestr[5:7]),
+                            int(datestr[8:10]),
+                            0, 0, 0))
+
+def _seconds(timestr):
+    """
+    Return the seconds since midnight of timestr (HH:MM:SS[.ffffff])
+    """
+    return (int(timestr[0:2]) * 3600 + int(timestr[3:5]) * 60 +
+            float(timestr[6:]))
+
+@functools.lru_cache(maxsize=CACHESIZE)
+def day_offset(name, datestr):
+    """
+    Return the offset of timezone name from UTC in seconds throughout the
+    day datestr, or None if it changes during the day
+    """
+    import pytz
+
+    tz = pytz.timezone(name)
+    day = datetime.datetime(int(datestr[0:4]),
+                            int(datestr[5:7]),
+                            int(datestr[8:10]))
+    first = tz.utcoffset(day, is_dst=False)
+    last = tz.utcoffset(day + datetime.timedelta(hours=23,
+                                                 minutes=59,
+                                                 seconds=59),
+                        is_dst=False)
+    if first != last:
+        return None
+    return first.total_seconds()
+
+def utc_offset(name, datestr, timestr):
+    """
+    Return the offset of timezone name from UTC in seconds at the local
+    time timestr on datestr, for the days on which the clocks change.  A 
+    time repeated when the clocks go back is read as standard time.
+    """
+    import pytz
+
+    local = (datetime.datetime(int(datestr[0:4]),
+                               int(datestr[5:7]),
+                               int(datestr[8:10])) +
+             datetime.timedelta(seconds=_seconds(timestr)))
+    return pytz.timezone(name).utcoffset(local, is_dst=False).total_seconds()
+
+def clear_caches():
+    """
+    Release the memoized offsets
+    """
+    _day_epoch.cache_clear()
+    day_offset.cache_clear()
@@ -0,0 +1,353 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 17:41:06 2026
+Copyright (C) 2016 Russell O. Redman
+
+Watch-folder mode for makekml.
+
+With --watch, makekml does not exit after writing the KML file.  The
+exiftool session, the document skeleton from makeKmlDoc() and the
+imagerecord of every located image stay resident, and the directories are
+watched for new, changed or deleted JPEG and GPX files, through inotify
+where the kernel provides it and by polling the directory listings
+otherwise.  Bursts of events, such as a camera card being copied, are
+debounced, then only the files that changed are read.  The output is
+rewritten atomically, through output.atomicwriter, every --interval 
+seconds if anything has changed.
+
+@author: russell
+@email: russell@roredman.ca
+"""
+
+import ctypes
+import ctypes.util
+import os
+import os.path
+import select
+import struct
+import sys
+import time
+
+from . import kml
+from . import kmlwriter
+from . import metadata
+from . import output
+from . import pipeline
+from . import scanner
+
+# Seconds without events before a burst of changes is processed
+DEBOUNCE = 2.0
+
+# Default seconds between rewrites of the output file
+INTERVAL = 60.0
+
+# Seconds between directory scans when inotify is not available
+POLL = 5.0
+
+# inotify event masks from <sys/inotify.h>
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_DELETE = 0x00000200
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+IN_EVENT = struct.Struct('iIII')
+
+def interesting(name):
+    """
+    Return True for the JPEG and GPX files that makekml reads
+    """
+    return os.path.splitext(name)[1] in (scanner.JPEG_EXTENSIONS +
+                                         scanner.GPX_EXTENSIONS)
+
+class inotifywatch():
+    """
+    Report changed files in a set of directories using Linux inotify
+    through ctypes.  Raises OSError if inotify is not available.
+    """
+    def __init__(self, dirs):
+        """
+        Arguments:
+        dirs: the directories to watch
+        """
+        libname = ctypes.util.find_library('c')
+        if not libname:
+            raise OSError('libc not found')
+        libc = ctypes.CDLL(libname, use_errno=True)
+        if not hasattr(libc, 'inotify_init1'):
+            raise OSError('inotify not available')
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+        self.wds = {}
+        mask = IN_CLOSE_WRITE | IN_MOVED_TO | IN_MOVED_FROM | IN_DELETE
+        for d in dirs:
+            wd = libc.inotify_add_watch(self.fd, os.fsencode(d), mask)
+            if wd < 0:
+                os.close(self.fd)
+                raise OSError(ctypes.get_errno(),
+                              'inotify_add_watch failed for ' + d)
+            self.wds[wd] = d
+
+    def wait(self, timeout):
+        """
+        Wait up to timeout seconds and return the set of paths of
+        interesting files that were written, moved or deleted
+        """
+        changed = set()
+        ready, w, x = select.select([self.fd], [], [], max(0.0, timeout))
+        if not ready:
+            return changed
+        try:
+            data = os.read(self.fd, 65536)
+        except BlockingIOError:
+            return changed
+        pos = 0
+        while pos + IN_EVENT.size <= len(data):
+            wd, mask, cookie, length = IN_EVENT.unpack_from(data, pos)
+            pos += IN_EVENT.size
+            name = os.fsdecode(data[pos:pos + length].rstrip(b'\0'))
+            pos += length
+            if name and wd in self.wds and interesting(name):
+                changed.add(os.path.join(self.wds[wd], name))
+        return changed
+
+    def close(self):
+        """
+        Release the inotify descriptor
+        """
+        os.close(self.fd)
+
+class pollwatch():
+    """
+    Report changed files in a set of directories by comparing successive
+    listings of their modification times and sizes
+    """
+    def __init__(self, dirs, period=POLL):
+        """
+        Arguments:
+        dirs: the directories to watch
+        period: seconds between scans
+        """
+        self.dirs = dirs
+        self.period = period
+        self.state = self.scan()
+        self.next = time.monotonic() + period
+
+    def scan(self):
+        """
+        Return a dictionary path -> (mtime_ns, size) for interesting files
+        """
+        state = {}
+        for d in self.dirs:
+            try:
+                with os.scandir(d) as it:
+                    for entry in it:
+                        if interesting(entry.name):
+                            st = entry.stat()
+                            state[entry.path] = (st.st_mtime_ns, st.st_size)
+            except OSError:
+                pass
+        return state
+
+    def wait(self, timeout):
+        """
+        Wait up to timeout seconds and return the set of paths of
+        interesting files that appeared, changed or disappeared since the
+        previous scan
+        """
+        now = time.monotonic()
+        if now + timeout < self.next:
+            time.sleep(max(0.0, timeout))
+            return set()
+        time.sleep(max(0.0, self.next - now))
+        self.next = time.monotonic() + self.period
+        state = self.scan()
+        changed = set(p for p in state if self.state.get(p) != state[p])
+        changed.update(p for p in self.state if p not in state)
+        self.state = state
+        return changed
+
+    def close(self):
+        """
+        Nothing to release
+        """
+        pass
+
+def _seconds(args, name, default):
+    """
+    Return the seconds given by the option name in args, or default if it
+    is not given, exiting with an error if it is not a number of seconds
+    """
+    if name not in args or not args[name]:
+        return default
+    try:
+        value = float(args[name])
+    except ValueError:
+        value = -1.0
+    if not value >= 0.0:
+        print('ERROR: --' + name + ' must be a number of seconds: ' +
+              args[name], file=sys.stderr)
+        sys.exit(-1)
+    return value
+
+class kmlwatcher():
+    """
+    Keeps a KML file up to date with the JPEG and GPX files in the
+    directories of a jpggps2kml object.
+    """
+    def __init__(self, jpggps, kmlpath, chunksize):
+        """
+        Arguments:
+        jpggps: the configured jpggps2kml object running makekml
+        kmlpath: the absolute path of the output KML file
+        chunksize: the number of files to request from exiftool at once
+        """
+        self.jpggps = jpggps
+        self.kmlpath = kmlpath
+        self.chunksize = chunksize
+        args = jpggps.config['arguments']
+        self.interval = _seconds(args, 'interval', INTERVAL)
+        self.debounce = _seconds(args, 'debounce', DEBOUNCE)
+
+        # imagerecords of the located images keyed by jpegrooted
+        self.images = {}
+        self.head = self.tail = ''
+
+    def watched(self):
+        """
+        Return the directories to watch: the JPEG directories and --gpx
+        """
+        dirs = list(self.jpggps.dirs)
+        args = self.jpggps.config['arguments']
+        if 'gpx' in args and args['gpx'] and args['gpx'] not in dirs:
+            dirs.append(args['gpx'])
+        return dirs
+
+    def skeleton(self):
+        """
+        Rebuild the document skeleton and its tracks, and serialize it with
+        a placeholder where the image placemarks will be written
+        """
+        jpggps = self.jpggps
+        with jpggps.profile.stage('kml build'):
+            doc, trackfolder, imagefolder = jpggps.makeKmlDoc()
+        jpggps.read_tracks(trackfolder)
+        with jpggps.profile.stage('serialize'):
+            imagefolder.append(kml.comment(kmlwriter.PLACEHOLDER))
+            self.head, self.tail = kmlwriter.split_skeleton(
+                kml.tostring(doc).format_map(jpggps.cdatatext))
+
+    def update_images(self, paths, et):
+        """
+        Read the changed JPEG files in paths and replace, add or drop their
+        placemarks
+        """
+        jpggps = self.jpggps
+        jpeglist = []
+        for p in sorted(paths):
+            jpegrooted = os.path.join(os.path.basename(os.path.dirname(p)),
+                                      os.path.basename(p))
+            self.images.pop(jpegrooted, None)
+            if os.path.isfile(p):
+                jpeglist.append((p,
+                                 jpegrooted,
+                                 os.path.splitext(os.path.basename(p))[0]))
+        for c in range(0, len(jpeglist), self.chunksize):
+            chunk = jpeglist[c:c + self.chunksize]
+            batch = jpggps.read_jpeg_batch([t[0] for t in chunk], et)
+            for r in jpggps.image_records(chunk, batch):
+                self.images[r.rooted] = r
+
+    def process(self, paths, et):
+        """
+        Bring the document up to date with a debounced set of changed files
+        """
+        gpx = [p for p in paths
+               if os.path.splitext(p)[1] in scanner.GPX_EXTENSIONS]
+        jpeg = [p for p in paths
+                if os.path.splitext(p)[1] in scanner.JPEG_EXTENSIONS]
+        if self.jpggps.verbosity > 0:
+            print('changed: ' + str(len(jpeg)) + ' JPEG, ' + 
+                  str(len(gpx)) + ' GPX', file=sys.stderr)
+        if gpx:
+            self.skeleton()
+        if jpeg:
+            self.update_images(jpeg, et)
+
+    def write(self):
+        """
+        Atomically replace the output file with the current document
+        """
+        jpggps = self.jpggps
+        with output.atomicwriter(self.kmlpath) as OUT:
+            with jpggps.profile.stage('write', nbytes=len(self.head)):
+                OUT.write(self.head)
+            jpggps.write_image_placemarks(
+                jpggps.unique_images(list(self.images.values())), OUT)
+            with jpggps.profile.stage('write', nbytes=len(self.tail)):
+                print(self.tail, file=OUT)
+        if jpggps.verbosity > 0:
+            print('wrote ' + self.kmlpath + ' with ' +
+                  str(len(self.images)) + ' images', file=sys.stderr)
+
+    def run(self):
+        """
+        Build the initial document, then watch for changes until
+        interrupted, writing the output one last time on the way out
+        """
+        jpggps = self.jpggps
+        args = jpggps.config['arguments']
+
+        self.skeleton()
+        images = pipeline.kmlpipeline(jpggps, int(args['jobs']))
+        images.collect()
+        self.images = dict((r.rooted, r) for r in images.records.sorted())
+        images.records.close()
+        self.write()
+
+        dirs = self.watched()
+        try:
+            watcher = inotifywatch(dirs)
+        except OSError:
+            watcher = pollwatch(dirs)
+        if jpggps.verbosity > 0:
+            print('watching ' + ', '.join(dirs) + ' with ' +
+                  type(watcher).__name__, file=sys.stderr)
+
+        pending = set()
+        quiet_at = None
+        dirty = False
+        next_write = time.monotonic() + self.interval
+        try:
+            with metadata.session(jpggps.verbosity) as et:
+                try:
+                    while True:
+                        now = time.monotonic()
+                        timeout = next_write - now if dirty else self.interval
+                        if pending:
+                            timeout = min(timeout, quiet_at - now)
+                        changed = watcher.wait(timeout)
+                        now = time.monotonic()
+                        if changed:
+                            pending |= changed
+                            quiet_at = now + self.debounce
+
+                        if pending and now >= quiet_at:
+                            self.process(pending, et)
+                            pending = set()
+                            dirty = True
+
+                        if dirty and now >= next_write:
+                            self.write()
+                            dirty = False
+                            next_write = now + self.interval
+                except KeyboardInterrupt:
+                    if pending:
+                        self.process(pending, et)
+                        dirty = True
+                    if dirty:
+                        self.write()
+        finally:
+            watcher.close()
+        jpggps.report_profile()
@@ -24,7 +24,9 @@ setup(name='jpggps2kml',
       entry_points = {'console_scripts': 
                          ['findoffset = jpggps2kml.jpggps2kml:findoffset',
                           'makegpx = jpggps2kml.jpggps2kml:makegpx',
+                          'mergegpx = jpggps2kml.jpggps2kml:mergegpx',
                           'editgps = jpggps2kml.jpggps2kml:editgps',
                           'orientjpeg = jpggps2kml.jpggps2kml:orientjpeg',
-                          'makekml = jpggps2kml.jpggps2kml:makekml']}
+                          'makekml = jpggps2kml.jpggps2kml:makekml',
+                          'mergekml = jpggps2kml.jpggps2kml:mergekml']}
       )